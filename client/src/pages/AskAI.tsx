@@ -1,6 +1,5 @@
 // AskAIPage.tsx (using CSS Modules)
 import React, { useState } from 'react';
-import axios from 'axios';
 import styles from './AskAI.module.css';
 
 const AskAIPage: React.FC = () => {
@@ -22,22 +21,71 @@ const AskAIPage: React.FC = () => {
     }
   };
 
+  // Parse one server-sent event block ("event: x\ndata: {...}")
+  const parseEvent = (block: string): { event: string; data: any } | null => {
+    let event = 'message';
+    const dataLines: string[] = [];
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    }
+    if (!dataLines.length) return null;
+    try {
+      return { event, data: JSON.parse(dataLines.join('\n')) };
+    } catch {
+      return null;
+    }
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
     setAnswer('💭 Analyzing shipments...');
+    setShipments([]);
+    setCount(null);
 
     try {
-      const response = await axios.post(`${process.env.REACT_APP_API_BASE_URL}/api/ask-ai`, {
-        question,
-        shipper_id: shipperId || null,
+      // fetch (not axios) so the answer can be rendered while it streams in
+      const response = await fetch(`${process.env.REACT_APP_API_BASE_URL}/api/ask-ai/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+        body: JSON.stringify({ question, shipper_id: shipperId || null }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let text = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-      const { ai_response, shipments, count } = response.data;
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const parsed = parseEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+          if (!parsed) continue;
 
-      setAnswer(ai_response || '⚠️ No AI response returned.');
-      setShipments(shipments || []);
-      setCount(count ?? null);
+          if (parsed.event === 'shipments') {
+            setShipments(parsed.data.shipments || []);
+            setCount(parsed.data.count ?? null);
+            setAnswer('💭 Writing answer...');
+          } else if (parsed.event === 'token') {
+            text += parsed.data.text;
+            setAnswer(text);
+          } else if (parsed.event === 'error') {
+            setAnswer(text || `⚠️ ${parsed.data.error}`);
+          } else if (parsed.event === 'done' && !text) {
+            setAnswer('⚠️ No AI response returned.');
+          }
+        }
+      }
     } catch (err) {
       setAnswer('⚠️ Error retrieving answer from server.');
       console.error(err);
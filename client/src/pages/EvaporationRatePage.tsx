@@ -20,6 +20,7 @@ export default function EvaporationRatePage() {
   const [containers, setContainers] = useState<any[]>([]);
   const [selectedShipper, setSelectedShipper] = useState<string>('');
   const [evapData, setEvapData] = useState<any[]>([]);
+  const [summary, setSummary] = useState<any | null>(null);
   const [loading, setLoading] = useState(false);
 
   const API_BASE = process.env.REACT_APP_API_BASE_URL || '';
@@ -58,7 +59,21 @@ export default function EvaporationRatePage() {
         setLoading(false);
       }
     }
+
+    // precomputed per-shipper aggregates (count, mean, p50/p95, total loss)
+    async function fetchSummary() {
+      try {
+        const res = await axios.get(`${API_BASE}/api/analytics/evaporation`, {
+          params: { shipper_id: selectedShipper, scope: 'shipper' },
+        });
+        setSummary(res.data.shipper);
+      } catch (err) {
+        console.error('Error fetching evaporation summary:', err);
+        setSummary(null);
+      }
+    }
     fetchEvaporationData();
+    fetchSummary();
   }, [selectedShipper]);
 
   return (
@@ -86,6 +101,13 @@ export default function EvaporationRatePage() {
 
       {loading && <p className="evap-loading">Loading evaporation data...</p>}
 
+      {!loading && summary && (
+        <p className="evap-summary">
+          {summary.trips} trips · mean {summary.mean_kg_per_hour} kg/hr · p50 {summary.p50_kg_per_hour} · p95{' '}
+          {summary.p95_kg_per_hour} · total LN2 lost {summary.total_loss_kg} kg
+        </p>
+      )}
+
       {!loading && evapData.length > 0 && (
         <div className="evap-chart">
           <Line
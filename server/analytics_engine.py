@@ -0,0 +1,310 @@
+"""
+Deterministic answers to metric questions ("average evaporation rate after
+2025-05-01", "top 3 longest trips", "evaporation rate by destination",
+"monthly transit time trend") computed with pandas over the shipper's
+journey rows, instead of asking the LLM to do arithmetic over a prompt.
+
+    intent = parse_metric_intent(question, cutoff, direction)
+    if intent:
+        result = run_intent(intent, fetch_journeys(conn, shipper_id, intent))
+
+parse_metric_intent() returns None for anything that isn't a metric question,
+and ask_ai falls back to retrieval + LLM as before. A question only counts as a
+metric question when it names both a metric and an aggregate ("longest" /
+"fastest" name both, transit time); "which trips took at least 20 hours" or
+"which driver made the most trips" are not, and go to retrieval.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from journey_query import ANALYTICS_FIELDS, build_journey_query
+from utils import format_hours_minutes
+
+# metric -> (question phrases, unit)
+METRICS = {
+    "evaporation_rate": (("evaporation", "evap", "boil-off", "boiloff", "boil off"), "kg/hr"),
+    "weight_loss": (("weight loss", "lost", "loss"), "kg"),
+    "pickup_weight": (("pickup weight", "shipped weight", "starting weight"), "kg"),
+    "dropoff_weight": (("dropoff weight", "received weight", "delivered weight", "arrival weight"), "kg"),
+    "transit_hours": (("transit", "travel time", "duration", "delivery time", "trip time", "trip length"), "hours"),
+}
+METRIC_LABELS = {
+    "evaporation_rate": "evaporation rate",
+    "weight_loss": "weight loss",
+    "pickup_weight": "pickup weight",
+    "dropoff_weight": "received weight",
+    "transit_hours": "transit time",
+    "shipments": "shipments",
+}
+
+# aggregate -> question words; checked in this order
+AGGREGATES = (
+    ("trend", ("trend", "over time", "monthly", "weekly", "month over month", "changed")),
+    ("median", ("median",)),
+    ("mean", ("average", "avg", "mean", "typical")),
+    ("sum", ("total", "sum")),
+    ("max", ("longest", "highest", "largest", "maximum", "max", "slowest", "biggest")),
+    ("min", ("shortest", "lowest", "smallest", "minimum", "min", "fastest")),
+)
+# superlatives that are about the trip's duration whatever else is mentioned
+_DURATION_WORDS = ("longest", "shortest", "slowest", "fastest")
+
+AGGREGATE_WORDS = {
+    "mean": "Average", "trend": "Average", "median": "Median", "sum": "Total", "max": "Highest", "min": "Lowest",
+}
+
+# group-by phrase -> journey column (or a pickup_time period)
+GROUPS = {
+    "destination": "dest_city",
+    "origin": "origin_city",
+    "lane": "lane",
+    "route": "lane",
+    "driver": "pickup_user_id",
+    "receiver": "dropoff_contact_name",
+    "month": "month",
+    "week": "week",
+    "day": "day",
+}
+_PERIODS = {"month": "M", "week": "W", "day": "D"}
+
+_GROUP_RE = re.compile(r"\b(?:by|per|for each|each|across)\s+(" + "|".join(GROUPS) + r")s?\b")
+_TOP_K_RE = re.compile(r"\b(?:top|first|bottom)\s+(\d+)\b|\b(\d+)\s+(?:longest|shortest|highest|lowest|largest|smallest|slowest|fastest)\b")
+_COUNT_RE = re.compile(r"\b(?:how many|number of|count of|count)\s+(?:\w+\s+)?(?:shipments?|trips?|deliveries|manifests?)\b")
+_LAST_RE = re.compile(r"\b(?:last|past|previous)\s+(\d+)?\s*(day|week|month)s?\b")
+_BETWEEN_RE = re.compile(r"\bbetween\s+(20\d{2}-\d{2}-\d{2})\s+and\s+(20\d{2}-\d{2}-\d{2})\b")
+
+
+@dataclass
+class MetricIntent:
+    metric: str                      # key of METRICS, or "shipments" for counts
+    aggregate: str                   # mean | median | sum | min | max | count | trend
+    group_by: str | None = None      # key of GROUPS
+    top_k: int | None = None         # rank individual shipments instead of aggregating
+    start: datetime | None = None    # pickup_time window, inclusive
+    end: datetime | None = None      # pickup_time window, exclusive
+
+    def describe(self) -> dict:
+        return {
+            "metric": self.metric,
+            "aggregate": self.aggregate,
+            "group_by": self.group_by,
+            "top_k": self.top_k,
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+        }
+
+
+def _mentions(q: str, words) -> bool:
+    # whole words (plurals allowed), so "min" doesn't fire on "minutes"
+    return any(re.search(rf"\b{re.escape(w)}(?:s|es)?\b", q) for w in words)
+
+
+def parse_metric_intent(question: str, cutoff: datetime | None = None, direction: str = "all",
+                        now: datetime | None = None) -> MetricIntent | None:
+    q = question.lower()
+
+    metric = next((name for name, (words, _) in METRICS.items() if _mentions(q, words)), None)
+    group = _GROUP_RE.search(q)
+    if _COUNT_RE.search(q):
+        aggregate, metric = "count", "shipments"
+    else:
+        aggregate = next((name for name, words in AGGREGATES if _mentions(q, words)), None)
+    if aggregate is None:
+        # "evaporation rate by destination" -> per-group average
+        if not (group and metric):
+            return None
+        aggregate = "mean"
+    if aggregate in ("min", "max") and _mentions(q, _DURATION_WORDS):
+        # "longest" / "fastest" rank by transit time; "evaporation rate on the
+        # longest trip" is a lookup on one trip, not the highest evaporation rate
+        if metric not in (None, "transit_hours"):
+            return None
+        metric = "transit_hours"
+    if metric is None:
+        return None
+
+    intent = MetricIntent(metric=metric, aggregate=aggregate)
+
+    if group:
+        intent.group_by = group.group(1)
+    elif aggregate == "trend":
+        intent.group_by = "week" if "week" in q else "month"
+    if intent.aggregate == "trend" and metric == "shipments":
+        intent.aggregate = "count"
+
+    top = _TOP_K_RE.search(q)
+    if top and aggregate in ("min", "max"):
+        intent.top_k = int(top.group(1) or top.group(2))
+    elif aggregate in ("min", "max") and not intent.group_by:
+        intent.top_k = 1
+
+    # time window: explicit range > "last N days" > before/after cutoff
+    between = _BETWEEN_RE.search(q)
+    last = _LAST_RE.search(q)
+    if between:
+        intent.start = datetime.fromisoformat(between.group(1))
+        intent.end = datetime.fromisoformat(between.group(2)) + timedelta(days=1)
+    elif last:
+        count = int(last.group(1) or 1)
+        days = {"day": 1, "week": 7, "month": 30}[last.group(2)] * count
+        intent.start = (now or datetime.utcnow()) - timedelta(days=days)
+    elif cutoff is not None and direction == "after":
+        intent.start = cutoff
+    elif cutoff is not None and direction == "before":
+        intent.end = cutoff
+    return intent
+
+
+def fetch_journeys(conn, shipper_id: str, intent: MetricIntent, source: str = "live") -> list[dict]:
+    """The shipper's delivered journeys inside the intent's time window."""
+    where = [("shipper_id", "=", shipper_id), ("pickup_time", "IS NOT NULL", None), ("dropoff_time", "IS NOT NULL", None)]
+    if intent.start:
+        where.append(("pickup_time", ">=", intent.start))
+    if intent.end:
+        where.append(("pickup_time", "<", intent.end))
+    query, params = build_journey_query(ANALYTICS_FIELDS, where=where, order_by=[("pickup_time", "ASC")], source=source)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def _frame(rows: list[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=list(ANALYTICS_FIELDS))
+    for col in ("transit_hours", "evaporation_rate_kg_per_hour", "pickup_weight", "dropoff_weight"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["pickup_time"] = pd.to_datetime(df["pickup_time"])
+    df["dropoff_time"] = pd.to_datetime(df["dropoff_time"])
+    df["evaporation_rate"] = df["evaporation_rate_kg_per_hour"]
+    df["weight_loss"] = df["pickup_weight"] - df["dropoff_weight"]
+    df["lane"] = df["origin_city"].fillna("?") + " → " + df["dest_city"].fillna("?")
+    return df
+
+
+def _group_key(df: pd.DataFrame, group_by: str):
+    if group_by in _PERIODS:
+        return df["pickup_time"].dt.to_period(_PERIODS[group_by]).astype(str)
+    return df[GROUPS[group_by]].astype(str)
+
+
+def _fmt(value, unit: str) -> str:
+    if unit == "hours":
+        return f"{value:.2f} hours ({format_hours_minutes(value * 3600)})"
+    return f"{value:.4f} {unit}" if unit == "kg/hr" else f"{value:.2f} {unit}"
+
+
+def to_shipment_log(row: dict) -> dict:
+    """Journey row in the shape /api/ask-ai returns (and the AskAI table renders)."""
+    hours = row.get("transit_hours")
+    return {
+        "shipment_id": row["manifest_id"],
+        "pickup_time": row["pickup_time"].isoformat() if row.get("pickup_time") is not None else None,
+        "pickup_contact": row.get("origin_contact_name"),
+        "delivery_time": row["dropoff_time"].isoformat() if row.get("dropoff_time") is not None else None,
+        "receiver": row.get("dropoff_contact_name"),
+        "transit_time_hours": format_hours_minutes(float(hours) * 3600) if hours is not None else None,
+        "evaporation_rate_kg_per_hour": float(row["evaporation_rate_kg_per_hour"])
+        if row.get("evaporation_rate_kg_per_hour") is not None else None,
+    }
+
+
+def _window_text(intent: MetricIntent) -> str:
+    if intent.start and intent.end:
+        return f" between {intent.start:%Y-%m-%d} and {intent.end:%Y-%m-%d}"
+    if intent.start:
+        return f" since {intent.start:%Y-%m-%d}"
+    if intent.end:
+        return f" before {intent.end:%Y-%m-%d}"
+    return ""
+
+
+def run_intent(intent: MetricIntent, rows: list[dict]) -> dict:
+    """
+    Evaluate `intent` over journey rows. Returns
+    {"answer": text, "value": scalar | None, "groups": [...], "shipments": [...], "count": n, "intent": {...}}
+    """
+    df = _frame(rows)
+    label = METRIC_LABELS[intent.metric]
+    unit = "" if intent.metric == "shipments" else METRICS[intent.metric][1]
+    window = _window_text(intent)
+    result = {"intent": intent.describe(), "value": None, "groups": [], "shipments": [], "count": 0}
+
+    # every answer is about completed shipments, so counts skip the undelivered ones
+    df = df[df["dropoff_time"].notna()]
+    if intent.metric != "shipments":
+        df = df[df[intent.metric].notna()]
+    result["count"] = int(len(df))
+    if df.empty:
+        result["answer"] = f"No completed shipments{window} have a recorded {label}."
+        return result
+
+    if intent.top_k:
+        ranked = df.nlargest(intent.top_k, intent.metric) if intent.aggregate == "max" \
+            else df.nsmallest(intent.top_k, intent.metric)
+        records = [_plain(r) for r in ranked.to_dict("records")]
+        result["shipments"] = [to_shipment_log(r) for r in records]
+        result["value"] = round(float(ranked[intent.metric].iloc[0]), 4)
+        word = AGGREGATE_WORDS[intent.aggregate]
+        if intent.metric == "transit_hours":
+            word = "Longest" if intent.aggregate == "max" else "Shortest"
+
+        def describe(r):
+            return f"{r['manifest_id']} at {_fmt(r[intent.metric], unit)} (picked up {r['pickup_time']:%Y-%m-%d %H:%M})"
+
+        if intent.top_k == 1:
+            result["answer"] = f"{word} {label}{window}: {describe(records[0])}, out of {len(df)} shipments."
+        else:
+            lines = [f"{word} {label}{window}, out of {len(df)} shipments:"]
+            lines += [f"{i}. {describe(r)}" for i, r in enumerate(records, 1)]
+            result["answer"] = "\n".join(lines)
+        return result
+
+    if intent.group_by:
+        key = _group_key(df, intent.group_by)
+        if intent.aggregate == "count":
+            grouped = df.groupby(key).size()
+        else:
+            grouped = df.groupby(key)[intent.metric].agg("mean" if intent.aggregate == "trend" else intent.aggregate)
+        counts = df.groupby(key).size()
+        if intent.group_by not in _PERIODS:
+            grouped = grouped.sort_values(ascending=False)
+        result["groups"] = [
+            {"group": g, "value": round(float(v), 4), "count": int(counts[g])} for g, v in grouped.items()
+        ]
+        what = "Shipments" if intent.metric == "shipments" else f"{AGGREGATE_WORDS[intent.aggregate]} {label}"
+        lines = [f"{what} by {intent.group_by}{window}:"]
+        for g in result["groups"]:
+            shown = str(int(g["value"])) if intent.metric == "shipments" else _fmt(g["value"], unit)
+            lines.append(f"- {g['group']}: {shown} ({g['count']} shipments)")
+        if intent.aggregate == "trend" and len(grouped) > 1:
+            first, last = float(grouped.iloc[0]), float(grouped.iloc[-1])
+            change = "up" if last > first else "down" if last < first else "flat"
+            lines.append(f"Trend: {change} from {_fmt(first, unit)} to {_fmt(last, unit)}.")
+        result["answer"] = "\n".join(lines)
+        return result
+
+    if intent.aggregate == "count":
+        result["value"] = int(len(df))
+        result["answer"] = f"{len(df)} completed shipments{window}."
+        return result
+
+    value = float(df[intent.metric].agg(intent.aggregate))
+    result["value"] = round(value, 4)
+    result["answer"] = f"{AGGREGATE_WORDS[intent.aggregate]} {label}{window}: {_fmt(value, unit)} across {len(df)} shipments."
+    return result
+
+
+def _plain(record: dict) -> dict:
+    """pandas Timestamps / NaN back to datetime / None."""
+    out = {}
+    for k, v in record.items():
+        if isinstance(v, pd.Timestamp):
+            v = v.to_pydatetime()
+        elif v is not None and not isinstance(v, str) and pd.isna(v):
+            v = None
+        out[k] = v
+    return out
@@ -0,0 +1,161 @@
+"""
+Answer cache for /api/ask-ai.
+
+An answer is reused when the same shipper asks the same question about the
+same data. The key is (shipper_id, normalized question, cutoff, direction,
+data version). The data version is the shipper's latest shipment_journey
+updated_at, so any pickup or dropoff makes older answers unreachable, in every
+worker. The event endpoints also call invalidate_shipper() to drop them
+straight away.
+
+Questions that differ only in wording ("longest trip?" / "what was the
+longest trip") are matched on embedding cosine similarity. The threshold is
+ANSWER_CACHE_SIMILARITY, and the match is only made among entries with the
+same shipper, cutoff, direction, data version and metric intent. Opposite
+superlatives ("longest" / "shortest", "max" / "min") embed almost identically,
+so the intent the question parses to (metric, aggregate, grouping, top-k) has
+to agree as well; questions with no metric intent share the None scope.
+Entries expire after
+ANSWER_CACHE_TTL seconds. At most ANSWER_CACHE_MAX_PER_SHIPPER entries are
+kept per shipper, evicting the least recently used.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 900))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+ANSWER_CACHE_MAX_PER_SHIPPER = int(os.getenv("ANSWER_CACHE_MAX_PER_SHIPPER", 200))
+
+_PUNCTUATION = re.compile(r"[^\w\s:-]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation (keeping dates/times intact) and collapse whitespace."""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", question.lower())).strip()
+
+
+def cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class _Entry:
+    __slots__ = ("scope", "embedding", "value", "expires")
+
+    def __init__(self, scope, embedding, value, expires):
+        self.scope = scope
+        self.embedding = embedding
+        self.value = value
+        self.expires = expires
+
+
+class AnswerCache:
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, similarity: float = ANSWER_CACHE_SIMILARITY,
+                 max_per_shipper: int = ANSWER_CACHE_MAX_PER_SHIPPER, clock=time.monotonic):
+        self.ttl = ttl
+        self.similarity = similarity
+        self.max_per_shipper = max_per_shipper
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._shippers = {}   # shipper_id -> OrderedDict[(scope, normalized question)] -> _Entry
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _scope(cutoff, direction, data_version, intent):
+        return (cutoff.isoformat() if cutoff else None, direction, str(data_version), intent)
+
+    def get(self, shipper_id: str, question: str, cutoff, direction: str, data_version, intent=None, embed=None):
+        """
+        Cached value or None. `intent` is a hashable key for the question's parsed
+        metric intent. `embed` is an optional callable question -> vector, only
+        called when there is no exact match and a near-duplicate is possible;
+        if it returns None the lookup is exact-match only.
+        """
+        scope = self._scope(cutoff, direction, data_version, intent)
+        key = (scope, normalize_question(question))
+        now = self._clock()
+        with self._lock:
+            entries = self._shippers.get(shipper_id)
+            if entries:
+                self._expire(entries, now)
+                entry = entries.get(key)
+                if entry is not None:
+                    entries.move_to_end(key)
+                    self._hits += 1
+                    return entry.value
+                candidates = [(k, e) for k, e in entries.items() if e.scope == scope and e.embedding is not None]
+            else:
+                candidates = []
+
+        vector = embed(question) if candidates and embed is not None else None
+        if vector is not None:
+            best_key, best = max(((k, cosine(vector, e.embedding)) for k, e in candidates), key=lambda kv: kv[1])
+            if best >= self.similarity:
+                with self._lock:
+                    entries = self._shippers.get(shipper_id)
+                    entry = entries.get(best_key) if entries else None
+                    if entry is not None:
+                        entries.move_to_end(best_key)
+                        self._near_hits += 1
+                        return entry.value
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, shipper_id: str, question: str, cutoff, direction: str, data_version, value,
+            embedding=None, intent=None):
+        scope = self._scope(cutoff, direction, data_version, intent)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entries = self._shippers.setdefault(shipper_id, OrderedDict())
+            # answers computed against an older data version can never be hit again
+            for stale in [k for k, e in entries.items() if e.scope[:2] == scope[:2] and e.scope[2] != scope[2]]:
+                del entries[stale]
+            entries[key] = _Entry(scope, embedding, value, self._clock() + self.ttl)
+            entries.move_to_end(key)
+            while len(entries) > self.max_per_shipper:
+                entries.popitem(last=False)
+
+    def invalidate_shipper(self, shipper_id: str):
+        with self._lock:
+            if self._shippers.pop(shipper_id, None):
+                self._invalidations += 1
+
+    @staticmethod
+    def _expire(entries, now):
+        for key in [k for k, e in entries.items() if e.expires <= now]:
+            del entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._near_hits + self._misses
+            return {
+                "entries": sum(len(e) for e in self._shippers.values()),
+                "hits": self._hits,
+                "near_duplicate_hits": self._near_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._near_hits) / lookups, 4) if lookups else None,
+                "invalidations": self._invalidations,
+            }
+
+
+answer_cache = AnswerCache()
+
+
+def shipper_data_version(conn, shipper_id: str):
+    """Latest change to any of the shipper's journeys (index-only lookup)."""
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT MAX(updated_at) FROM shipment_journey WHERE shipper_id = %s", (shipper_id,))
+    (version,) = cursor.fetchone()
+    cursor.close()
+    return version.isoformat() if version else None
@@ -0,0 +1,110 @@
+"""
+CryoTraceAI.analyze_shipments, row by row vs columnar.
+
+"row loop" is the old implementation (fromisoformat + two strptime calls and
+a dict per shipment). "columnar" is shipment_columns: it gathers the fields
+from the row dicts into arrays, then parses, filters and computes with NumPy.
+"columnar (arrays)" skips the gather step, as when the batch already arrives
+as columns. Rows are synthetic Weaviate Shipment objects.
+
+    python benchmarks/bench_analyze_shipments.py                    # 10k, 100k, 1M
+    python benchmarks/bench_analyze_shipments.py --sizes 10000 --skip-row-loop-above 0
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shipment_columns import ShipmentColumns, analyze  # noqa: E402
+from utils import format_hours_minutes  # noqa: E402
+
+CUTOFF = datetime(2025, 3, 1)
+
+
+def make_rows(n: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(n):
+        pickup = start + timedelta(minutes=rng.randrange(0, 180 * 24 * 60))
+        dropoff = pickup + timedelta(minutes=rng.randrange(60, 72 * 60))
+        rows.append({
+            "manifest_id": f"MAN-{i:06d}",
+            "shipper_id": f"shipper-ln2-{i % 40:02d}-{i % 9000:04d}",
+            "pickup_time": pickup.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "dropoff_time": dropoff.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "origin_contact": "Dr. Gomez",
+            "destination_contact": "Nurse Jenkins",
+            "evaporation_rate": round(rng.uniform(0.05, 0.6), 4),
+        })
+    return rows
+
+
+def row_loop(shipment_logs, cutoff_dt, direction):
+    """The pre-columnar analyze_shipments, kept here for comparison."""
+    filtered = []
+    for s in shipment_logs:
+        pickup_time_str = s.get("pickup_time")
+        if not pickup_time_str:
+            continue
+        try:
+            pickup_dt = datetime.fromisoformat(pickup_time_str.replace("Z", ""))
+        except ValueError:
+            continue
+        if direction == 'before':
+            if cutoff_dt and pickup_dt > cutoff_dt:
+                continue
+        elif direction == 'after':
+            if cutoff_dt and pickup_dt < cutoff_dt:
+                continue
+        transit_time = format_hours_minutes((datetime.strptime(s['dropoff_time'], "%Y-%m-%dT%H:%M:%SZ") -
+                                             datetime.strptime(s['pickup_time'], "%Y-%m-%dT%H:%M:%SZ")).seconds)
+        filtered.append({
+            "shipment_id": s.get("manifest_id"),
+            "shipper_id": s.get("shipper_id"),
+            "pickup_time": pickup_time_str,
+            "pickup_contact": s.get("origin_contact"),
+            "delivery_time": s.get("dropoff_time"),
+            "receiver": s.get("destination_contact"),
+            "transit_time_hours": transit_time,
+            "evaporation_rate_kg_per_hour": s.get("evaporation_rate"),
+        })
+    return filtered
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-row-loop-above", type=int, default=None,
+                        help="don't time the row loop for batches larger than this")
+    args = parser.parse_args()
+
+    print(f"📊 analyze_shipments, direction=after cutoff={CUTOFF.date()}")
+    for n in args.sizes:
+        rows = make_rows(n)
+        results = []
+        if args.skip_row_loop_above is None or n <= args.skip_row_loop_above:
+            results.append(("row loop", *timed(lambda: len(row_loop(rows, CUTOFF, "after")))))
+        results.append(("columnar", *timed(lambda: len(analyze(ShipmentColumns.from_rows(rows), CUTOFF, "after")))))
+        batch = ShipmentColumns.from_rows(rows)
+        results.append(("columnar (arrays)", *timed(lambda: len(analyze(batch, CUTOFF, "after")))))
+        results.append(("columnar + records", *timed(
+            lambda: len(analyze(ShipmentColumns.from_rows(rows), CUTOFF, "after").to_records()))))
+
+        print(f"  {n:>9,} shipments")
+        for name, seconds, kept in results:
+            print(f"    {name:<20} {seconds * 1000:10.1f} ms  {n / seconds:14,.0f} rows/s  kept {kept:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Concurrent request throughput for async endpoints, before and after run_db.
+
+"before" calls the blocking driver straight from the coroutine (what the
+async handlers in main.py used to do); "after" hands the same work to
+db.run_db. Each mode fires --requests coroutines at once and reports
+requests/second plus the worst event-loop stall seen by a ticker task.
+
+    python benchmarks/bench_async_db.py                  # simulated driver latency
+    python benchmarks/bench_async_db.py --live           # SELECT SLEEP() against DB_* from .env
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import db  # noqa: E402
+
+
+class _SimulatedConnection:
+    """Stands in for a mysql.connector connection when running without a database."""
+    in_transaction = False
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def is_connected(self):
+        return True
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        pass
+
+
+def blocking_query(conn, latency):
+    if isinstance(conn, _SimulatedConnection):
+        time.sleep(latency)
+        return [{"SLEEP": 0}]
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT SLEEP(%s)", (latency,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+async def handler_before(latency):
+    with db.connection() as conn:
+        return blocking_query(conn, latency)
+
+
+async def handler_after(latency):
+    return await db.run_db(blocking_query, latency)
+
+
+async def _ticker(stop, interval=0.005):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_mode(handler, requests, latency):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(latency) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await ticker
+    return elapsed, worst_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per query")
+    parser.add_argument("--live", action="store_true", help="use the real MySQL pool instead of simulated latency")
+    args = parser.parse_args()
+
+    if not args.live:
+        db.pool = db.ConnectionPool(size=db.DB_POOL_SIZE, connect=lambda: _SimulatedConnection(args.latency))
+
+    print(f"📊 {args.requests} concurrent requests, {args.latency * 1000:.0f} ms per query, "
+          f"pool size {db.DB_POOL_SIZE}, {'live MySQL' if args.live else 'simulated driver'}")
+    for name, handler in (("before (blocking in loop)", handler_before), ("after (run_db)", handler_after)):
+        elapsed, lag = asyncio.run(run_mode(handler, args.requests, args.latency))
+        print(f"  {name:<26} {elapsed:7.3f}s  {args.requests / elapsed:8.1f} req/s  "
+              f"worst loop stall {lag * 1000:7.1f} ms")
+    print(f"  pool: {db.pool_stats()}")
+
+
+if __name__ == "__main__":
+    main()
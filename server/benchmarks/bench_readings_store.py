@@ -0,0 +1,85 @@
+"""
+readings_store at millions of readings: append, range scan and downsample.
+
+Readings are synthetic interim readings, one per container every --interval
+seconds, written in --batch sized appends like /api/readings posts. Scans
+and downsamples are timed per container over a week and over the whole range.
+
+    python benchmarks/bench_readings_store.py                         # 1M readings, 10 containers
+    python benchmarks/bench_readings_store.py --readings 5000000 --containers 50
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from readings_store import ReadingStore, parse_reading  # noqa: E402
+
+START = datetime(2025, 1, 1)
+
+
+def timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--containers", type=int, default=10)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between a container's readings")
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    containers = [f"shipper-ln2-20-{i:04d}" for i in range(args.containers)]
+    per_container = args.readings // args.containers
+    path = tempfile.mkdtemp(prefix="readings-bench-")
+    store = ReadingStore(path)
+    try:
+        print(f"📊 {per_container * len(containers):,} readings, {len(containers)} containers, "
+              f"every {args.interval}s ({per_container * args.interval / 86400:.0f} days each)")
+
+        parse_seconds = append_seconds = 0.0
+        for container in containers:
+            weight = 30.0
+            for first in range(0, per_container, args.batch):
+                rows = []
+                for seq in range(first, min(first + args.batch, per_container)):
+                    weight -= rng.uniform(0, 0.0005)
+                    rows.append({"shipper_id": container, "sequence_number": seq, "event_type": "interim",
+                                 "timestamp": (START + timedelta(seconds=seq * args.interval)).isoformat(),
+                                 "weight": round(weight, 3), "temperature": round(rng.uniform(20, 28), 1)})
+                seconds, readings = timed(lambda: [parse_reading(r) for r in rows])
+                parse_seconds += seconds
+                seconds, _ = timed(lambda: store.append(readings))
+                append_seconds += seconds
+        total = per_container * len(containers)
+        print(f"  parse      {parse_seconds:8.2f} s  {total / parse_seconds:12,.0f} readings/s")
+        print(f"  append     {append_seconds:8.2f} s  {total / append_seconds:12,.0f} readings/s")
+        print(f"  on disk    {store.stats()['chunks']:,} chunks, "
+              f"{sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs) / 1e6:,.1f} MB")
+
+        container = containers[0]
+        week = (START + timedelta(days=10), START + timedelta(days=17))
+        for label, (start, end) in (("1 week", week), ("all", (None, None))):
+            seconds, records = timed(lambda: store.scan(container, start, end), repeat=5)
+            print(f"  scan {label:<7} {seconds * 1000:8.1f} ms  {len(records):10,} readings")
+            seconds, result = timed(lambda: store.downsample(container, start, end, points=500), repeat=5)
+            print(f"  chart {label:<6} {seconds * 1000:8.1f} ms  {len(result['buckets']):10,} buckets")
+            seconds, rows = timed(lambda: store.records(container, start, end, limit=1000), repeat=5)
+            print(f"  page {label:<7} {seconds * 1000:8.1f} ms  {len(rows):10,} rows as JSON dicts")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Streaming detection of abnormal LN2 boil-off per container.
+
+Every weight that reaches the server is scored against its container's
+baseline the moment it is written:
+
+- a pickup, or a "ship" reading, starts a trip
+- an interim reading gives the kg/h lost since the previous reading
+- a "receive" reading gives the kg/h lost since the previous reading and
+  ends the trip
+- a dropoff gives the whole trip's evaporation rate, taken from
+  shipment_journey
+
+A container's baseline is a fixed handful of numbers, whatever its history:
+
+- an EWMA mean and variance of its kg/h (BOILOFF_ALPHA)
+- a one-sided CUSUM of the standardised excess
+- the trip's last weight
+
+Three kinds of alert:
+
+- "ceiling": above BOILOFF_MAX_RATE, even before there is a baseline
+- "spike":   more than BOILOFF_SPIKE_Z standard deviations above the baseline
+- "drift":   the CUSUM passes BOILOFF_CUSUM_H, i.e. a sustained smaller rise
+             (a vacuum jacket going soft rather than a lid left open)
+
+Outliers are clamped before they update the baseline, so one bad trip doesn't
+become the new normal. The caller stores the alerts it gets back in the
+boiloff_alert table (save_alerts), and /api/alerts reads them from there
+(read_alerts), so the feed survives a restart. Baselines live in this process.
+At startup they are replayed, without alerting, from the delivered trips in
+shipment_journey and the readings in the readings store (warm_baselines).
+
+    alerts = boiloff_detector.observe("shipper-ln2-20-0001", ts, 29.84, "interim")
+    save_alerts(conn, alerts)
+    read_alerts(conn, since_id=41)
+"""
+import math
+import os
+import threading
+from datetime import datetime
+
+BOILOFF_ALPHA = float(os.getenv("BOILOFF_ALPHA", 0.1))
+BOILOFF_SPIKE_Z = float(os.getenv("BOILOFF_SPIKE_Z", 4.0))
+BOILOFF_CUSUM_K = float(os.getenv("BOILOFF_CUSUM_K", 0.5))      # slack per observation, in SDs
+BOILOFF_CUSUM_H = float(os.getenv("BOILOFF_CUSUM_H", 5.0))      # drift threshold, in SDs
+BOILOFF_WARMUP = int(os.getenv("BOILOFF_WARMUP", 5))            # observations before spike / drift alerts
+BOILOFF_MIN_SD = float(os.getenv("BOILOFF_MIN_SD", 0.005))      # kg/h; scale resolution over a few hours
+BOILOFF_MAX_RATE = float(os.getenv("BOILOFF_MAX_RATE", 1.0))    # kg/h
+BOILOFF_MIN_HOURS = float(os.getenv("BOILOFF_MIN_HOURS", 0.5))  # shorter segments roll into the next one
+
+
+class Baseline:
+    __slots__ = ("n", "mean", "var", "cusum", "anchor_ts", "anchor_weight")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.anchor_ts = None
+        self.anchor_weight = None
+
+    def as_dict(self) -> dict:
+        return {"observations": self.n, "mean_kg_per_hour": round(self.mean, 4),
+                "sd_kg_per_hour": round(math.sqrt(self.var), 4), "cusum": round(self.cusum, 3),
+                "in_trip": self.anchor_ts is not None}
+
+
+class BoiloffDetector:
+    def __init__(self, alpha: float = BOILOFF_ALPHA, spike_z: float = BOILOFF_SPIKE_Z,
+                 cusum_k: float = BOILOFF_CUSUM_K, cusum_h: float = BOILOFF_CUSUM_H,
+                 warmup: int = BOILOFF_WARMUP, min_sd: float = BOILOFF_MIN_SD,
+                 max_rate: float = BOILOFF_MAX_RATE, min_hours: float = BOILOFF_MIN_HOURS):
+        self.alpha = alpha
+        self.spike_z = spike_z
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.warmup = warmup
+        self.min_sd = min_sd
+        self.max_rate = max_rate
+        self.min_hours = min_hours
+        self._baselines = {}
+        self._raised = 0
+        self._lock = threading.Lock()
+
+    def _baseline(self, container_id: str) -> Baseline:
+        baseline = self._baselines.get(container_id)
+        if baseline is None:
+            baseline = self._baselines[container_id] = Baseline()
+        return baseline
+
+    def observe(self, container_id: str, ts: datetime, weight_kg: float, event_type: str,
+                source: str = None, emit: bool = True) -> list[dict]:
+        """
+        A weight reading: "ship" / "pickup", "interim", or "receive" / "dropoff".
+        Returns new alerts; emit=False only updates the baseline.
+        """
+        if weight_kg is None or weight_kg != weight_kg:
+            return []
+        weight_kg = float(weight_kg)
+        with self._lock:
+            baseline = self._baseline(container_id)
+            if event_type in ("ship", "pickup"):
+                baseline.anchor_ts, baseline.anchor_weight = ts, weight_kg
+                return []
+            ends_trip = event_type in ("receive", "dropoff")
+            if baseline.anchor_ts is None:
+                if not ends_trip:
+                    # joined mid-trip: measure from here
+                    baseline.anchor_ts, baseline.anchor_weight = ts, weight_kg
+                return []
+            hours = (ts - baseline.anchor_ts).total_seconds() / 3600
+            if hours < self.min_hours:
+                if ends_trip:
+                    baseline.anchor_ts = baseline.anchor_weight = None
+                return []
+            rate = (baseline.anchor_weight - weight_kg) / hours
+            if ends_trip:
+                baseline.anchor_ts = baseline.anchor_weight = None
+            else:
+                baseline.anchor_ts, baseline.anchor_weight = ts, weight_kg
+            return self._score(container_id, baseline, rate, ts, event_type, source, emit)
+
+    def observe_rate(self, container_id: str, ts: datetime, rate: float, event_type: str = "dropoff",
+                     source: str = None, emit: bool = True) -> list[dict]:
+        """A whole-trip rate in kg/h (a dropoff). emit=False only updates the baseline."""
+        if rate is None:
+            return []
+        with self._lock:
+            baseline = self._baseline(container_id)
+            baseline.anchor_ts = baseline.anchor_weight = None
+            return self._score(container_id, baseline, float(rate), ts, event_type, source, emit)
+
+    def _score(self, container_id, baseline: Baseline, rate, ts, event_type, source, emit=True) -> list[dict]:
+        sd = max(math.sqrt(baseline.var), self.min_sd)
+        z = (rate - baseline.mean) / sd if baseline.n else 0.0
+        warmed = baseline.n >= self.warmup
+
+        kind = None
+        if rate > self.max_rate:
+            kind = "ceiling"
+        elif warmed and z > self.spike_z:
+            kind = "spike"
+        if warmed:
+            baseline.cusum = max(0.0, baseline.cusum + z - self.cusum_k)
+            if kind is None and baseline.cusum > self.cusum_h:
+                kind = "drift"
+
+        alerts = []
+        if kind and emit:
+            alert = {
+                "container_id": container_id,
+                "kind": kind,
+                "rate_kg_per_hour": round(rate, 4),
+                "baseline_kg_per_hour": round(baseline.mean, 4) if baseline.n else None,
+                "z": round(z, 2),
+                "cusum": round(baseline.cusum, 2),
+                "event_type": event_type,
+                "source": source,
+                "at": ts.isoformat() if isinstance(ts, datetime) else ts,
+                "detected_at": datetime.utcnow().isoformat(timespec="milliseconds"),
+            }
+            self._raised += 1
+            alerts.append(alert)
+            print(f"🚨 Boil-off {kind} on {container_id}: {rate:.3f} kg/h "
+                  f"(baseline {baseline.mean:.3f} kg/h, z={z:.1f})")
+        if kind:
+            baseline.cusum = 0.0
+
+        # clamp outliers so they nudge the baseline instead of resetting it
+        x = max(0.0, rate)
+        if warmed:
+            x = min(x, baseline.mean + self.spike_z * sd)
+        alpha = max(self.alpha, 1.0 / (baseline.n + 1))   # plain running mean until the EWMA has history
+        diff = x - baseline.mean
+        baseline.mean += alpha * diff
+        baseline.var = (1 - alpha) * (baseline.var + diff * alpha * diff)
+        baseline.n += 1
+        return alerts
+
+    def baseline(self, container_id: str):
+        with self._lock:
+            baseline = self._baselines.get(container_id)
+            return baseline.as_dict() if baseline else None
+
+    def stats(self) -> dict:
+        return {"containers": len(self._baselines), "alerts_raised": self._raised}
+
+
+boiloff_detector = BoiloffDetector()
+
+
+_ALERT_COLUMNS = ("container_id", "kind", "rate_kg_per_hour", "baseline_kg_per_hour", "z", "cusum",
+                  "event_type", "source", "at", "detected_at")
+_SELECT_ALERTS_SQL = """
+    SELECT id, container_id, kind, rate_kg_per_hour, baseline_kg_per_hour, z, cusum,
+           event_type, source, observed_at AS at, detected_at
+    FROM boiloff_alert
+"""
+
+
+def save_alerts(conn, alerts: list[dict]) -> list[dict]:
+    """Insert alerts into boiloff_alert and commit; each gets its feed id. Returns `alerts`."""
+    if not alerts:
+        return alerts
+    cursor = conn.cursor()
+    for alert in alerts:
+        cursor.execute("""
+            INSERT INTO boiloff_alert (container_id, kind, rate_kg_per_hour, baseline_kg_per_hour, z, cusum,
+                                       event_type, source, observed_at, detected_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, [alert[c] for c in _ALERT_COLUMNS])
+        alert["id"] = cursor.lastrowid
+    conn.commit()
+    cursor.close()
+    return alerts
+
+
+def read_alerts(conn, since_id: int = None, container_id: str = None, limit: int = 100) -> dict:
+    """Alerts after `since_id` (oldest first), or the newest `limit` when since_id is None."""
+    where, params = [], []
+    if since_id is not None:
+        where.append("id > %s")
+        params.append(since_id)
+    if container_id is not None:
+        where.append("container_id = %s")
+        params.append(container_id)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    order = "ASC" if since_id is not None else "DESC"
+
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute(f"{_SELECT_ALERTS_SQL} {clause} ORDER BY id {order} LIMIT %s", params + [limit])
+    alerts = cursor.fetchall()
+    cursor.execute("SELECT MAX(id) AS last_id FROM boiloff_alert")
+    last_id = cursor.fetchone()["last_id"] or 0
+    cursor.close()
+    if since_id is None:
+        alerts.reverse()
+    for alert in alerts:
+        for name in ("at", "detected_at"):
+            if isinstance(alert[name], datetime):
+                alert[name] = alert[name].isoformat()
+    return {"alerts": alerts, "last_id": last_id}
+
+
+def warm_baselines(conn, store=None, detector: BoiloffDetector = boiloff_detector) -> int:
+    """
+    Replay, oldest first and without raising alerts, every delivered trip's rate
+    and every reading in `store` (a ReadingStore). Returns the observations replayed.
+    """
+    cursor = conn.cursor(buffered=False)
+    cursor.execute("""
+        SELECT shipper_id, dropoff_time, evaporation_rate_kg_per_hour
+        FROM shipment_journey
+        WHERE evaporation_rate_kg_per_hour IS NOT NULL AND dropoff_time IS NOT NULL
+        ORDER BY dropoff_time
+    """)
+    events = {}    # container_id -> [(ts, kind, payload)]
+    for shipper_id, dropoff_time, rate in cursor:
+        events.setdefault(shipper_id, []).append((dropoff_time, "rate", rate))
+    cursor.close()
+
+    containers = set(events)
+    if store is not None:
+        from readings_store import EVENT_TYPES, from_micros
+
+        containers.update(store.containers())
+    replayed = 0
+    for container_id in containers:
+        timeline = events.pop(container_id, [])
+        if store is not None:
+            for ts, event_type, weight in store.scan(container_id)[["ts", "event_type", "weight"]].tolist():
+                timeline.append((datetime.fromisoformat(from_micros(ts)), EVENT_TYPES[event_type], weight))
+        # a dropoff and the receive reading at the same instant: the reading ends the segment first
+        timeline.sort(key=lambda event: (event[0], event[1] == "rate"))
+        for ts, kind, value in timeline:
+            if kind == "rate":
+                detector.observe_rate(container_id, ts, value, emit=False)
+            else:
+                detector.observe(container_id, ts, value, kind, emit=False)
+        replayed += len(timeline)
+    return replayed
+
+
+def observe_trip(conn, manifest_id: str, detector: BoiloffDetector = boiloff_detector) -> list[dict]:
+    """
+    Dropoff hook: score the trip's evaporation rate and store any alert. Never
+    raises; the dropoff is already committed.
+    """
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor.execute("""
+            SELECT shipper_id, dropoff_time, evaporation_rate_kg_per_hour AS rate
+            FROM shipment_journey WHERE manifest_id = %s
+        """, (manifest_id,))
+        journey = cursor.fetchone()
+        cursor.close()
+        if journey is None or journey["rate"] is None:
+            return []
+        alerts = detector.observe_rate(journey["shipper_id"], journey["dropoff_time"], journey["rate"],
+                                       "dropoff", source=manifest_id)
+        return save_alerts(conn, alerts)
+    except Exception as e:
+        print(f"⚠️ Boil-off check failed for {manifest_id}: {e}")
+        return []
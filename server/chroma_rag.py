@@ -1,119 +1,285 @@
+"""
+Chroma index behind /api/ask.
 
-import mysql.connector
-import openai
-from chromadb import PersistentClient
+The index is built and kept current in the background, so a query only ever
+embeds the question and searches whatever collection is live:
+
+- start() runs at startup. It opens the live collection named in
+  CHROMA_PATH/active_collection.json and builds one in a background thread
+  when there is none. A refresher thread then picks up new and changed
+  shipments every CHROMA_REFRESH_INTERVAL seconds.
+- Documents are the journey summaries used for Weaviate, keyed by
+  manifest_id, so re-adding a shipment replaces it. Changes are read from the
+  shipment_journey change feed (see weaviate_sync.py), and its mark is kept
+  next to the collection name.
+- Rows are embedded in chunks of CHROMA_EMBED_BATCH through the shared
+  embedding cache, with progress in stats().
+- reindex() builds a fresh collection alongside the live one. It then swaps
+  active_collection.json atomically and drops the old collection, so /api/ask
+  keeps answering from the old index until the new one is complete.
+
+The index is opt-in (CHROMA_ENABLED=true), and chromadb is only imported
+once a collection is opened, so the API runs without it installed.
+"""
+import json
 import os
+import threading
+import time
+from datetime import datetime
+
 from dotenv import load_dotenv
-from openai import OpenAI
-from chromadb.utils import embedding_functions
-import chromadb
-from chromadb.config import Settings
+
+from clients import clients
+from db import connection
+from embedding_cache import embedding_cache
+from ingest_shipments_to_weaviate import build_shipment
+from weaviate_sync import changed_manifests, journey_rows
 
 # --- Load environment variables ---
-load_dotenv(dotenv_path="server/.env")
-openai.api_key = os.getenv("OPENAI_API_KEY")
+load_dotenv()
 
-# ✅ Setup ChromaDB client (with persistence)
-from chromadb import PersistentClient
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_data")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "shipment_records")
+CHROMA_EMBED_BATCH = int(os.getenv("CHROMA_EMBED_BATCH", 100))
+CHROMA_REFRESH_INTERVAL = float(os.getenv("CHROMA_REFRESH_INTERVAL", 30))
+CHROMA_ENABLED = os.getenv("CHROMA_ENABLED", "false").lower() in ("1", "true", "yes")
 
-chroma_client = PersistentClient(path="./chroma_data")
+_METADATA_FIELDS = ("shipper_id", "manifest_id", "pickup_time", "dropoff_time", "evaporation_rate")
 
-# ✅ Create/Open a collection with OpenAI embedding
-openai_api_key = os.getenv("OPENAI_API_KEY")
-embedding_func = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=openai_api_key,
-    model_name="text-embedding-3-small"
-)
-collection = chroma_client.get_or_create_collection(
-    name="shipment_records",
-    embedding_function=embedding_func
-)
 
 # --- Helper: Embed text using OpenAI ---
 def get_embeddings(texts: list[str]) -> list[list[float]]:
-    response = openai.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts
-    )
-    return [d.embedding for d in response.data]
+    def request(missing):
+        response = clients.openai.embeddings.create(
+            model="text-embedding-3-small",
+            input=missing
+        )
+        return [d.embedding for d in response.data]
 
+    return embedding_cache.embed("text-embedding-3-small", texts, request)
 
-# --- Load and index shipment records from MySQL ---
-def load_or_index_shipments():
-    if collection.count() > 0:
-        print("🔄 Collection already indexed.")
-        return  # Skip if already populated
 
-    # Connect to MySQL
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME")
-    )
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM shipping_manifest")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    texts, metadatas, ids = [], [], []
-
-    for i, row in enumerate(rows):
-        transit = row.get("transit", "").lower()
-        direction = "received at" if transit == "receive" else "shipped from"
-        timestamp = row.get("timestamp", "")
-        if not isinstance(timestamp, str):
-            timestamp = str(timestamp)
-
-        # ✅ Construct a semantically rich sentence
-        text = (
-            f"On {timestamp}, container {row['container_id']} was {direction} {row['location']} by user {row.get('user_id', 'unknown')}. "
-            f"It weighed {row.get('weight', '?')} kg. Condition noted: {row.get('condition', 'unknown condition')}."
-        )
-        texts.append(text)
-
-        # ✅ Clean metadata (all serializable)
-        metadatas.append({
-            "timestamp": timestamp,
-            "container_id": row.get("container_id", ""),
-            "location": row.get("location", ""),
-            "transit": transit,
-            "weight": float(row.get("weight", 0)),
-            "user_id": int(row.get("user_id", 0)),
-            "condition": row.get("condition", "unknown condition")
-        })
-        ids.append(f"record-{i}")
-
-        print(f"📄 Indexed: {text}")
-
-    embeddings = get_embeddings(texts)
-    collection.add(
-        documents=texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
+def shipment_documents(rows) -> tuple[list, list, list]:
+    """(ids, documents, metadatas) for journey rows; undelivered shipments are skipped."""
+    ids, documents, metadatas = [], [], []
+    for row in rows:
+        try:
+            summary, data = build_shipment(row)
+        except ValueError:
+            continue
+        ids.append(data["manifest_id"])
+        documents.append(summary)
+        # Chroma metadata values must be scalars, never None
+        metadatas.append({k: data[k] for k in _METADATA_FIELDS if data.get(k) is not None})
+    return ids, documents, metadatas
+
+
+class ChromaIndex:
+    def __init__(self, path: str = CHROMA_PATH, base_name: str = CHROMA_COLLECTION):
+        self.path = path
+        self.base_name = base_name
+        self._client = None
+        self._collection = None
+        self._mark = (None, None)
+        self._write_lock = threading.Lock()   # one build / refresh at a time
+        self._stop = threading.Event()
+        self.state = "stopped"
+        self.progress = {"done": 0, "total": None}
+        self.last_error = None
+        self.last_refresh = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from chromadb import PersistentClient
+
+            self._client = PersistentClient(path=self.path)
+        return self._client
+
+    @property
+    def _pointer_path(self):
+        return os.path.join(self.path, "active_collection.json")
+
+    def _read_pointer(self):
+        try:
+            with open(self._pointer_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name: str, mark):
+        os.makedirs(self.path, exist_ok=True)
+        high_water, last_manifest_id = mark
+        tmp = self._pointer_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"collection": name, "high_water": high_water.isoformat() if high_water else None,
+                       "last_manifest_id": last_manifest_id}, f)
+        os.replace(tmp, self._pointer_path)
 
-    print(f"✅ Indexed {len(texts)} shipment records into Chroma.")
+    @property
+    def ready(self) -> bool:
+        return self._collection is not None
 
+    def start(self, background: bool = True):
+        """Open the live collection, build one if needed, then keep it fresh."""
+        pointer = self._read_pointer()
+        if pointer:
+            try:
+                self._collection = self.client.get_collection(pointer["collection"])
+                high_water = pointer.get("high_water")
+                self._mark = (datetime.fromisoformat(high_water) if high_water else None, pointer.get("last_manifest_id"))
+                self.state = "ready"
+                print(f"📚 Chroma collection {pointer['collection']}: {self._collection.count()} documents")
+            except Exception as e:
+                print(f"⚠️ Chroma collection {pointer['collection']} unusable, rebuilding: {e}")
+        if not background:
+            if not self.ready:
+                self.reindex()
+            return
+        threading.Thread(target=self._run, name="chroma-index", daemon=True).start()
+
+    def _run(self):
+        if not self.ready:
+            self._reindex_logged()
+        while not self._stop.wait(CHROMA_REFRESH_INTERVAL):
+            self.refresh()
+
+    def _reindex_logged(self, locked: bool = False):
+        try:
+            self._reindex_locked() if locked else self.reindex()
+        except Exception:
+            pass   # already logged and kept in last_error
+
+    def reindex_in_background(self) -> bool:
+        """Start a reindex thread; False when a build is already running."""
+        # taken here, not in the thread, so two requests can't both start one
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        try:
+            threading.Thread(target=self._reindex_logged, args=(True,), name="chroma-reindex", daemon=True).start()
+        except Exception:
+            self._write_lock.release()
+            raise
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _sync_into(self, collection, mark, conn, progress: dict = None):
+        """Upsert every change past `mark` into `collection`; returns (new mark, documents written)."""
+        high_water, last_id = mark
+        written = 0
+        while True:
+            batch = changed_manifests(conn, high_water, last_id, CHROMA_EMBED_BATCH)
+            if not batch:
+                break
+            ids, documents, metadatas = shipment_documents(journey_rows(conn, [m for m, _ in batch]))
+            if ids:
+                collection.upsert(ids=ids, documents=documents, metadatas=metadatas,
+                                  embeddings=get_embeddings(documents))
+            last_id, high_water = batch[-1]
+            written += len(ids)
+            if progress is not None:
+                progress["done"] += len(batch)
+            if len(batch) < CHROMA_EMBED_BATCH:
+                break
+        return (high_water, last_id), written
+
+    def reindex(self) -> dict:
+        """Build a new collection from MySQL and swap it in. Returns a status dict."""
+        if not self._write_lock.acquire(blocking=False):
+            return {"status": "busy", "progress": dict(self.progress)}
+        return self._reindex_locked()
+
+    def _reindex_locked(self) -> dict:
+        """reindex() with _write_lock already held; releases it."""
+        previous = self._collection.name if self._collection is not None else None
+        name = f"{self.base_name}_{time.strftime('%Y%m%d%H%M%S')}"
+        started = time.perf_counter()
+        try:
+            self.state = "building" if previous is None else "reindexing"
+            with connection() as conn:
+                cursor = conn.cursor(buffered=True)
+                cursor.execute("SELECT COUNT(*) FROM shipment_journey")
+                (total,) = cursor.fetchone()
+                cursor.close()
+                self.progress = {"done": 0, "total": total}
+                collection = self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+                mark, written = self._sync_into(collection, (None, None), conn, self.progress)
+
+            self._write_pointer(name, mark)
+            self._collection, self._mark = collection, mark
+            self.state = "ready"
+            if previous and previous != name:
+                self.client.delete_collection(previous)
+            elapsed = time.perf_counter() - started
+            print(f"✅ Indexed {written} shipments into Chroma collection {name} in {elapsed:.1f}s")
+            return {"status": "ok", "collection": name, "documents": written, "seconds": round(elapsed, 2)}
+        except Exception as e:
+            self.last_error = str(e)
+            self.state = "ready" if self.ready else "failed"
+            print(f"❌ Chroma reindex failed: {e}")
+            try:
+                self.client.delete_collection(name)
+            except Exception:
+                pass
+            raise
+        finally:
+            self._write_lock.release()
+
+    def refresh(self) -> int:
+        """Add new / changed shipments to the live collection."""
+        if self._collection is None or not self._write_lock.acquire(blocking=False):
+            return 0
+        try:
+            with connection() as conn:
+                mark, written = self._sync_into(self._collection, self._mark, conn)
+            if mark != self._mark:
+                self._write_pointer(self._collection.name, mark)
+                self._mark = mark
+            self.last_refresh = datetime.now().isoformat(timespec="seconds")
+            if written:
+                print(f"🔁 Chroma refresh: {written} shipments added or updated")
+            return written
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Chroma refresh failed: {e}")
+            return 0
+        finally:
+            self._write_lock.release()
+
+    def query(self, embedding, n_results: int = 5) -> list[str]:
+        collection = self._collection
+        if collection is None:
+            return []
+        results = collection.query(query_embeddings=[embedding], n_results=n_results)
+        return results.get("documents", [[]])[0]
+
+    def stats(self) -> dict:
+        collection = self._collection
+        return {
+            "state": self.state,
+            "collection": collection.name if collection is not None else None,
+            "documents": collection.count() if collection is not None else 0,
+            "progress": dict(self.progress),
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+        }
+
+
+chroma_index = ChromaIndex()
 
-# ✅ OpenAI client (v1.x)
-openai_client = OpenAI(api_key=openai_api_key)
 
 # --- Main RAG Query Function ---
 # ✅ RAG query logic
 def query_gpt_with_rag(user_query: str) -> str:
-    # ✅ Ensure embeddings are loaded at query time
-    load_or_index_shipments()
+    # the index is maintained in the background; never build it here
+    if not chroma_index.ready:
+        return "The shipment index is still being built. Please try again shortly."
 
     # 1. Retrieve relevant documents
-    results = collection.query(
-        query_texts=[user_query],
-        n_results=5
-    )
-    
-    docs = results.get("documents", [[]])[0]
+    # embed through the cache rather than the collection's embedding_function
+    docs = chroma_index.query(get_embeddings([user_query])[0], n_results=5)
     if not docs:
         return "No relevant shipment records were found."
 
@@ -132,7 +298,7 @@ def query_gpt_with_rag(user_query: str) -> str:
     ]
 
     # 3. Call OpenAI API
-    response = openai_client.chat.completions.create(
+    response = clients.openai.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=messages,
         temperature=0.3
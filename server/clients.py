@@ -0,0 +1,143 @@
+"""
+Process-wide OpenAI and Weaviate clients.
+
+Endpoints and helpers take their clients from `clients` instead of building
+their own, so keep-alive connections are reused across requests. The FastAPI
+lifespan calls clients.warmup() at startup. That opens the connections and
+waits for Weaviate to come up. clients.close() releases them on shutdown.
+
+Timeouts and pool sizes come from .env:
+
+    OPENAI_TIMEOUT=30  OPENAI_MAX_RETRIES=2  OPENAI_MAX_CONNECTIONS=20
+    WEAVIATE_URL=http://weaviate:8080  WEAVIATE_CONNECT_TIMEOUT=5  WEAVIATE_READ_TIMEOUT=30
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+import weaviate
+from dotenv import load_dotenv
+from openai import OpenAI
+
+load_dotenv()
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 30))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 2))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
+WEAVIATE_CONNECT_TIMEOUT = float(os.getenv("WEAVIATE_CONNECT_TIMEOUT", 5))
+WEAVIATE_READ_TIMEOUT = float(os.getenv("WEAVIATE_READ_TIMEOUT", 30))
+WEAVIATE_STARTUP_WAIT = int(os.getenv("WEAVIATE_STARTUP_WAIT", 20))   # seconds to wait for the container
+
+
+class LatencyWindow:
+    """Count / mean / max plus p50 and p95 over the last `window` samples."""
+
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+            self._total += seconds
+            self._max = max(self._max, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = sorted(self._samples)
+            count, total, worst = self._count, self._total, self._max
+        if not count:
+            return {"count": 0}
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 4)
+
+        return {
+            "count": count,
+            "mean_s": round(total / count, 4),
+            "max_s": round(worst, 4),
+            "p50_s": pct(0.50),
+            "p95_s": pct(0.95),
+        }
+
+
+class ClientRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._http = None
+        self._openai = None
+        self._weaviate = None
+        self.timings = {}
+
+    @property
+    def openai(self) -> OpenAI:
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._http = httpx.Client(
+                        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=5.0),
+                        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                            max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+                    )
+                    self._openai = OpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        timeout=OPENAI_TIMEOUT,
+                        max_retries=OPENAI_MAX_RETRIES,
+                        http_client=self._http,
+                    )
+        return self._openai
+
+    @property
+    def weaviate(self) -> weaviate.Client:
+        if self._weaviate is None:
+            with self._lock:
+                if self._weaviate is None:
+                    self._weaviate = weaviate.Client(
+                        WEAVIATE_URL,
+                        timeout_config=(WEAVIATE_CONNECT_TIMEOUT, WEAVIATE_READ_TIMEOUT),
+                    )
+        return self._weaviate
+
+    def warmup(self, weaviate: bool = True):
+        """Connect to both services up front so the first request doesn't pay for it."""
+        started = time.perf_counter()
+        # simple retry loop for container startup ordering
+        for _ in range(WEAVIATE_STARTUP_WAIT if weaviate else 0):
+            try:
+                self.weaviate.schema.get()
+                break
+            except Exception:
+                time.sleep(1)
+        else:
+            if weaviate:
+                print(f"⚠️ Weaviate at {WEAVIATE_URL} not reachable after {WEAVIATE_STARTUP_WAIT}s")
+        try:
+            self.openai.models.list()
+        except Exception as e:
+            print(f"⚠️ OpenAI warmup failed: {e}")
+        print(f"🔥 Clients warmed up in {time.perf_counter() - started:.2f}s")
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+            self._http = self._openai = self._weaviate = None
+
+    def record(self, name: str, seconds: float):
+        window = self.timings.get(name)
+        if window is None:
+            window = self.timings.setdefault(name, LatencyWindow())
+        window.record(seconds)
+
+    def stats(self) -> dict:
+        return {name: window.stats() for name, window in self.timings.items()}
+
+
+clients = ClientRegistry()
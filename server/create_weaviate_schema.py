@@ -4,8 +4,7 @@ import weaviate
 import uuid
 import hashlib
 
-#client = weaviate.Client("http://localhost:8080")  # non-Docker version
-client = weaviate.Client("http://weaviate:8080") 
+from clients import clients
 
 
 
@@ -55,7 +54,8 @@ schema = {
 }
 
 
-def ensure_schema():
+def ensure_schema(client: weaviate.Client = None):
+    client = client or clients.weaviate
     # Check and create schema
     if not client.schema.contains(schema):
         client.schema.create(schema)
@@ -3,7 +3,7 @@ import re
 import json
 from dateutil import parser
 from typing import Optional, Tuple
-from utils import  format_hours_minutes
+from shipment_columns import ShipmentColumns, analyze
 
 class CryoTraceAI:
     def __init__(self, openai_client, cutoff_date: str = None):
@@ -114,38 +114,6 @@ class CryoTraceAI:
             return []
 
     def analyze_shipments(self, shipment_logs, direction):
-        filtered = []
-        for s in shipment_logs:
-            pickup_time_str = s.get("pickup_time")
-            if not pickup_time_str:
-                continue
-
-            try:
-                pickup_dt = datetime.fromisoformat(pickup_time_str.replace("Z", ""))
-            except ValueError:
-                continue
-
-            if direction == 'before':
-                if self.cutoff_dt and pickup_dt > self.cutoff_dt:
-                    continue
-            elif direction == 'after':
-                 if self.cutoff_dt and pickup_dt < self.cutoff_dt:
-                    continue   
-       
-            # if no before or after, then include this record
-            transit_time = format_hours_minutes((datetime.strptime(s['dropoff_time'] , "%Y-%m-%dT%H:%M:%SZ") - \
-                datetime.strptime(s['pickup_time'], "%Y-%m-%dT%H:%M:%SZ")).seconds)
-
-
-            filtered.append({
-                "shipment_id": s.get("manifest_id"),
-                "shipper_id": s.get("shipper_id"),
-                "pickup_time": pickup_time_str,
-                "pickup_contact": s.get("origin_contact"),
-                "delivery_time": s.get("dropoff_time"),
-                "receiver": s.get("destination_contact"),
-                "transit_time_hours": transit_time,
-                "evaporation_rate_kg_per_hour": s.get("evaporation_rate"),
-            })
-
-        return filtered
\ No newline at end of file
+        # columnar: one NumPy pass over the batch instead of strptime per row (see shipment_columns.py)
+        batch = ShipmentColumns.from_rows(shipment_logs)
+        return analyze(batch, cutoff=self.cutoff_dt, direction=direction).to_records()
\ No newline at end of file
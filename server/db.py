@@ -1,10 +1,23 @@
 import os
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import mysql.connector
 
 load_dotenv()
 
-def get_connection():
+# Pool sizing / health settings (override via .env)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))          # seconds to wait for a free connection
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", 30))    # idle seconds before a checkout is pinged
+
+
+def _connect():
     return mysql.connector.connect(
         host=os.getenv("DB_HOST"),
         port=int(os.getenv("DB_PORT")),
@@ -13,7 +26,218 @@ def get_connection():
         database=os.getenv("DB_NAME")
     )
 
-# locations table can expand as new cities/locations are needed; this will update the locations table in the MySql DB 
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of mysql.connector connections.
+
+    At most `size` connections exist at once; callers block (up to `timeout`
+    seconds) when all of them are checked out. Idle connections are pinged on
+    checkout once they have been idle longer than `ping_after` seconds, and
+    dead ones are replaced transparently.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 ping_after: float = DB_POOL_PING_AFTER, connect=_connect):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect = connect
+        self._idle = deque()          # (connection, last_used_monotonic)
+        self._created = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._replaced = 0
+
+    def acquire(self):
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                conn, last_used = None, None
+                self._created += 1
+            self._in_use += 1
+
+            wait = time.monotonic() - start
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                self._replaced += 1
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken: bool = False):
+        if not broken:
+            try:
+                # a result set nobody read (e.g. a stream the client walked away
+                # from) would fail the next borrower's cursor(): drop the connection
+                if conn.unread_result:
+                    broken = True
+                # never hand out a connection with an open transaction
+                elif conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._created -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if broken:
+            self._discard(conn)
+
+    def _is_healthy(self, conn, last_used) -> bool:
+        try:
+            if not conn.is_connected():
+                return False
+            if time.monotonic() - last_used > self.ping_after:
+                conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._created -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_s": round(self._wait_time, 4),
+                "wait_time_max_s": round(self._max_wait, 4),
+                "timeouts": self._timeouts,
+                "replaced_unhealthy": self._replaced,
+            }
+
+
+pool = ConnectionPool()
+
+
+@contextmanager
+def connection():
+    """
+    Check a connection out of the pool and always return it, even if the
+    body raises. Uncommitted work is rolled back on the way back in.
+    """
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except mysql.connector.errors.OperationalError:
+        broken = True
+        raise
+    finally:
+        pool.release(conn, broken=broken)
+
+
+class _PooledConnection:
+    """Proxy returned by get_connection(): close() hands the connection back to the pool."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            pool.release(conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def get_connection():
+    # kept for scripts that manage the connection by hand; prefer `with connection() as conn:`
+    return _PooledConnection(pool.acquire())
+
+
+def pool_stats() -> dict:
+    return pool.stats()
+
+
+# One worker thread per pooled connection: async handlers hand their blocking
+# mysql.connector work to this executor so the event loop never waits on the DB.
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+
+def _run_with_connection(fn, args, kwargs):
+    with connection() as conn:
+        return fn(conn, *args, **kwargs)
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Await fn(conn, *args, **kwargs) on a pooled connection in the DB thread pool.
+
+    Use this from `async def` endpoints instead of calling the driver directly:
+
+        rows = await run_db(fetch_routes, shipper_id)
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_run_with_connection, fn, args, kwargs)
+    return await loop.run_in_executor(_db_executor, call)
+
+# locations table can expand as new cities/locations are needed; this will update the locations table in the MySql DB
 def get_or_create_location_id(cursor, location_name):
     cursor.execute("SELECT id FROM locations WHERE name = %s", (location_name,))
     result = cursor.fetchone()
@@ -0,0 +1,179 @@
+"""
+Persistent embedding cache shared by ingestion and the query endpoints.
+
+Vectors are stored in SQLite keyed by sha256(model + "\\0" + text), as float32
+blobs, so the same summary or question is only ever sent to the embeddings
+API once per model. The table is bounded to EMBEDDING_CACHE_MAX_ENTRIES rows;
+the least recently used entries are evicted when it grows past that.
+
+Hits do not write: their access times are buffered in memory and flushed in
+one transaction every EMBEDDING_CACHE_TOUCH_INTERVAL seconds (and before any
+eviction), and the row count is tracked in memory rather than recounted.
+
+    vectors = embedding_cache.embed("text-embedding-3-small", texts, call_api)
+
+`call_api(missing_texts)` is only invoked for the texts that are not cached.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+EMBEDDING_CACHE_TOUCH_INTERVAL = float(os.getenv("EMBEDDING_CACHE_TOUCH_INTERVAL", 60))
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 touch_interval: float = EMBEDDING_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+        self._touched = {}      # key -> last access not yet written
+        self._last_flush = time.monotonic()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _db(self):
+        # opened lazily so importing the module never touches the filesystem
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key         TEXT PRIMARY KEY,
+                    model       TEXT NOT NULL,
+                    dims        INTEGER NOT NULL,
+                    vector      BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+            # counted once per process; put_many/_evict keep it current afterwards
+            (self._count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return self._conn
+
+    def _existing(self, db, keys: list[str]) -> set[str]:
+        found = set()
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            found.update(k for (k,) in db.execute(f"SELECT key FROM embeddings WHERE key IN ({placeholders})", chunk))
+        return found
+
+    def _flush_touches(self, db):
+        """Write the buffered access times. Caller holds the lock and commits."""
+        if self._touched:
+            db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                           [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def get_many(self, model: str, texts: list[str]) -> list:
+        """Cached vector for each text, or None where it is missing."""
+        keys = [cache_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            db = self._db()
+            unique = list(dict.fromkeys(keys))
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+                found.update((key, _unpack(blob)) for key, blob in rows)
+            if found:
+                now = time.time()
+                self._touched.update(dict.fromkeys(found, now))
+                if time.monotonic() - self._last_flush >= self.touch_interval:
+                    self._flush_touches(db)
+                    db.commit()
+            hits = sum(1 for k in keys if k in found)
+            self._hits += hits
+            self._misses += len(keys) - hits
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model: str, texts: list[str], vectors: list):
+        now = time.time()
+        rows = {cache_key(model, t): (model, len(v), _pack(v), now) for t, v in zip(texts, vectors)}
+        with self._lock:
+            db = self._db()
+            added = len(rows) - len(self._existing(db, list(rows)))
+            db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                           [(key, *row) for key, row in rows.items()])
+            for key in rows:
+                self._touched.pop(key, None)
+            self._count += added
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db):
+        excess = self._count - self.max_entries
+        if excess > 0:
+            # LRU order has to see the hits that are still buffered
+            self._flush_touches(db)
+            deleted = db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (excess,)).rowcount
+            self._count -= deleted
+            self._evictions += deleted
+
+    def embed(self, model: str, texts: list[str], embed_fn) -> list:
+        """
+        Vectors for `texts`, calling embed_fn(missing_texts) -> vectors only for
+        cache misses (each distinct text once) and storing what it returns.
+        """
+        vectors = self.get_many(model, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, embed_fn(missing)))
+            self.put_many(model, missing, [fresh[t] for t in missing])
+            vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._db()
+            entries = self._count
+            lookups = self._hits + self._misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush_touches(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,324 @@
+"""
+Evaporation rollups per shipper, per lane (origin -> destination) and per
+pickup day, maintained as trips complete.
+
+Each rollup row keeps:
+
+- trip count
+- sum, min and max of the evaporation rate (kg/h)
+- total LN2 lost (pickup weight - dropoff weight)
+
+A log-spaced histogram of rates sits alongside it in
+evaporation_rollup_bucket. Buckets are ROLLUP_GAMMA wide (5% by default), so
+p50/p95 read from the histogram are within about 2.5% of the exact value.
+Reading a rollup costs the same however many trips it covers.
+
+The pickup and dropoff endpoints call apply_journey_change() in their own
+transaction, after refresh_shipment_journey(). What a trip last contributed
+is kept on its shipment_journey row (the rolled_up_* guard columns). A
+re-recorded pickup or dropoff therefore replaces that contribution instead of
+counting the trip twice.
+
+    python evaporation_rollups.py --rebuild     # backfill / repair from shipment_journey
+"""
+import argparse
+import math
+import os
+from datetime import date, datetime
+
+ROLLUP_GAMMA = float(os.getenv("ROLLUP_GAMMA", 1.05))
+ROLLUP_MIN_RATE = 0.001   # kg/h; smaller (or negative) rates share bucket 0
+
+SCOPES = ("shipper", "lane", "day")
+
+_LOG_GAMMA = math.log(ROLLUP_GAMMA)
+
+
+def bucket_for(rate: float) -> int:
+    if rate <= ROLLUP_MIN_RATE:
+        return 0
+    return 1 + int(math.log(rate / ROLLUP_MIN_RATE) / _LOG_GAMMA)
+
+
+def bucket_value(bucket: int) -> float:
+    """Representative rate of a bucket (geometric midpoint of its bounds)."""
+    if bucket <= 0:
+        return ROLLUP_MIN_RATE
+    return ROLLUP_MIN_RATE * ROLLUP_GAMMA ** (bucket - 0.5)
+
+
+def percentile(buckets: dict, q: float, low: float = None, high: float = None):
+    """q-quantile (0..1) from {bucket: trips}, clamped to the exact min / max when given."""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(q * total))   # nearest-rank
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= rank:
+            value = bucket_value(bucket)
+            break
+    if low is not None:
+        value = max(value, low)
+    if high is not None:
+        value = min(value, high)
+    return value
+
+
+def lane_key(journey: dict) -> str:
+    def place(city, state):
+        return ", ".join(p for p in (city, state) if p) or "?"
+
+    return (f"{place(journey.get('origin_city'), journey.get('origin_state'))} → "
+            f"{place(journey.get('dest_city'), journey.get('dest_state'))}")
+
+
+def rollup_keys(lane: str, day) -> list[tuple[str, str]]:
+    day = day.isoformat() if isinstance(day, (date, datetime)) else str(day)
+    return [("shipper", ""), ("lane", lane), ("day", day[:10])]
+
+
+_ADD_SQL = """
+    INSERT INTO evaporation_rollup (shipper_id, scope, rollup_key, trips, rate_sum, rate_min, rate_max, loss_kg)
+    VALUES (%s, %s, %s, 1, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        trips = trips + 1,
+        rate_sum = rate_sum + VALUES(rate_sum),
+        rate_min = LEAST(COALESCE(rate_min, VALUES(rate_min)), VALUES(rate_min)),
+        rate_max = GREATEST(COALESCE(rate_max, VALUES(rate_max)), VALUES(rate_max)),
+        loss_kg = loss_kg + VALUES(loss_kg)
+"""
+
+_ADD_BUCKET_SQL = """
+    INSERT INTO evaporation_rollup_bucket (shipper_id, scope, rollup_key, bucket, trips)
+    VALUES (%s, %s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE trips = trips + 1
+"""
+
+_JOURNEY_COLUMNS = """
+    SELECT manifest_id, shipper_id, evaporation_rate_kg_per_hour AS rate, pickup_weight, dropoff_weight, pickup_time,
+           origin_city, origin_state, dest_city, dest_state,
+           rolled_up_rate, rolled_up_loss, rolled_up_lane, rolled_up_day
+    FROM shipment_journey
+"""
+_SELECT_JOURNEY_SQL = _JOURNEY_COLUMNS + """
+    WHERE manifest_id = %s
+    FOR UPDATE
+"""
+
+_GUARD_SQL = """
+    UPDATE shipment_journey
+    SET rolled_up_rate = %s, rolled_up_loss = %s, rolled_up_lane = %s, rolled_up_day = %s,
+        updated_at = updated_at
+    WHERE manifest_id = %s
+"""
+
+
+def _add(cursor, shipper_id, lane, day, rate, loss):
+    for scope, key in rollup_keys(lane, day):
+        cursor.execute(_ADD_SQL, (shipper_id, scope, key, rate, rate, rate, loss))
+        cursor.execute(_ADD_BUCKET_SQL, (shipper_id, scope, key, bucket_for(rate)))
+
+
+def _remove(cursor, shipper_id, lane, day, rate, loss):
+    for scope, key in rollup_keys(lane, day):
+        cursor.execute("""
+            UPDATE evaporation_rollup
+            SET trips = trips - 1, rate_sum = rate_sum - %s, loss_kg = loss_kg - %s
+            WHERE shipper_id = %s AND scope = %s AND rollup_key = %s
+        """, (rate, loss, shipper_id, scope, key))
+        cursor.execute("""
+            UPDATE evaporation_rollup_bucket SET trips = trips - 1
+            WHERE shipper_id = %s AND scope = %s AND rollup_key = %s AND bucket = %s
+        """, (shipper_id, scope, key, bucket_for(rate)))
+    cursor.execute("DELETE FROM evaporation_rollup_bucket WHERE shipper_id = %s AND trips <= 0", (shipper_id,))
+    cursor.execute("DELETE FROM evaporation_rollup WHERE shipper_id = %s AND trips <= 0", (shipper_id,))
+
+
+def _recompute_extremes(cursor, shipper_id, manifest_id, lane, day):
+    """min / max can't be un-merged; rescan the guard columns (rare: only when a trip is re-recorded)."""
+    filters = {"shipper": ("", []), "lane": ("AND rolled_up_lane = %s", [lane]), "day": ("AND rolled_up_day = %s", [day])}
+    for scope, key in rollup_keys(lane, day):
+        extra, params = filters[scope]
+        cursor.execute(f"""
+            UPDATE evaporation_rollup r
+            JOIN (
+                SELECT MIN(rolled_up_rate) AS lo, MAX(rolled_up_rate) AS hi
+                FROM shipment_journey
+                WHERE shipper_id = %s AND rolled_up_rate IS NOT NULL AND manifest_id != %s {extra}
+            ) x
+            SET r.rate_min = x.lo, r.rate_max = x.hi
+            WHERE r.shipper_id = %s AND r.scope = %s AND r.rollup_key = %s
+        """, [shipper_id, manifest_id] + params + [shipper_id, scope, key])
+
+
+def _journey_values(journey: dict) -> tuple:
+    """(rate, loss, lane, day) the trip contributes, or all None when it contributes nothing."""
+    rate = journey["rate"]
+    loss = None
+    if rate is not None and journey["pickup_weight"] is not None and journey["dropoff_weight"] is not None:
+        loss = float(journey["pickup_weight"]) - float(journey["dropoff_weight"])
+    day = journey["pickup_time"].date() if journey["pickup_time"] else None
+    if rate is None or day is None:
+        return None, None, None, None
+    return rate, loss, lane_key(journey), day
+
+
+def apply_journey_change(conn, manifest_id: str) -> bool:
+    """
+    Bring the rollups in line with the manifest's current shipment_journey row.
+    Call after refresh_shipment_journey(), inside the same transaction; does not
+    commit. Returns True when the rollups changed.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute(_SELECT_JOURNEY_SQL, (manifest_id,))
+    journey = cursor.fetchone()
+    if journey is None:
+        cursor.close()
+        return False
+
+    shipper_id = journey["shipper_id"]
+    old = (journey["rolled_up_rate"], journey["rolled_up_loss"], journey["rolled_up_lane"], journey["rolled_up_day"])
+    new = _journey_values(journey)
+    rate, loss, lane, day = new
+    if old == new:
+        cursor.close()
+        return False
+
+    if old[0] is not None:
+        _remove(cursor, shipper_id, old[2], old[3], old[0], old[1] or 0.0)
+        _recompute_extremes(cursor, shipper_id, manifest_id, old[2], old[3])
+    if new[0] is not None:
+        _add(cursor, shipper_id, lane, day, rate, loss or 0.0)
+    cursor.execute(_GUARD_SQL, (*new, manifest_id))
+    cursor.close()
+    return True
+
+
+def rebuild_rollups(conn) -> int:
+    """Recompute every rollup from shipment_journey in one pass. Returns the number of trips counted."""
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute("DELETE FROM evaporation_rollup_bucket")
+    cursor.execute("DELETE FROM evaporation_rollup")
+    cursor.execute("""
+        UPDATE shipment_journey
+        SET rolled_up_rate = NULL, rolled_up_loss = NULL, rolled_up_lane = NULL, rolled_up_day = NULL,
+            updated_at = updated_at
+    """)
+    cursor.execute(_JOURNEY_COLUMNS + """
+        WHERE evaporation_rate_kg_per_hour IS NOT NULL AND pickup_time IS NOT NULL
+    """)
+    rollups, buckets, guards = {}, {}, []
+    for journey in cursor.fetchall():
+        rate, loss, lane, day = _journey_values(journey)
+        guards.append((rate, loss, lane, day, journey["manifest_id"]))
+        for scope, key in rollup_keys(lane, day):
+            row = (journey["shipper_id"], scope, key)
+            trips, rate_sum, low, high, loss_kg = rollups.get(row, (0, 0.0, rate, rate, 0.0))
+            rollups[row] = (trips + 1, rate_sum + rate, min(low, rate), max(high, rate), loss_kg + (loss or 0.0))
+            bucket = (*row, bucket_for(rate))
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+    if guards:
+        cursor.executemany(_GUARD_SQL, guards)
+        cursor.executemany("""
+            INSERT INTO evaporation_rollup (shipper_id, scope, rollup_key, trips, rate_sum, rate_min, rate_max, loss_kg)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, [(*row, *values) for row, values in rollups.items()])
+        cursor.executemany("""
+            INSERT INTO evaporation_rollup_bucket (shipper_id, scope, rollup_key, bucket, trips)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(*bucket, trips) for bucket, trips in buckets.items()])
+    conn.commit()
+    cursor.close()
+    return len(guards)
+
+
+def init_rollups(conn):
+    """Startup hook (after init_shipment_journey): backfill the rollups the first time they are empty."""
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM evaporation_rollup)")
+    (populated,) = cursor.fetchone()
+    cursor.close()
+    if not populated:
+        print("🔄 Backfilling evaporation rollups...")
+        print(f"✅ Evaporation rollups ready ({rebuild_rollups(conn)} trips)")
+
+
+def read_rollups(conn, shipper_id: str, scope: str = None, start: str = None, end: str = None) -> dict:
+    """
+    The shipper's rollups, shaped for /api/analytics/evaporation. `scope` picks
+    one of SCOPES (default all); `start` / `end` (YYYY-MM-DD, inclusive) bound
+    the per-day rows.
+    """
+    where = ["shipper_id = %s"]
+    params = [shipper_id]
+    if scope:
+        where.append("scope = %s")
+        params.append(scope)
+    if start:
+        where.append("(scope != 'day' OR rollup_key >= %s)")
+        params.append(start)
+    if end:
+        where.append("(scope != 'day' OR rollup_key <= %s)")
+        params.append(end)
+    clause = " AND ".join(where)
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT scope, rollup_key, trips, rate_sum, rate_min, rate_max, loss_kg
+        FROM evaporation_rollup WHERE {clause}
+        ORDER BY scope, rollup_key
+    """, params)
+    rollups = cursor.fetchall()
+    cursor.execute(f"""
+        SELECT scope, rollup_key, bucket, trips
+        FROM evaporation_rollup_bucket WHERE {clause} AND trips > 0
+    """, params)
+    buckets = {}
+    for row in cursor.fetchall():
+        buckets.setdefault((row["scope"], row["rollup_key"]), {})[row["bucket"]] = row["trips"]
+    cursor.close()
+
+    result = {"shipper_id": shipper_id, "shipper": None, "lanes": [], "days": []}
+    for row in rollups:
+        summary = summarize(row, buckets.get((row["scope"], row["rollup_key"]), {}))
+        if row["scope"] == "shipper":
+            result["shipper"] = summary
+        elif row["scope"] == "lane":
+            result["lanes"].append({"lane": row["rollup_key"], **summary})
+        else:
+            result["days"].append({"day": row["rollup_key"], **summary})
+    return result
+
+
+def summarize(row: dict, buckets: dict) -> dict:
+    trips = row["trips"]
+    low, high = row["rate_min"], row["rate_max"]
+    return {
+        "trips": trips,
+        "mean_kg_per_hour": round(row["rate_sum"] / trips, 4) if trips else None,
+        "p50_kg_per_hour": _round(percentile(buckets, 0.50, low, high)),
+        "p95_kg_per_hour": _round(percentile(buckets, 0.95, low, high)),
+        "min_kg_per_hour": _round(low),
+        "max_kg_per_hour": _round(high),
+        "total_loss_kg": round(row["loss_kg"], 3),
+    }
+
+
+def _round(value, digits: int = 4):
+    return round(value, digits) if value is not None else None
+
+
+if __name__ == "__main__":
+    from db import connection
+    from migrate import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Maintain the evaporation rollups")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup from shipment_journey")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        apply_migrations(conn)
+        if args.rebuild:
+            print(f"✅ Rebuilt evaporation rollups ({rebuild_rollups(conn)} trips)")
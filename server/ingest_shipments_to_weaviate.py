@@ -1,23 +1,41 @@
+"""
+Load every shipment journey into the Weaviate "Shipment" class.
+
+Runs as a pipeline: rows are summarised, the summaries are embedded in
+batches of INGEST_EMBED_BATCH texts with up to INGEST_EMBED_CONCURRENCY
+requests in flight (retrying rate limits / transient errors with backoff),
+and the vectors are written through Weaviate's batch import API keyed by the
+deterministic shipment UUID, so re-running the ingest updates objects in
+place instead of duplicating them.
+
+    python ingest_shipments_to_weaviate.py [--embed-batch 100] [--concurrency 4]
+"""
+import argparse
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime
-import mysql.connector
 
-from openai import OpenAI
-import weaviate
-import uuid
-import hashlib
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from clients import clients
+from db import connection
+from embedding_cache import embedding_cache
+from weaviate_writer import ShipmentWriter, WEAVIATE_BATCH
+from journey_query import INGEST_FIELDS, build_journey_query
 
 
 # Load environment variables
 load_dotenv()
 
-# OpenAI client
-openai_client: OpenAI = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBED_MODEL = os.getenv("INGEST_EMBED_MODEL", "text-embedding-3-small")
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", 100))             # texts per embeddings request
+EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", 4))    # embeddings requests in flight
+EMBED_RETRIES = int(os.getenv("INGEST_EMBED_RETRIES", 5))
 
-# Weaviate client (older syntax)
-#weaviate_client = weaviate.Client("http://localhost:8080")  # non-Docker version
-weaviate_client = weaviate.Client("http://weaviate:8080") 
+_RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
 
 def to_rfc3339(dt) -> str:
     """
@@ -34,10 +52,6 @@ def to_rfc3339(dt) -> str:
         # Already timezone-aware — use isoformat (includes offset)
         return dt.isoformat()
 
-def generate_uuid_for_shipment(shipper_id: str, manifest_id: str) -> str:
-    unique_key = f"{shipper_id}::{manifest_id}"
-    return str(uuid.UUID(hashlib.md5(unique_key.encode()).hexdigest()))
-
 # Create the Shipment class schema if it doesn't exist
 def ensure_shipment_schema():
     # Define the schema for "Shipment"
@@ -78,22 +92,19 @@ def ensure_shipment_schema():
     }
 
     # Check if the class already exists
-    existing_schema = weaviate_client.schema.get()
+    existing_schema = clients.weaviate.schema.get()
     shipment_class = next((cls for cls in existing_schema.get("classes", []) if cls["class"] == "Shipment"), None)
     
     if not shipment_class:
         # Create the schema
-        weaviate_client.schema.create(schema)
+        clients.weaviate.schema.create(schema)
         print("✅ Shipment class schema created.")
     else:
         print("✅ Shipment class already exists.")
 
-# Ensure the schema exists first
-ensure_shipment_schema()
-
 # Add fields to Weaviate schema if they don't exist yet
 def ensure_weaviate_field(name: str, data_type: str = "text"):
-    existing_schema = weaviate_client.schema.get()
+    existing_schema = clients.weaviate.schema.get()
     shipment_class = next((cls for cls in existing_schema["classes"] if cls["class"] == "Shipment"), None)
 
     if shipment_class:
@@ -107,189 +118,149 @@ def ensure_weaviate_field(name: str, data_type: str = "text"):
         "name": name,
         "dataType": ["text"] if data_type == "text" else ["date"],
     }
-    weaviate_client.schema.property.create("Shipment", prop)
+    clients.weaviate.schema.property.create("Shipment", prop)
     print(f"✅ Added field: {name}")
 
-# Add new fields (these should already be in the schema, but keeping for compatibility)
-ensure_weaviate_field("origin")
-ensure_weaviate_field("destination")
-ensure_weaviate_field("scheduled_ship_time", data_type="date")
-ensure_weaviate_field("expected_receive_time", data_type="date")
-ensure_weaviate_field("origin_contact")
-ensure_weaviate_field("destination_contact")
-
-# Connect to MySQL
-db = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    port=int(os.getenv("DB_PORT", 3306)),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    database=os.getenv("DB_NAME")
-)
-
-cursor = db.cursor(dictionary=True)
-
-# SQL Query
-query = """
-    SELECT
-        m.manifest_id,
-        m.shipper_id,
-
-        lp.company_name AS origin_company,
-        lp.company_address AS origin_address,
-        lp.city AS origin_city,
-        lp.state AS origin_state,
-
-        ld.company_name AS destination_company,
-        ld.company_address AS destination_address,
-        ld.city AS destination_city,
-        ld.state AS destination_state,
-
-        m.scheduled_ship_time,
-        m.expected_receive_time,
-        m.origin_contact_name AS origin_contact,
-        pe.actual_departure_at AS pickup_time,
-        pe.driver_user_id AS pickup_user_id,
-        pe.measured_weight_kg AS pickup_weight,
-        de.received_weight_kg AS dropoff_weight,
-        de.actual_receive_time AS dropoff_time,
-        de.received_by_user_id AS dropoff_user_id,
-        de.received_contact_name AS destination_contact
-    FROM shipping_manifest m
-    LEFT JOIN pickup_event pe 
-        ON m.manifest_id = pe.manifest_id
-    LEFT JOIN dropoff_event de 
-        ON m.manifest_id = de.manifest_id
-    LEFT JOIN container_weight_event cw_pickup 
-        ON m.manifest_id = cw_pickup.manifest_id AND cw_pickup.weight_type = 'pickup'
-    LEFT JOIN container_weight_event cw_dropoff 
-        ON m.manifest_id = cw_dropoff.manifest_id AND cw_dropoff.weight_type = 'dropoff'
-    LEFT JOIN locations lp 
-        ON cw_pickup.location_id = lp.id
-    LEFT JOIN locations ld 
-        ON cw_dropoff.location_id = ld.id
 
-"""
+def build_shipment(row):
+    """Summary text and Weaviate properties for one journey row."""
+    pickup = row['pickup_time']
+    dropoff = row['dropoff_time']
+    if pickup is None or dropoff is None:
+        raise ValueError("shipment has not been picked up and delivered yet")
+    pickup_weight = float(row['pickup_weight'])
+    dropoff_weight = float(row['dropoff_weight'])
+
+    # Compute transit duration and evaporation rate
+    hours = (dropoff - pickup).total_seconds() / 3600.0
+    evap_rate = round((pickup_weight - dropoff_weight) / hours, 4) if hours > 0 else 0.0
+
+    origin = f"{row['origin_company']}, {row['origin_address']}, {row['origin_city']}, {row['origin_state']}"
+    destination = f"{row['destination_company']}, {row['destination_address']}, {row['destination_city']}, {row['destination_state']}"
+
+    #  shorter version which should still have the desired
+    summary = (
+        f"Shipper {row['shipper_id']} ({row['manifest_id']}) was picked up from origin "
+        f"by {row['origin_contact']} on {pickup.strftime('%Y-%m-%d %H:%M')} and delivered to "
+        f"destination (received by {row['destination_contact']}) on {dropoff.strftime('%Y-%m-%d %H:%M')}. "
+        f"Transit time was {hours:.2f} hours. Evaporation rate: {evap_rate:.4f} kg/hour."
+    )
+
+    shipment_data = {
+        "shipper_id": row["shipper_id"],
+        "manifest_id": row["manifest_id"],
+        "origin": origin,
+        "destination": destination,
+        "origin_contact": row["origin_contact"],
+        "destination_contact": row["destination_contact"],
+        "pickup_time": to_rfc3339(pickup),
+        "dropoff_time": to_rfc3339(dropoff),
+        "scheduled_ship_time": to_rfc3339(row["scheduled_ship_time"]),
+        "expected_receive_time": to_rfc3339(row["expected_receive_time"]),
+        "pickup_user_id": row["pickup_user_id"],
+        "dropoff_user_id": row["dropoff_user_id"],
+        "pickup_weight": pickup_weight,
+        "dropoff_weight": dropoff_weight,
+        "evaporation_rate": evap_rate,
+        "origin_company_name": row['origin_company'],
+        "origin_company_address": row['origin_address'],
+        "origin_company_city": row['origin_city'],
+        "origin_company_state": row['origin_state'],
+        "destination_company_name": row['destination_company'],
+        "destination_company_address": row['destination_address'],
+        "destination_company_city": row['destination_city'],
+        "destination_company_state": row['destination_state'],
+        "summary_text": summary  # used only for semantic vector search
+    }
+    return summary, shipment_data
 
-cursor.execute(query)
-rows = cursor.fetchall()
-
-
-
-for row in rows:
-    try:
-        pickup_time = row['pickup_time'].strftime("%Y-%m-%dT%H:%M:%SZ")
-        dropoff_time = row['dropoff_time'].strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        pickup = row['pickup_time']
-        dropoff = row['dropoff_time']
-        pickup_weight = float(row['pickup_weight'])
-        dropoff_weight = float(row['dropoff_weight'])
-
-        if row['shipper_id'] == 'shipper-ln2-30-0009':
-            print()
-        # Compute transit duration and evaporation rate
-        hours = (dropoff - pickup).total_seconds() / 3600.0
-        evap_rate = round((pickup_weight - dropoff_weight) / hours, 4) if hours > 0 else 0.0
-
-        origin = f"{row['origin_company']}, {row['origin_address']}, {row['origin_city']}, {row['origin_state']}"
-        destination = f"{row['destination_company']}, {row['destination_address']}, {row['destination_city']}, {row['destination_state']}"
-
-        # Construct summary for embedding
-        '''summary = (
-            f"🔹 Shipper ID: {row['shipper_id']}\n"
-            f"📦 Manifest ID: {row['manifest_id']}\n"
-            f"📍 Origin: {row['origin']}\n"
-            f"👤 Origin Contact: {row['origin_contact']}\n"
-            f"🕓 Pickup Time: {pickup.strftime('%Y-%m-%d %H:%M')}\n"
-            f"📍 Destination: {row['destination']}\n"
-            f"👤 Destination Contact: {row['destination_contact']}\n"
-            f"🕓 Dropoff Time: {dropoff.strftime('%Y-%m-%d %H:%M')}\n"
-            f"🕓 Scheduled Ship Time: {row['scheduled_ship_time'].strftime('%Y-%m-%d %H:%M')}\n"
-            f"🕓 Expected Receive Time: {row['expected_receive_time'].strftime('%Y-%m-%d %H:%M')}\n"
-            f"⏱️ In Transit Duration: {hours:.2f} hours\n"
-            f"⚖️ Pickup Weight: {pickup_weight:.2f} kg\n"
-            f"⚖️ Dropoff Weight: {dropoff_weight:.2f} kg\n"
-            f"💧 Evaporation Rate: {evap_rate:.4f} kg/hour\n"
-            f"📍 Origin Company Name: {row['origin_company']}\n"
-            f"📍 Origin Company Address: {row['origin_address']}\n"
-            f"📍 Origin Company City: {row['origin_city']} \n" 
-            f"📍 Origin Company State: {row['origin_state']} \n"           
-            f"📍 Destination Company Name: {row['destination_company']}\n"
-            f"📍 Destination Company Address: {row['destination_address']}\n"
-            f"📍 Destination Company City: {row['destination_city']}\n"
-            f"📍 Destination Company State: {row['destination_state']}  \n"                                  
-        )'''
-
-        #  shorter version which should still have the desired 
-        summary = (
-            f"Shipper {row['shipper_id']} ({row['manifest_id']}) was picked up from origin "
-            f"by {row['origin_contact']} on {pickup.strftime('%Y-%m-%d %H:%M')} and delivered to "
-            f"destination (received by {row['destination_contact']}) on {dropoff.strftime('%Y-%m-%d %H:%M')}. "
-            f"Transit time was {hours:.2f} hours. Evaporation rate: {evap_rate:.4f} kg/hour."
-        )
-
-        # create UUID from shipper_id and manifest_id
-        uuid_str = generate_uuid_for_shipment(row["shipper_id"], row["manifest_id"])
-
-        # Get embedding from OpenAI
-        embedding_response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=summary
-        )
-        embedding = embedding_response.data[0].embedding
-
-        # Insert into Weaviate
-        shipment_data = {
-            "shipper_id": row["shipper_id"],
-            "manifest_id": row["manifest_id"],
-            "origin": origin,
-            "destination": destination,
-            "origin_contact": row["origin_contact"],
-            "destination_contact": row["destination_contact"],
-            "pickup_time": pickup.isoformat() + "Z",
-            "dropoff_time": dropoff.isoformat() + "Z",
-            "scheduled_ship_time": row["scheduled_ship_time"].isoformat() + "Z",
-            "expected_receive_time": row["expected_receive_time"].isoformat() + "Z",
-            "pickup_user_id": row["pickup_user_id"],
-            "dropoff_user_id": row["dropoff_user_id"],
-            "pickup_weight": pickup_weight,
-            "dropoff_weight": dropoff_weight,
-            "evaporation_rate": evap_rate,
-            "origin_company_name": row['origin_company'],
-            "origin_company_address": row['origin_address'],
-            "origin_company_city": row['origin_city'],
-            "origin_company_state": row['origin_state'],
-            "destination_company_name": row['destination_company'],
-            "destination_company_address": row['destination_address'],
-            "destination_company_city": row['destination_city'],
-            "destination_company_state": row['destination_state'],
-            "summary_text": summary  # used only for semantic vector search
-        }
-
-        weaviate_client.data_object.create(
-            data_object=shipment_data,        # all your structured fields
-            class_name="Shipment",            # the class name in your schema
-            vector=embedding                  # your precomputed vector (e.g., from OpenAI)
-        )
-
-        # Check if object already exists in Weaviate
-        '''if weaviate_client.data_object.exists(uuid_str):
-            weaviate_client.data_object.update(
-                uuid=uuid_str,
-                class_name="Shipment",
-                data_object=shipment_data
-            )
-            print(f"🔁 Updated: {row['shipper_id']} / {row['manifest_id']}")
-        else:
-            weaviate_client.data_object.create(
-                data_object=shipment_data,
-                class_name="Shipment",
-                uuid=uuid_str,
-                vector=embedding
-            )'''
-        print(f"✅ Created: {row['shipper_id']} / {row['manifest_id']}")
-
-
-    except Exception as e:
-        print(f"❌ Error processing {row['shipper_id']} / {row.get('manifest_id')}: {e}")
+
+def embed_batch(texts: list[str], model: str = EMBED_MODEL, retries: int = EMBED_RETRIES) -> list[list[float]]:
+    """Vectors for `texts`; only summaries missing from the embedding cache hit the API."""
+    return embedding_cache.embed(model, texts, lambda missing: _request_embeddings(missing, model, retries))
+
+
+def _request_embeddings(texts: list[str], model: str, retries: int) -> list[list[float]]:
+    """One embeddings request for `texts`, retried with exponential backoff + jitter."""
+    for attempt in range(retries + 1):
+        try:
+            response = clients.openai.embeddings.create(model=model, input=texts)
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        except _RETRYABLE as e:
+            if attempt == retries:
+                raise
+            delay = min(30.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.25)
+            print(f"⚠️ Embedding batch of {len(texts)} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def embed_all(texts: list[str], batch_size: int = EMBED_BATCH, concurrency: int = EMBED_CONCURRENCY):
+    """
+    Yield (chunk_start, vectors) as batches complete, in input order, with at most
+    `concurrency` embeddings requests in flight.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed") as pool:
+        starts = range(0, len(texts), batch_size)
+        for start, vectors in zip(starts, pool.map(embed_batch, _chunks(texts, batch_size))):
+            yield start, vectors
+
+
+def ingest(embed_batch_size: int = EMBED_BATCH, concurrency: int = EMBED_CONCURRENCY):
+    started = time.perf_counter()
+
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        # SQL Query: same journey join the API uses, projected to the fields we embed/store
+        query, params = build_journey_query(INGEST_FIELDS)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+
+    shipments = []
+    for row in rows:
+        try:
+            shipments.append(build_shipment(row))
+        except Exception as e:
+            print(f"❌ Skipping {row['shipper_id']} / {row.get('manifest_id')}: {e}")
+
+    summaries = [summary for summary, _ in shipments]
+    written = 0
+    with ShipmentWriter(clients.weaviate, batch_size=WEAVIATE_BATCH) as writer:
+        for start, vectors in embed_all(summaries, embed_batch_size, concurrency):
+            for (_, shipment_data), vector in zip(shipments[start:start + len(vectors)], vectors):
+                writer.upsert(shipment_data, vector)
+            written += len(vectors)
+            elapsed = time.perf_counter() - started
+            print(f"📦 {written}/{len(shipments)} shipments embedded ({written / elapsed:.1f} rows/s)")
+    written -= len(writer.failed)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Ingested {written} shipments in {elapsed:.1f}s "
+          f"({written / elapsed if elapsed else 0:.1f} rows/s, {len(rows) - len(shipments)} skipped)")
+    print(f"🗄️ Embedding cache: {embedding_cache.stats()}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed shipment journeys and load them into Weaviate")
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH, help="texts per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="embeddings requests in flight")
+    args = parser.parse_args()
+
+    # Ensure the schema exists first
+    ensure_shipment_schema()
+
+    # Add new fields (these should already be in the schema, but keeping for compatibility)
+    ensure_weaviate_field("origin")
+    ensure_weaviate_field("destination")
+    ensure_weaviate_field("scheduled_ship_time", data_type="date")
+    ensure_weaviate_field("expected_receive_time", data_type="date")
+    ensure_weaviate_field("origin_contact")
+    ensure_weaviate_field("destination_contact")
+
+    ingest(args.embed_batch, args.concurrency)
@@ -0,0 +1,330 @@
+"""
+One place that knows how to query a shipment's journey
+(manifest -> pickup -> dropoff -> weight events -> locations).
+
+Callers ask for the fields they need; only the joins those fields (and any
+filters / ordering) depend on are emitted, so a client asking for
+`manifest_id,pickup_time,evaporation_rate_kg_per_hour` never touches the
+locations or container_weight_event tables. With source="materialized" the
+same fields are read from the precomputed shipment_journey table instead.
+
+    sql, params = build_journey_query(
+        fields={"manifest_id": "manifest_id", "Origin": "origin"},
+        where=[("shipper_id", "=", shipper_id)],
+        order_by=[("pickup_time", "DESC")],
+    )
+"""
+
+from pagination import decode_cursor, keyset_predicate
+
+# alias -> (join clause, joins it depends on)
+JOINS = {
+    "pe": ("LEFT JOIN pickup_event pe ON m.manifest_id = pe.manifest_id", ()),
+    "de": ("LEFT JOIN dropoff_event de ON m.manifest_id = de.manifest_id", ()),
+    "cw_pickup": ("LEFT JOIN container_weight_event cw_pickup ON m.manifest_id = cw_pickup.manifest_id AND cw_pickup.weight_type = 'pickup'", ()),
+    "cw_dropoff": ("LEFT JOIN container_weight_event cw_dropoff ON m.manifest_id = cw_dropoff.manifest_id AND cw_dropoff.weight_type = 'dropoff'", ()),
+    "lp": ("LEFT JOIN locations lp ON cw_pickup.location_id = lp.id", ("cw_pickup",)),
+    "ld": ("LEFT JOIN locations ld ON cw_dropoff.location_id = ld.id", ("cw_dropoff",)),
+    # planned locations from the manifest itself (not where the container was actually weighed)
+    "mo": ("LEFT JOIN locations mo ON m.origin_location_id = mo.id", ()),
+    "md": ("LEFT JOIN locations md ON m.destination_location_id = md.id", ()),
+}
+
+_TRANSIT_SECONDS = "TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time)"
+
+# field -> (SQL expression, joins it needs)
+COLUMNS = {
+    "manifest_id": ("m.manifest_id", ()),
+    "shipper_id": ("m.shipper_id", ()),
+    "scheduled_ship_time": ("m.scheduled_ship_time", ()),
+    "expected_receive_time": ("m.expected_receive_time", ()),
+    "created_at": ("m.created_at", ()),
+    "created_by_user_id": ("m.created_by_user_id", ()),
+    "projected_weight_kg": ("m.projected_weight_kg", ()),
+    "notes": ("m.notes", ()),
+    "origin_location_id": ("m.origin_location_id", ()),
+    "destination_location_id": ("m.destination_location_id", ()),
+    "origin_contact_name": ("m.origin_contact_name", ()),
+    "destination_contact_name": ("m.destination_contact_name", ()),
+
+    "pickup_time": ("pe.actual_departure_at", ("pe",)),
+    "pickup_user_id": ("pe.driver_user_id", ("pe",)),
+    "pickup_weight": ("pe.measured_weight_kg", ("pe",)),
+
+    "dropoff_time": ("de.actual_receive_time", ("de",)),
+    "dropoff_user_id": ("de.received_by_user_id", ("de",)),
+    "dropoff_contact_name": ("de.received_contact_name", ("de",)),
+    "dropoff_weight": ("de.received_weight_kg", ("de",)),
+
+    "transit_hours": (f"{_TRANSIT_SECONDS} / 3600", ("pe", "de")),
+    "evaporation_rate_kg_per_hour": (f"""CASE
+            WHEN pe.measured_weight_kg IS NOT NULL
+            AND de.received_weight_kg IS NOT NULL
+            AND {_TRANSIT_SECONDS} > 0
+            THEN
+            (pe.measured_weight_kg - de.received_weight_kg) /
+            ({_TRANSIT_SECONDS} / 3600)
+            ELSE NULL
+        END""", ("pe", "de")),
+
+    "origin": ("CONCAT(lp.company_name, ', ', lp.company_address, ', ', lp.city, ', ', lp.state)", ("lp",)),
+    "origin_company_name": ("lp.company_name", ("lp",)),
+    "origin_company_address": ("lp.company_address", ("lp",)),
+    "origin_city": ("lp.city", ("lp",)),
+    "origin_state": ("lp.state", ("lp",)),
+
+    "destination": ("CONCAT(ld.company_name, ', ', ld.company_address, ', ', ld.city, ', ', ld.state)", ("ld",)),
+    "dest_company_name": ("ld.company_name", ("ld",)),
+    "dest_company_address": ("ld.company_address", ("ld",)),
+    "dest_city": ("ld.city", ("ld",)),
+    "dest_state": ("ld.state", ("ld",)),
+
+    "planned_origin": ("CONCAT(mo.city, ', ', mo.state)", ("mo",)),
+    "planned_destination": ("CONCAT(md.city, ', ', md.state)", ("md",)),
+}
+
+# The same fields read from the materialized shipment_journey table (see shipment_journey.py),
+# where everything is precomputed and no joins are needed.
+MATERIALIZED_COLUMNS = {field: f"sj.{field}" for field in COLUMNS} | {
+    "origin": "CONCAT(sj.origin_company_name, ', ', sj.origin_company_address, ', ', sj.origin_city, ', ', sj.origin_state)",
+    "destination": "CONCAT(sj.dest_company_name, ', ', sj.dest_company_address, ', ', sj.dest_city, ', ', sj.dest_state)",
+    "planned_origin": "CONCAT(sj.planned_origin_city, ', ', sj.planned_origin_state)",
+    "planned_destination": "CONCAT(sj.planned_dest_city, ', ', sj.planned_dest_state)",
+}
+
+SOURCES = ("live", "materialized")
+
+_OPERATORS = {"=", "!=", "<", "<=", ">", ">=", "IN", "IS NULL", "IS NOT NULL"}
+
+
+def _identity(names):
+    return {name: name for name in names}
+
+
+# Default projections per consumer: output name -> journey field.
+RECORDS_FIELDS = _identity([
+    "manifest_id", "shipper_id", "origin", "destination",
+    "scheduled_ship_time", "expected_receive_time", "created_at",
+]) | {"pickup_contact_name": "origin_contact_name"} | _identity([
+    "pickup_time", "pickup_user_id", "pickup_weight",
+    "dropoff_time", "dropoff_user_id", "dropoff_contact_name", "dropoff_weight",
+    "evaporation_rate_kg_per_hour",
+    "origin_company_name", "origin_company_address", "origin_city", "origin_state",
+    "dest_company_name", "dest_company_address", "dest_city", "dest_state",
+])
+
+MANIFEST_RECORDS_FIELDS = _identity([
+    "manifest_id", "created_at", "shipper_id", "scheduled_ship_time",
+]) | {"origin": "planned_origin", "destination": "planned_destination"} | _identity([
+    "projected_weight_kg", "created_by_user_id", "notes",
+])
+
+ROUTES_FIELDS = {
+    "manifest_id": "manifest_id",
+    "shipper_id": "shipper_id",
+    "Origin": "origin",
+    "Destination": "destination",
+    "scheduled_ship_time": "scheduled_ship_time",
+    "expected_receive_time": "expected_receive_time",
+    "contact_name": "origin_contact_name",
+    "pickup_time": "pickup_time",
+    "pickup_user_id": "pickup_user_id",
+    "pickup_weight": "pickup_weight",
+    "dropoff_time": "dropoff_time",
+    "dropoff_user_id": "dropoff_user_id",
+    "dropoff_contact": "dropoff_contact_name",
+    "received_weight_kg": "dropoff_weight",
+    "measured_weight_kg": "pickup_weight",
+    "actual_departure_at": "pickup_time",
+    "actual_receive_time": "dropoff_time",
+    "company_name": "dest_company_name",
+    "company_address": "dest_company_address",
+    "city": "dest_city",
+    "state": "dest_state",
+    "evap_rate": "evaporation_rate_kg_per_hour",
+    "evaporation_rate_kg_per_hour": "evaporation_rate_kg_per_hour",
+}
+
+INGEST_FIELDS = {
+    "manifest_id": "manifest_id",
+    "shipper_id": "shipper_id",
+    "origin_company": "origin_company_name",
+    "origin_address": "origin_company_address",
+    "origin_city": "origin_city",
+    "origin_state": "origin_state",
+    "destination_company": "dest_company_name",
+    "destination_address": "dest_company_address",
+    "destination_city": "dest_city",
+    "destination_state": "dest_state",
+    "scheduled_ship_time": "scheduled_ship_time",
+    "expected_receive_time": "expected_receive_time",
+    "origin_contact": "origin_contact_name",
+    "pickup_time": "pickup_time",
+    "pickup_user_id": "pickup_user_id",
+    "pickup_weight": "pickup_weight",
+    "dropoff_weight": "dropoff_weight",
+    "dropoff_time": "dropoff_time",
+    "dropoff_user_id": "dropoff_user_id",
+    "destination_contact": "dropoff_contact_name",
+}
+
+ANALYTICS_FIELDS = _identity([
+    "manifest_id", "pickup_time", "dropoff_time", "transit_hours", "evaporation_rate_kg_per_hour",
+    "pickup_weight", "dropoff_weight", "pickup_user_id", "origin_contact_name", "dropoff_contact_name",
+    "origin_city", "origin_state", "dest_city", "dest_state",
+])
+
+# Same names as the Weaviate Shipment properties, so SQL rows can be fused with search results.
+RETRIEVAL_FIELDS = _identity([
+    "manifest_id", "shipper_id", "origin", "destination", "pickup_time", "dropoff_time",
+    "pickup_weight", "dropoff_weight", "scheduled_ship_time", "expected_receive_time",
+]) | {
+    "origin_contact": "origin_contact_name",
+    "destination_contact": "dropoff_contact_name",
+    "evaporation_rate": "evaporation_rate_kg_per_hour",
+}
+
+
+def column(field: str, source: str = "live") -> str:
+    """SQL expression for a journey field (e.g. for keyset predicates)."""
+    if source == "materialized":
+        return MATERIALIZED_COLUMNS[field]
+    return COLUMNS[field][0]
+
+
+def select_fields(available: dict, requested: str | None, required: tuple = ()) -> dict:
+    """
+    Narrow a consumer's projection to a `fields=` query value
+    ("manifest_id,pickup_time"). Raises ValueError naming any unknown field.
+    Fields in `required` (e.g. the pagination sort key) are always kept.
+    """
+    if not requested:
+        return dict(available)
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    for name in required:
+        if name not in names:
+            names.append(name)
+    return {name: available[name] for name in names}
+
+
+def _add_join(alias: str, needed: list):
+    for dep in JOINS[alias][1]:
+        _add_join(dep, needed)
+    if alias not in needed:
+        needed.append(alias)
+
+
+def _resolve(field: str, source: str, joins: list) -> str:
+    if source == "materialized":
+        return MATERIALIZED_COLUMNS[field]
+    expr, deps = COLUMNS[field]
+    for alias in deps:
+        _add_join(alias, joins)
+    return expr
+
+
+def build_journey_query(fields: dict, where: list = (), extra_where: list = (),
+                        order_by: list = (), limit: int | None = None,
+                        source: str = "live") -> tuple[str, list]:
+    """
+    fields:      output name -> journey field (see COLUMNS)
+    where:       (field, operator, value) triples, ANDed together
+    extra_where: (sql, params) fragments written against journey columns, e.g. a keyset predicate
+    order_by:    (field, "ASC" | "DESC") pairs
+    source:      "live" joins the event tables, "materialized" reads shipment_journey
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown journey source: {source}")
+    joins = []
+    select = []
+    for name, field in fields.items():
+        expr = _resolve(field, source, joins)
+        select.append(f"{expr} AS `{name}`")
+
+    clauses, params = [], []
+    for field, op, value in where:
+        op = op.upper()
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        expr = _resolve(field, source, joins)
+        if op in ("IS NULL", "IS NOT NULL"):
+            clauses.append(f"{expr} {op}")
+        elif op == "IN":
+            values = list(value)
+            if not values:
+                clauses.append("FALSE")
+                continue
+            clauses.append(f"{expr} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+        else:
+            clauses.append(f"{expr} {op} %s")
+            params.append(value)
+
+    for sql, sql_params in extra_where:
+        clauses.append(sql)
+        params.extend(sql_params)
+
+    order = []
+    for field, direction in order_by:
+        direction = direction.upper()
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"Unsupported sort direction: {direction}")
+        expr = _resolve(field, source, joins)
+        order.append(f"{expr} {direction}")
+
+    # keep joins in a stable order so identical requests produce identical SQL
+    joins.sort(key=list(JOINS).index)
+
+    table = "shipment_journey sj" if source == "materialized" else "shipping_manifest m"
+    sql = "SELECT\n    " + ",\n    ".join(select) + f"\nFROM {table}"
+    for alias in joins:
+        sql += "\n" + JOINS[alias][0]
+    if clauses:
+        sql += "\nWHERE " + "\n  AND ".join(clauses)
+    if order:
+        sql += "\nORDER BY " + ", ".join(order)
+    if limit is not None:
+        sql += "\nLIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+# Projection and sort key per /api/records filter. Every sort field is ordered DESC and
+# the same values make up the pagination cursor.
+RECORDS_FILTERS = {
+    "date": (RECORDS_FIELDS, ["pickup_time", "manifest_id"]),
+    "location": (RECORDS_FIELDS, ["pickup_time", "manifest_id"]),
+    "manifestid": (MANIFEST_RECORDS_FIELDS, ["manifest_id"]),
+    "all": (MANIFEST_RECORDS_FIELDS, ["manifest_id"]),
+}
+
+
+def build_records_query(filter: str, shipperId: str, fields: str = None, page_cursor: str = None, limit: int = None,
+                        source: str = "live"):
+    """Returns (sql, params, sort_key) for /api/records, or (None, None, None) for an unknown filter."""
+    if filter not in RECORDS_FILTERS or (filter != "all" and not shipperId):
+        return None, None, None
+
+    available, sort_key = RECORDS_FILTERS[filter]
+    paginated = limit is not None or page_cursor is not None
+    projection = select_fields(available, fields, required=tuple(sort_key) if paginated else ())
+
+    where = [("shipper_id", "=", shipperId)] if filter != "all" else []
+    extra_where = []
+    if page_cursor:
+        values = decode_cursor(page_cursor, len(sort_key))
+        extra_where.append(keyset_predicate([column(f, source) for f in sort_key], values))
+
+    sql, params = build_journey_query(
+        projection,
+        where=where,
+        extra_where=extra_where,
+        order_by=[(f, "DESC") for f in sort_key],
+        # one extra row tells us whether another page exists
+        limit=limit + 1 if limit is not None else None,
+        source=source,
+    )
+    return sql, params, sort_key
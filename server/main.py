@@ -1,20 +1,46 @@
 import time
+import threading
+from contextlib import asynccontextmanager
 import json
 from typing import Optional
 import re
 import decimal
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
-from db import get_connection
+from db import connection, pool_stats, run_db, pool as db_pool
+from clients import clients
+from pagination import encode_cursor, iter_ndjson, json_default
+from migrate import apply_migrations
+from manifest_ids import allocator as manifest_id_allocator
+from embedding_cache import embedding_cache
+from analytics_engine import fetch_journeys, parse_metric_intent, run_intent
+from prompt_builder import BuiltPrompt, build_prompt
+from answer_cache import answer_cache, shipper_data_version
+from weaviate_sync import sync_once
+from retrieval import RETRIEVAL_SQL, fan_out, fetch_fact_rows, reciprocal_rank_fusion
+from vector_index import VECTOR_INDEX_PATH, VectorIndex, prune_index, sync_index
+from chroma_rag import CHROMA_ENABLED, chroma_index, query_gpt_with_rag
+from evaporation_rollups import SCOPES as ROLLUP_SCOPES, apply_journey_change, init_rollups, read_rollups
+from quantile_sketches import SCOPES as SKETCH_SCOPES, apply_sketch_change, init_sketches, read_sketches
+from readings_store import EVENT_TYPES as READING_EVENT_TYPES, from_micros, parse_readings, readings_store
+from boiloff_detector import boiloff_detector, observe_trip, read_alerts, save_alerts, warm_baselines
+from shipment_journey import init_shipment_journey, refresh_shipment_journey
+from manifests import (MANIFEST_BULK_MAX, MANIFEST_INSERT_SQL, ManifestCreateRequest, insert_manifests_bulk,
+                       manifest_params, validate_manifests)
+from journey_query import ROUTES_FIELDS, build_journey_query, build_records_query, select_fields
 from pydantic import BaseModel
 import re
 
 import os
 #  api pickup-events
 from fastapi import FastAPI, Query, File, UploadFile, Form, Request, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
 from datetime import datetime
 import shutil
+import csv
+import io
 from openai import OpenAI
 from openai.resources.embeddings import Embeddings
 import weaviate
@@ -28,33 +54,40 @@ from utils import format_shipments_for_prompt, format_shipments_brief, compute_e
 # Load environment variables
 load_dotenv()
 
-# Initialize clients
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-# version for running w/o Docker
-#weaviate_client = weaviate.Client("http://localhost:8080")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one set of OpenAI / Weaviate clients for the whole process (see clients.py)
+    print("initiate weaviate")
+    clients.warmup(weaviate=VECTOR_BACKEND == "weaviate")
+    if VECTOR_BACKEND == "weaviate":
+        print("Calling ensure schema")
+        ensure_schema(clients.weaviate)  # idempotent create-if-missing
 
-# version for running with Docker
-WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
-weaviate_client = weaviate.Client(WEAVIATE_URL)
+    with connection() as conn:
+        apply_migrations(conn)
+        init_shipment_journey(conn)
+        init_rollups(conn)
+        init_sketches(conn)
+        print(f"🧊 Boil-off baselines warmed from {warm_baselines(conn, readings_store)} trips and readings")
+        if VECTOR_BACKEND == "local":
+            load_local_index(conn)
+    if VECTOR_BACKEND == "local":
+        threading.Thread(target=refresh_local_index, name="local-index-refresh", daemon=True).start()
 
-app = FastAPI()
+    # builds / refreshes the /api/ask index in the background; requests never wait on it
+    if CHROMA_ENABLED:
+        chroma_index.start()
 
-@app.on_event("startup")
-def init_weaviate():
-    print("initiate weaviate")
-    url = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
-    client = weaviate.Client(url)
+    yield
 
-    # optional: simple retry loop for container startup ordering
-    for i in range(20):
-        try:
-            client.schema.get()
-            break
-        except Exception:
-            time.sleep(1)
+    chroma_index.stop()
+    _local_index_stop.set()
+    embedding_cache.close()   # flushes the buffered LRU touches
+    clients.close()
+    db_pool.close_all()
 
-    print("Calling ensure schema")
-    ensure_schema()  # idempotent create-if-missing
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Allow React frontend to call this API
@@ -92,6 +125,86 @@ def build_where_filter(shipper_id: str, cutoff_date: Optional[datetime] = None,
 
     return {"operator": "And", "operands": operands}
 
+# "weaviate", or "local" to search the in-process index in vector_index.py instead
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "weaviate").lower()
+VECTOR_INDEX_REFRESH_INTERVAL = float(os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", 30))
+local_index = VectorIndex()
+_local_index_lock = threading.Lock()   # the refresher and /api/weaviate/sync share the mark
+_local_index_stop = threading.Event()
+
+
+def load_local_index(conn):
+    """Open the saved local index, catch it up with the change feed and save it back."""
+    global local_index
+    started = time.perf_counter()
+    local_index = VectorIndex.load(VECTOR_INDEX_PATH)
+    prune_index(conn, local_index)
+    sync_local_index(conn, force_save=True)
+    local_index.build_ivf()
+    print(f"🧭 Local vector index ready: {local_index.stats()} in {time.perf_counter() - started:.2f}s")
+
+
+def sync_local_index(conn, force_save: bool = False) -> dict:
+    with _local_index_lock:
+        result = sync_index(conn, local_index)
+        if result["changed"] or force_save:
+            local_index.save(VECTOR_INDEX_PATH)
+    return result
+
+
+def refresh_local_index():
+    """Background thread: follow the change feed so pickups / dropoffs show up without a manual sync."""
+    while not _local_index_stop.wait(VECTOR_INDEX_REFRESH_INTERVAL):
+        try:
+            with connection() as conn:
+                sync_local_index(conn)
+        except Exception as e:
+            print(f"⚠️ Local vector index refresh failed: {e}")
+
+
+def local_prefilter(shipper_id: str, cutoff_date=None, direction: str = None) -> dict:
+    """build_where_filter() as keyword filters for VectorIndex.search()/filter()."""
+    return {
+        "shipper_id": shipper_id,
+        "after": cutoff_date if direction == "after" else None,
+        "before": cutoff_date if direction == "before" else None,
+    }
+
+
+def embed_question(question: str) -> list:
+    return embedding_cache.embed(
+        "text-embedding-3-small", [question],
+        lambda texts: [d.embedding for d in clients.openai.embeddings.create(
+            model="text-embedding-3-small", input=texts
+        ).data],
+    )[0]
+
+
+def cache_embedding(question: str):
+    """embed_question for the answer cache: None (no near-duplicate matching) if the API fails."""
+    try:
+        return embed_question(question)
+    except Exception as e:
+        print("⚠️ Could not embed question for the answer cache:", e)
+        return None
+
+
+def cache_intent(question: str, cutoff_date, direction: str):
+    """Answer-cache key for the question's metric intent, so "longest" never reuses "shortest"."""
+    intent = parse_metric_intent(question, cutoff_date, direction)
+    return (intent.metric, intent.aggregate, intent.group_by, intent.top_k) if intent else None
+
+
+def cache_answer(shipper_id: str, question: str, cache_scope: tuple, value):
+    """Store an answer with its question embedding; skipped when the embedding fails. Blocking."""
+    embedding = cache_embedding(question)
+    if embedding is None:
+        return
+    cutoff_date, direction, data_version, intent = cache_scope
+    answer_cache.put(shipper_id, question, cutoff_date, direction, data_version, value,
+                     embedding=embedding, intent=intent)
+
+
 def build_filter_query(weaviate_client, field_list: list, filters: dict):
     query = weaviate_client.query.get("Shipment", field_list)
     if filters:
@@ -151,24 +264,36 @@ def determine_query_mode(question: str) -> str:
     return "hybrid"
 
 
-# ✅ POST /api/reindex – clear & reload vector DB from MySQL
-@app.post("/api/reindex")
-async def reindex_vectors():
+# POST /api/weaviate/sync – push manifests changed since the last pass into Weaviate
+# (or into the local index when VECTOR_BACKEND=local)
+@app.post("/api/weaviate/sync")
+async def sync_weaviate():
     try:
-        print("🧹 Fetching all document IDs...")
-        all_ids = collection.get(include=[])["ids"]  # Only get IDs, not embeddings
+        if VECTOR_BACKEND == "local":
+            return await run_db(sync_local_index)
+        return await run_db(sync_once)
+    except Exception as e:
+        print("❌ Weaviate sync failed:", e)
+        return JSONResponse(status_code=500, content={"error": str(e)})
 
-        print(f"🗑️ Deleting {len(all_ids)} documents...")
-        if all_ids:
-            collection.delete(ids=all_ids)
 
-        print("🔄 Reloading and re-embedding from MySQL...")
+# ✅ POST /api/reindex – rebuild the Chroma index from MySQL in the background and swap it in
+@app.post("/api/reindex")
+async def reindex_vectors():
+    if not CHROMA_ENABLED:
+        return JSONResponse(status_code=503, content={"error": "Chroma index is disabled (set CHROMA_ENABLED=true)"})
+    if not chroma_index.reindex_in_background():
+        return JSONResponse(status_code=409, content={"status": "busy", **chroma_index.stats()})
+    print("🔄 Reindexing Chroma from MySQL in the background...")
+    return JSONResponse(status_code=202, content={"status": "started", **chroma_index.stats()})
 
 
-        return {"status": "Reindexing complete."}
-    except Exception as e:
-        print("❌ Reindexing failed:", e)
-        return {"error": str(e)}
+# GET /api/reindex – build state and progress of the Chroma index
+@app.get("/api/reindex")
+def reindex_status():
+    if not CHROMA_ENABLED:
+        return {"state": "disabled"}
+    return chroma_index.stats()
 
 
 class AskRequest(BaseModel):
@@ -176,9 +301,11 @@ class AskRequest(BaseModel):
 
 @app.post("/api/ask")
 async def ask(request: AskRequest):
+    if not CHROMA_ENABLED:
+        return JSONResponse(status_code=503, content={"error": "Chroma index is disabled (set CHROMA_ENABLED=true)"})
     try:
         print(f"🔍 Received query: {request.query}")
-        answer = query_gpt_with_rag(request.query)
+        answer = await run_in_threadpool(query_gpt_with_rag, request.query)
         print(f"✅ RAG response: {answer}")
         return {"answer": answer}
     except Exception as e:
@@ -187,290 +314,242 @@ async def ask(request: AskRequest):
 
 
 
+@app.get("/api/metrics")
+def get_metrics():
+    return {
+        "db_pool": pool_stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "latency": clients.stats(),
+        "vector_index": local_index.stats() if VECTOR_BACKEND == "local" else None,
+        "chroma": chroma_index.stats() if CHROMA_ENABLED else None,
+        "boiloff": boiloff_detector.stats(),
+    }
+
+
 @app.get("/api/locations")
-def get_users():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute("SELECT * FROM locations")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
+def get_locations():
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM locations")
+        results = cursor.fetchall()
+        cursor.close()
     return results
 
 
 @app.get("/api/users")
 def get_users():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Users")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM Users")
+        results = cursor.fetchall()
+        cursor.close()
     return results
 
 
 @app.get("/api/containers")
 def get_containers():
     print("get Containers")
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM shippers")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM shippers")
+        results = cursor.fetchall()
+        cursor.close()
     return results
 
 
+# Read endpoints use the materialized shipment_journey table; set JOURNEY_SOURCE=live to
+# fall back to joining the event tables on every request.
+JOURNEY_SOURCE = os.getenv("JOURNEY_SOURCE", "materialized")
+
+RECORDS_MAX_PAGE = 1000
+
+
+def stream_records(sql, params, sort_key, limit):
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(sql, params)
+            yield from iter_ndjson(cursor, sort_key, limit=limit)
+        finally:
+            # a client that disconnects mid-stream leaves rows unread; closing can
+            # fail then, and release() drops the connection instead of pooling it
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
 @app.get("/api/records")
-def get_records(filter: str = Query(None), shipperId: str = Query(None)):
-    print(f"records api: {filter}, {shipperId}")
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+def get_records(filter: str = Query(None), shipperId: str = Query(None),
+                fields: str = Query(None),
+                limit: int = Query(None, ge=1, le=RECORDS_MAX_PAGE),
+                page_cursor: str = Query(None, alias="cursor"),
+                format: str = Query("json")):
+    print(f"records api: {filter}, {shipperId}, limit={limit}, format={format}")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    try:
+        sql, params, sort_key = build_records_query(filter, shipperId, fields, page_cursor, limit, source=JOURNEY_SOURCE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if filter == "date" and shipperId:
-        #cursor.execute("""
-        #SELECT * FROM shipping_manifest WHERE shipper_id = %s ORDER BY scheduled_ship_time
-        #""", (shipperId,))
-        cursor.execute("""
-        SELECT
-            m.manifest_id,
-            m.shipper_id,
-
-            CONCAT(lp.company_name, ', ', lp.company_address, ', ', lp.city, ', ', lp.state) AS origin,
-            CONCAT(ld.company_name, ', ', ld.company_address, ', ', ld.city, ', ', ld.state) AS destination,
-
-            m.scheduled_ship_time,
-            m.expected_receive_time,
-            m.created_at,
-
-            m.origin_contact_name AS pickup_contact_name,
-            pe.actual_departure_at AS pickup_time,
-            pe.driver_user_id     AS pickup_user_id,
-            pe.measured_weight_kg AS pickup_weight,
-
-            de.actual_receive_time AS dropoff_time,
-            de.received_by_user_id AS dropoff_user_id,
-            de.received_contact_name AS dropoff_contact_name,
-            de.received_weight_kg  AS dropoff_weight,
-
-            CASE
-                WHEN pe.measured_weight_kg IS NOT NULL
-                AND de.received_weight_kg IS NOT NULL
-                AND TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) > 0
-                THEN
-                (pe.measured_weight_kg - de.received_weight_kg) /
-                (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600)
-                ELSE NULL
-            END AS evaporation_rate_kg_per_hour,
-
-            lp.company_name    AS origin_company_name,
-            lp.company_address AS origin_company_address,
-            lp.city            AS origin_city,
-            lp.state           AS origin_state,
-
-            ld.company_name    AS dest_company_name,
-            ld.company_address AS dest_company_address,
-            ld.city            AS dest_city,
-            ld.state           AS dest_state
-
-            FROM shipping_manifest m
-            LEFT JOIN pickup_event pe  ON m.manifest_id = pe.manifest_id
-            LEFT JOIN dropoff_event de ON m.manifest_id = de.manifest_id
-            LEFT JOIN container_weight_event cw_pickup  ON m.manifest_id = cw_pickup.manifest_id  AND cw_pickup.weight_type='pickup'
-            LEFT JOIN container_weight_event cw_dropoff ON m.manifest_id = cw_dropoff.manifest_id AND cw_dropoff.weight_type='dropoff'
-            LEFT JOIN locations lp ON cw_pickup.location_id = lp.id
-            LEFT JOIN locations ld ON cw_dropoff.location_id = ld.id
-            WHERE m.shipper_id = %s
-            ORDER BY pickup_time DESC;
-
-
-    """, (shipperId,))
-    elif filter == "manifestid" and shipperId:
-        #cursor.execute("""
-        #SELECT * FROM shipping_manifest WHERE shipper_id = %s ORDER BY scheduled_ship_time
-        #""", (shipperId,))
-        cursor.execute("""
-        SELECT 
-            sm.manifest_id,
-            sm.created_at,
-            sm.shipper_id,
-            sm.projected_weight_kg,
-            sm.scheduled_ship_time,
-            CONCAT(lo.city, ', ', lo.state) AS origin,
-            CONCAT(ld.city, ', ', ld.state) AS destination,
-            sm.projected_weight_kg,
-            sm.created_by_user_id,
-            sm.notes
-            FROM shipping_manifest sm
-            JOIN locations lo ON sm.origin_location_id = lo.id
-            JOIN locations ld ON sm.destination_location_id = ld.id 
-            WHERE sm.shipper_id = %s
-            ORDER BY sm.manifest_id DESC              
-        """, (shipperId,))        
-    elif filter == "location" and shipperId:
-        #cursor.execute("""
-        #SELECT * FROM shipping_manifest WHERE shipper_id = %s ORDER BY scheduled_ship_time
-        #""", (shipperId,))
-        cursor.execute("""
-        SELECT
-            m.manifest_id,
-            m.shipper_id,
-            CONCAT(lp.company_name, ', ', lp.company_address, ', ', lp.city, ', ', lp.state) AS origin,
-            CONCAT(ld.company_name, ', ', ld.company_address, ', ', ld.city, ', ', ld.state) AS destination,
-
-            m.scheduled_ship_time,
-            m.expected_receive_time,
-            m.created_at,
-
-            m.origin_contact_name AS pickup_contact_name,
-            pe.actual_departure_at AS pickup_time,
-            pe.driver_user_id     AS pickup_user_id,
-            pe.measured_weight_kg AS pickup_weight,
-
-            de.actual_receive_time AS dropoff_time,
-            de.received_by_user_id AS dropoff_user_id,
-            de.received_contact_name AS dropoff_contact_name,
-            de.received_weight_kg  AS dropoff_weight,
-
-            CASE
-                WHEN pe.measured_weight_kg IS NOT NULL
-                AND de.received_weight_kg IS NOT NULL
-                AND TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) > 0
-                THEN
-                (pe.measured_weight_kg - de.received_weight_kg) /
-                (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600)
-                ELSE NULL
-            END AS evaporation_rate_kg_per_hour,
-
-            lp.company_name    AS origin_company_name,
-            lp.company_address AS origin_company_address,
-            lp.city            AS origin_city,
-            lp.state           AS origin_state,
-
-            ld.company_name    AS dest_company_name,
-            ld.company_address AS dest_company_address,
-            ld.city            AS dest_city,
-            ld.state           AS dest_state
-
-            FROM shipping_manifest m
-            LEFT JOIN pickup_event pe  ON m.manifest_id = pe.manifest_id
-            LEFT JOIN dropoff_event de ON m.manifest_id = de.manifest_id
-            LEFT JOIN container_weight_event cw_pickup  ON m.manifest_id = cw_pickup.manifest_id  AND cw_pickup.weight_type='pickup'
-            LEFT JOIN container_weight_event cw_dropoff ON m.manifest_id = cw_dropoff.manifest_id AND cw_dropoff.weight_type='dropoff'
-            LEFT JOIN locations lp ON cw_pickup.location_id = lp.id
-            LEFT JOIN locations ld ON cw_dropoff.location_id = ld.id
-            WHERE m.shipper_id = %s
-            ORDER BY pickup_time DESC;
-
-        """, (shipperId,))
-
-    elif filter == "all":
-        #cursor.execute("""
-        #SELECT * FROM shipping_manifest WHERE shipper_id = %s ORDER BY scheduled_ship_time
-        #""", (shipperId,))
-        cursor.execute("""
-        SELECT 
-            sm.manifest_id,
-            sm.created_at,
-            sm.shipper_id,
-            sm.scheduled_ship_time,
-            CONCAT(lo.city, ', ', lo.state) AS origin,
-            CONCAT(ld.city, ', ', ld.state) AS destination,
-            sm.projected_weight_kg,
-            sm.created_by_user_id,
-            sm.notes
-            FROM shipping_manifest sm
-            JOIN locations lo ON sm.origin_location_id = lo.id
-            JOIN locations ld ON sm.destination_location_id = ld.id                      
-            ORDER BY manifest_id Desc              
-        """)         
-    else:
+    if sql is None:
         print("Error in query in api/records")
+        return []
+
+    # NDJSON: rows go out as they are read from the server, nothing is materialized
+    if format == "ndjson":
+        return StreamingResponse(stream_records(sql, params, sort_key, limit), media_type="application/x-ndjson")
+
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        results = cursor.fetchall()
+        cursor.close()
 
-    results = cursor.fetchall()
     if len(results) > 0:
-        print(f"query results: {results[0]['destination']}")
-        '''print("dest: ", results[1]['dest_company_name'],  results[0]['dest_company_address'],
-                results[0]['dest_city'],
-                results[0]['dest_state'])'''
+        print(f"query results: {results[0].get('destination')}")
     else:
         print("No results")
-    cursor.close()
-    conn.close()
-    return results
+
+    if limit is None:
+        return results
+
+    page = results[:limit]
+    next_cursor = None
+    if len(results) > limit:
+        next_cursor = encode_cursor([page[-1][f] for f in sort_key])
+    return {"items": page, "next_cursor": next_cursor}
 
 
 @app.get("/api/manifests")
 def get_manifests(filter: str = Query(None), manifestId: str = Query(None)):
     print(f"get Manifests: {filter}, {manifestId}")
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)   
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)   
     
-    if (filter):
-        if filter == 'next-id':
-            cursor.execute("""
-                SELECT
-                    MAX(manifest_id) AS last_id 
-                    FROM shipping_manifest;
-            """)
-            results = cursor.fetchall()[0]
-            last_id = results["last_id"].rsplit('-')[1] or 0
-            next_id = int(last_id) + 1
-            next_id = f"MAN-{next_id:06d}"
-            print("next manifest id = ", next_id)
-            cursor.close()
-            conn.close()
-            return {"res":next_id}
+        if (filter):
+            if filter == 'next-id':
+                # claimed from id_sequence, so concurrent callers never get the same id
+                cursor.close()
+                next_id = manifest_id_allocator.next_id(conn)
+                print("next manifest id = ", next_id)
+                return {"res":next_id}
+
+            else:
+
+                cursor.execute("""
+                    SELECT 
+                        sm.manifest_id,
+                        sm.shipper_id,
+                        sm.origin_location_id,
+                        sm.destination_location_id,
+                        sm.scheduled_ship_time,
+                        sm.expected_receive_time,
+                        sm.created_by_user_id,
+                        CONCAT(origin.city, ', ', origin.state, ', ', origin.company_name, ' ', origin.company_address) AS origin,
+                        CONCAT(dest.city, ', ', dest.state, ', ', dest.company_name, ' ', dest.company_address) AS destination
+                    FROM shipping_manifest sm
+                    LEFT JOIN locations origin ON sm.origin_location_id = origin.id
+                    LEFT JOIN locations dest ON sm.destination_location_id = dest.id
+                    WHERE sm.manifest_id = %s
+                    ORDER BY sm.manifest_id DESC
+                """, (manifestId,))
 
         else:
-
+            cursor = conn.cursor(dictionary=True)
             cursor.execute("""
-                SELECT 
-                    sm.manifest_id,
-                    sm.shipper_id,
-                    sm.origin_location_id,
-                    sm.destination_location_id,
-                    sm.scheduled_ship_time,
-                    sm.expected_receive_time,
-                    sm.created_by_user_id,
-                    CONCAT(origin.city, ', ', origin.state, ', ', origin.company_name, ' ', origin.company_address) AS origin,
-                    CONCAT(dest.city, ', ', dest.state, ', ', dest.company_name, ' ', dest.company_address) AS destination
-                FROM shipping_manifest sm
-                LEFT JOIN locations origin ON sm.origin_location_id = origin.id
-                LEFT JOIN locations dest ON sm.destination_location_id = dest.id
-                WHERE sm.manifest_id = %s
-                ORDER BY sm.manifest_id DESC
-            """, (manifestId,))
+                SELECT manifest_id FROM shipping_manifest 
+                ORDER BY manifest_id DESC             
+            """)       
 
-    else:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT manifest_id FROM shipping_manifest 
-            ORDER BY manifest_id DESC             
-        """)       
+        results = cursor.fetchall()
+        #print(f"Manifests: {results}")
+        cursor.close()
+    return results
+
+
+MANIFEST_LOCATIONS_SQL = """
+    SELECT 
+        sm.manifest_id,
+        sm.shipper_id,
+        sm.origin_location_id,
+        sm.destination_location_id,
+        sm.scheduled_ship_time,
+        sm.expected_receive_time,
+        sm.created_by_user_id,
+        CONCAT(origin.city, ', ', origin.state, ', ', origin.company_name, ' ', origin.company_address) AS origin,
+        CONCAT(dest.city, ', ', dest.state, ', ', dest.company_name, ' ', dest.company_address) AS destination
+    FROM shipping_manifest sm
+    LEFT JOIN locations origin ON sm.origin_location_id = origin.id
+    LEFT JOIN locations dest ON sm.destination_location_id = dest.id
+    WHERE sm.manifest_id = %s
+"""
 
+
+def insert_manifest(conn, manifest: ManifestCreateRequest):
+    cursor = conn.cursor(dictionary=True)
+
+    # verify that this newly allocated manifest_id isn't already used in the DB
+    cursor.execute("""
+        SELECT 1
+            FROM shipping_manifest
+            WHERE manifest_id = %s
+            LIMIT 1;
+        """, (manifest.manifest_id,))
     results = cursor.fetchall()
-    #print(f"Manifests: {results}")
+    if results:
+        cursor.close()
+        print(f"Error: Manifest ID {manifest.manifest_id} is already in use")
+        return False
+
+    cursor.execute(MANIFEST_INSERT_SQL, manifest_params(manifest))
+    refresh_shipment_journey(cursor, manifest.manifest_id)
+    conn.commit()
     cursor.close()
-    conn.close()
-    return results
+    return True
+
+
+MANIFEST_ID_RESERVE_MAX = 1000
+
 
-class ManifestCreateRequest(BaseModel):
-    manifest_id: str
-    shipper_id: str
-    origin_location_id: int
-    origin_contact_name: str
-    destination_location_id: int
-    destination_contact_name: str
-    scheduled_ship_time: datetime
-    expected_receive_time: datetime
-    projected_weight_kg: float
-    temperature_c: int
-    notes: Optional[str] = None
-    created_by_user_id: int
-    created_at: datetime
-    dev_current_time: datetime
+@app.post("/api/manifest-ids/reserve")
+async def reserve_manifest_ids(count: int = Query(1, ge=1, le=MANIFEST_ID_RESERVE_MAX)):
+    ids = await run_db(manifest_id_allocator.reserve, count)
+    return {"ids": ids}
+
+
+@app.post("/api/manifests/bulk")
+async def create_manifests_bulk(request: Request):
+    payload = await request.json()
+    items = payload.get("manifests") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return JSONResponse(status_code=400, content={"error": "Expected a non-empty list of manifests"})
+    if len(items) > MANIFEST_BULK_MAX:
+        return JSONResponse(status_code=413, content={"error": f"At most {MANIFEST_BULK_MAX} manifests per request"})
+
+    valid, errors = validate_manifests(items)
+
+    created = []
+    if valid:
+        missing_ids = sum(1 for _, m in valid if not m.manifest_id)
+        try:
+            created, insert_errors = await run_db(insert_manifests_bulk, valid, missing_ids)
+        except Exception as e:
+            print("❌ Bulk manifest insert failed:", e)
+            return JSONResponse(status_code=500, content={"error": str(e)})
+        errors.update(insert_errors)
+
+    print(f"✅ Bulk manifests: {len(created)} created, {len(errors)} rejected")
+    body = {
+        "created": created,
+        "errors": [
+            {"index": i, "manifest_id": items[i].get("manifest_id") if isinstance(items[i], dict) else None, "error": errors[i]}
+            for i in sorted(errors)
+        ],
+    }
+    return JSONResponse(status_code=200 if created else 422, content=body)
 
 
 @app.post("/api/create-manifest")
@@ -478,29 +557,9 @@ async def create_manifest(request: Request):
     try:
         payload = await request.json()
         manifest_id = payload.get('manifest_id', [])
-        # 1. Check if manifest_id already exists (avoid duplicates)
         print(f"get Manifest Id: {manifest_id}")
 
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)   
-
-        # verify that this newly allocated manifest_id isn't already used in the DB
-        query = """
-            SELECT 1
-                FROM shipping_manifest
-                WHERE %s
-                LIMIT 1;
-            """
-        cursor.execute(query, (manifest_id,))
-        results = cursor.fetchall()
-        cursor.close()
-        if results:
-            print("Error: Manifest ID {manifest_id} is already in use")
-            return 
-        print(f"Manifests: {results}")
-
-
-        # 2. Create new manifest object
+        # 1. Create new manifest object
         manifest = ManifestCreateRequest(
             manifest_id=payload['manifest_id'],              
             shipper_id=payload['shipper_id'],               
@@ -518,62 +577,12 @@ async def create_manifest(request: Request):
             dev_current_time =datetime.utcnow()   
         )
 
-        params = {
-            "manifest_id": manifest.manifest_id,
-            "shipper_id": manifest.shipper_id,
-            "origin_location_id": manifest.origin_location_id,
-            "origin_contact_name": manifest.origin_contact_name,
-            "destination_location_id": manifest.destination_location_id,
-            "destination_contact_name": manifest.destination_contact_name,
-            "scheduled_ship_time": manifest.scheduled_ship_time,   # datetime or str acceptable to connector
-            "expected_receive_time": manifest.expected_receive_time,
-            "projected_weight_kg": manifest.projected_weight_kg,
-            "temperature_c": manifest.temperature_c,
-            "notes": getattr(manifest, "notes", None),
-            "created_by_user_id": manifest.created_by_user_id,
-            "created_at": getattr(manifest, "created_at", datetime.utcnow()),
-            "dev_current_time": getattr(manifest, "dev_current_time", datetime.utcnow()),
-        }   
-
-        sql = """
-        INSERT INTO shipping_manifest (
-            manifest_id,
-            shipper_id,
-            origin_location_id,
-            origin_contact_name,
-            destination_location_id,
-            destination_contact_name,
-            scheduled_ship_time,
-            expected_receive_time,
-            projected_weight_kg,
-            temperature_c,
-            notes,
-            created_by_user_id,
-            created_at,
-            dev_current_time
-        ) VALUES (
-            %(manifest_id)s,
-            %(shipper_id)s,
-            %(origin_location_id)s,
-            %(origin_contact_name)s,
-            %(destination_location_id)s,
-            %(destination_contact_name)s,
-            %(scheduled_ship_time)s,
-            %(expected_receive_time)s,
-            %(projected_weight_kg)s,
-            %(temperature_c)s,
-            %(notes)s,
-            %(created_by_user_id)s,
-            %(created_at)s,
-            %(dev_current_time)s
-        )
-        """    
-        cursor = conn.cursor(dictionary=True)            
-        cursor.execute(sql, params)
-        conn.commit()
-        results = cursor.fetchall()
+        # 2. Check manifest_id isn't taken (avoid duplicates) and insert
+        created = await run_db(insert_manifest, manifest)
+        if not created:
+            return JSONResponse(status_code=409, content={"error": f"Manifest ID {manifest.manifest_id} is already in use"})
 
-        # 4. Return the created manifest
+        # 3. Return the created manifest
         return {
             "status": "success",
             "manifest": {
@@ -585,10 +594,81 @@ async def create_manifest(request: Request):
             }
         }
     except Exception as e:
-        print("❌ Dropoff event failed:", e)
+        print("❌ Create manifest failed:", e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+def record_pickup_event(conn, manifest_id, measured_weight_kg, weight_type, driver_user_id, file_path, notes):
+    # get manifest info for writing params to database
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(MANIFEST_LOCATIONS_SQL, (manifest_id,))
+    results = cursor.fetchall()
+
+    origin_location_id = results[0]['origin_location_id']
+    shipper_id = results[0]['shipper_id']
+
+    timestamp = datetime.utcnow()
+
+    # Store pickup record in the database
+    cursor.execute("""
+        INSERT INTO pickup_event (
+            manifest_id,
+            measured_weight_kg,
+            weight_measured_at,
+            actual_departure_at,
+            driver_user_id,
+            image_path,
+            notes,
+            created_at,
+            dev_current_time
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        manifest_id,
+        measured_weight_kg,
+        timestamp,  # weight_measured_atarture_at
+        timestamp, 
+        driver_user_id,
+        file_path,
+        notes,
+        timestamp, 
+        timestamp
+    ))
+
+    # store data in container_weight_event as well
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO container_weight_event (
+            manifest_id,
+            weight_type,
+            event_time,
+            location_id,
+            recorded_by_user_id,
+            weight_kg,
+            notes,
+            created_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        manifest_id,
+        weight_type,
+        timestamp,  # weight_measured_atarture_at
+        origin_location_id, 
+        driver_user_id,
+        measured_weight_kg,
+        notes,
+        timestamp
+    ))
+
+    # keep the materialized journey row in step, in the same transaction as the events
+    refresh_shipment_journey(cursor, manifest_id)
+    apply_journey_change(conn, manifest_id)
+    apply_sketch_change(conn, manifest_id)
+    conn.commit()
+    cursor.close()
+    answer_cache.invalidate_shipper(shipper_id)
+    # starts the trip's boil-off measurement
+    boiloff_detector.observe(shipper_id, timestamp, measured_weight_kg, "pickup", source=manifest_id)
+
+
 UPLOAD_DIR = "uploads/pickup_photos"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 @app.post("/api/pickup-events")
@@ -601,35 +681,7 @@ async def create_pickup_event(
     notes:  str = Form("")
 ):
     try:
-        # get manifest info for writing params to database
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)   
-
-        cursor.execute("""
-        SELECT 
-            sm.manifest_id,
-            sm.shipper_id,
-            sm.origin_location_id,
-            sm.destination_location_id,
-            sm.scheduled_ship_time,
-            sm.expected_receive_time,
-            sm.created_by_user_id,
-            CONCAT(origin.city, ', ', origin.state, ', ', origin.company_name, ' ', origin.company_address) AS origin,
-            CONCAT(dest.city, ', ', dest.state, ', ', dest.company_name, ' ', dest.company_address) AS destination
-        FROM shipping_manifest sm
-        LEFT JOIN locations origin ON sm.origin_location_id = origin.id
-        LEFT JOIN locations dest ON sm.destination_location_id = dest.id
-        WHERE sm.manifest_id = %s
-        """, (manifest_id,))
-        results = cursor.fetchall()
-        
-        origin_location_id = results[0]['origin_location_id']
-        origin = results[0]['origin']
-        destination_location_id = results[0]['destination_location_id']
-        destination = results[0]['destination']
-        
         # Generate unique filename with timestamp
-        timestamp = datetime.utcnow()
         filename = f"{photo.filename}"
         file_path = os.path.join(UPLOAD_DIR, filename)
 
@@ -637,58 +689,8 @@ async def create_pickup_event(
         #with open(file_path, "wb") as buffer:
         #    shutil.copyfileobj(photo.file, buffer)
 
-        # Store pickup record in the database
-
-        cursor.execute("""
-            INSERT INTO pickup_event (
-                manifest_id,
-                measured_weight_kg,
-                weight_measured_at,
-                actual_departure_at,
-                driver_user_id,
-                image_path,
-                notes,
-                created_at,
-                dev_current_time
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            manifest_id,
-            measured_weight_kg,
-            timestamp,  # weight_measured_atarture_at
-            timestamp, 
-            driver_user_id,
-            file_path,
-            notes,
-            timestamp, 
-            timestamp
-        ))
-        conn.commit()
-
-        # store data in container_weight_event as well
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO container_weight_event (
-                manifest_id,
-                weight_type,
-                event_time,
-                location_id,
-                recorded_by_user_id,
-                weight_kg,
-                notes,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            manifest_id,
-            weight_type,
-            timestamp,  # weight_measured_atarture_at
-            origin_location_id, 
-            driver_user_id,
-            measured_weight_kg,
-            notes,
-            timestamp
-        ))
-        conn.commit()       
-
+        await run_db(record_pickup_event, manifest_id, measured_weight_kg, weight_type,
+                     driver_user_id, file_path, notes)
 
         return {"status": "Pickup event created."}
 
@@ -697,6 +699,93 @@ async def create_pickup_event(
         return JSONResponse(status_code=500, content={"error": str(e)})
 
 
+def record_dropoff_event(conn, manifest_id, received_location_id, received_contact_name,
+                         received_weight_kg, condition_notes, weight_type, filename, received_by_user_id):
+    cursor = conn.cursor(dictionary=True)
+    timestamp = datetime.utcnow()
+
+    # 🚨 Validation: check against manifest destination (before anything is written)
+    cursor.execute("""
+        SELECT origin_location_id, shipper_id FROM shipping_manifest
+        WHERE manifest_id = %s
+    """, (manifest_id,))
+
+    results = cursor.fetchall()
+    if not results or not results[0]['origin_location_id']:
+        cursor.close()
+        return JSONResponse(status_code=404, content={"error": "Manifest not found"})
+
+    manifest_location_id = results[0]['origin_location_id']
+    if str(manifest_location_id) == str(received_location_id):
+        cursor.close()
+        return JSONResponse(
+            status_code=422,
+            content={"error": "received_location_id must differ from manifest's destination_location_id"}
+        )
+
+    # store data in container_weight_event as well
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO container_weight_event (
+            manifest_id,
+            weight_type,
+            event_time,
+            location_id,
+            recorded_by_user_id,
+            weight_kg,
+            notes,
+            created_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        manifest_id,
+        weight_type,
+        timestamp,  # weight_measured_atarture_at
+        received_location_id, 
+        received_by_user_id,
+        received_weight_kg,
+        '',
+        timestamp
+    ))
+
+    actual_receive_dt = timestamp
+
+    # Insert into the database
+    cursor.execute("""
+        INSERT INTO dropoff_event (
+            manifest_id,
+            received_location_id,
+            received_contact_name,
+            actual_receive_time,
+            received_weight_kg,
+            condition_notes,
+            image_path,
+            received_by_user_id,
+            created_at,
+            dev_current_time 
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        manifest_id,
+        received_location_id,
+        received_contact_name,
+        actual_receive_dt,
+        received_weight_kg,
+        condition_notes,
+        filename,
+        received_by_user_id,
+        actual_receive_dt,
+        actual_receive_dt
+    ))
+
+    # keep the materialized journey row in step, in the same transaction as the events
+    refresh_shipment_journey(cursor, manifest_id)
+    # fold the finished trip into the evaporation rollups and percentile sketches
+    apply_journey_change(conn, manifest_id)
+    apply_sketch_change(conn, manifest_id)
+    conn.commit()
+    cursor.close()
+    answer_cache.invalidate_shipper(results[0]['shipper_id'])
+    observe_trip(conn, manifest_id)
+    return None
 
 
 UPLOAD_DIR = "uploads/dropoff_photos"
@@ -720,39 +809,6 @@ async def create_dropoff_event(
     ):
 
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)   
-
-        cursor.execute("""
-        SELECT 
-            sm.manifest_id,
-            sm.shipper_id,
-            sm.origin_location_id,
-            sm.destination_location_id,
-            sm.scheduled_ship_time,
-            sm.expected_receive_time,
-            sm.created_by_user_id,
-            CONCAT(origin.city, ', ', origin.state, ', ', origin.company_name, ' ', origin.company_address) AS origin,
-            CONCAT(dest.city, ', ', dest.state, ', ', dest.company_name, ' ', dest.company_address) AS destination
-        FROM shipping_manifest sm
-        LEFT JOIN locations origin ON sm.origin_location_id = origin.id
-        LEFT JOIN locations dest ON sm.destination_location_id = dest.id
-        WHERE sm.manifest_id = %s
-        """, (manifest_id,))
-        results = cursor.fetchall()
-        
-        origin_location_id = results[0]['origin_location_id']
-        origin = results[0]['origin']
-        destination_location_id = results[0]['destination_location_id']
-        destination = results[0]['destination']
-
-        # Generate unique filename with timestamp
-        timestamp = datetime.utcnow()
-        #filename = f"{photo.filename}"
-        file_path = image_path
-
-        UPLOAD_DIR = "uploads/dropoff_photos"
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
         # Save the uploaded photo
         timestamp = datetime.utcnow()
         filename = f"{manifest_id}_{timestamp}_{image_path.filename}"
@@ -761,84 +817,10 @@ async def create_dropoff_event(
         #with open(file_path, "wb") as buffer:
         #    shutil.copyfileobj(image_path.file, buffer)
 
-        # 🚨 Validation: check against manifest destination
-
-        cursor.execute("""
-            SELECT origin_location_id FROM shipping_manifest
-            WHERE manifest_id = %s
-        """, (manifest_id,))
-
-        results = cursor.fetchall()
-
-
-                # store data in container_weight_event as well
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO container_weight_event (
-                manifest_id,
-                weight_type,
-                event_time,
-                location_id,
-                recorded_by_user_id,
-                weight_kg,
-                notes,
-                created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            manifest_id,
-            weight_type,
-            timestamp,  # weight_measured_atarture_at
-            received_location_id, 
-            received_by_user_id,
-            received_weight_kg,
-            '',
-            timestamp
-        ))
-        conn.commit()       
-
-        manifest_location_id = results[0]['origin_location_id']
-        if not manifest_location_id:
-            return JSONResponse(status_code=404, content={"error": "Manifest not found"})
-
-        if manifest_location_id == received_location_id:
-            return JSONResponse(
-                status_code=422,
-                content={"error": "received_location_id must differ from manifest's destination_location_id"}
-            )
-
-        # Parse datetime string to proper format
-        actual_receive_time = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        actual_receive_dt = datetime.fromisoformat(actual_receive_time)
-
-        # Insert into the database
-        cursor.execute("""
-            INSERT INTO dropoff_event (
-                manifest_id,
-                received_location_id,
-                received_contact_name,
-                actual_receive_time,k
-                received_weight_kg,
-                condition_notes,
-                image_path,
-                received_by_user_id,
-                created_at,
-                dev_current_time 
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            manifest_id,
-            received_location_id,
-            received_contact_name,
-            actual_receive_dt,
-            received_weight_kg,
-            condition_notes,
-            filename,
-            received_by_user_id,
-            actual_receive_dt,
-            actual_receive_dt
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        error = await run_db(record_dropoff_event, manifest_id, received_location_id, received_contact_name,
+                             received_weight_kg, condition_notes, weight_type, filename, received_by_user_id)
+        if error is not None:
+            return error
 
         return {"status": "Dropoff event recorded."}
 
@@ -852,104 +834,139 @@ def decimal_to_float(d):
         return float(d)
     return d
 
-@app.get("/api/shippers/{shipper_id}/routes")
-async def get_shipper_routes(shipper_id: str):
-    print(f"\nshipper routes: s_id: {shipper_id}")
-    conn = get_connection()
+def fetch_shipper_routes(conn, shipper_id, fields=ROUTES_FIELDS):
     cursor = conn.cursor(dictionary=True)
-
-    query = """
-        SELECT
-            m.manifest_id,
-            m.shipper_id,
-            CONCAT(lp.company_name, ', ', lp.company_address, ', ', lp.city, ', ',  lp.state) as Origin, 
-            CONCAT(ld.company_name, ', ', ld.company_address, ', ', ld.city, ', ', ld.state) as Destination,
-            m.scheduled_ship_time,
-            m.expected_receive_time,
-
-            m.origin_contact_name AS contact_name,            
-            pe.actual_departure_at AS pickup_time,
-            pe.driver_user_id AS pickup_user_id,
-            pe.measured_weight_kg AS pickup_weight,
-            
-            de.actual_receive_time AS dropoff_time,
-            de.received_by_user_id  AS dropoff_contact,
-            m.destination_contact_name AS contact_name,
-
-            lp.company_name,
-            lp.company_address,
-            lp.city,
-            lp.state,
-
-            de.received_by_user_id AS dropoff_user_id,
-            de.received_contact_name AS dropoff_contact,
-            de.actual_receive_time AS dropoff_time,
-            de.received_weight_kg,
-            pe.measured_weight_kg, 
-            de.received_weight_kg,
-            pe.actual_departure_at,
-            de.actual_receive_time,
-            (pe.measured_weight_kg - de.received_weight_kg) /
-            (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600) AS evap_rate,
-
-            CASE
-                WHEN pe.measured_weight_kg IS NOT NULL
-                    AND de.received_weight_kg IS NOT NULL
-                    AND (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600) > 0
-                THEN
-                    (pe.measured_weight_kg - de.received_weight_kg) /
-                    (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600)
-                ELSE NULL
-            END AS evaporation_rate_kg_per_hour,
-
-
-            ld.company_name,
-            ld.company_address,
-            ld.city,
-            ld.state            
-
-
-            FROM shipping_manifest m
-
-            LEFT JOIN pickup_event pe 
-                ON m.manifest_id = pe.manifest_id
-
-            LEFT JOIN dropoff_event de 
-                ON m.manifest_id = de.manifest_id
-
-            LEFT JOIN container_weight_event cw_pickup 
-                ON m.manifest_id = cw_pickup.manifest_id AND cw_pickup.weight_type = 'pickup'
-
-            LEFT JOIN container_weight_event cw_dropoff 
-                ON m.manifest_id = cw_dropoff.manifest_id AND cw_dropoff.weight_type = 'dropoff'
-
-            LEFT JOIN locations lp 
-                ON cw_pickup.location_id = lp.id
-
-            LEFT JOIN locations ld 
-                ON cw_dropoff.location_id = ld.id
-            
-
-            WHERE m.shipper_id = %s
-
-
-    """
-
-    cursor.execute(query, (shipper_id,))
+    query, params = build_journey_query(fields, where=[("shipper_id", "=", shipper_id)], source=JOURNEY_SOURCE)
+    cursor.execute(query, params)
     results = cursor.fetchall()
+    cursor.close()
     # Convert any Decimal fields to float (safely)
     for result in results:
         for key, value in result.items():
             result[key] = decimal_to_float(value)
+    return results
 
 
-    print(f"results: {results}")
-    cursor.close()
-    conn.close()
-
+@app.get("/api/shippers/{shipper_id}/routes")
+async def get_shipper_routes(shipper_id: str, fields: str = Query(None)):
+    print(f"\nshipper routes: s_id: {shipper_id}")
+    try:
+        projection = select_fields(ROUTES_FIELDS, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    results = await run_db(fetch_shipper_routes, shipper_id, projection)
+    print(f"results: {len(results)} routes")
     return results
 
 
+# GET /api/analytics/evaporation – per-shipper, per-lane and per-day evaporation rollups
+@app.get("/api/analytics/evaporation")
+async def get_evaporation_rollups(shipper_id: str, scope: str = Query(None),
+                                  start: str = Query(None), end: str = Query(None)):
+    check_analytics_params(scope, ROLLUP_SCOPES, start, end)
+    return await run_db(read_rollups, shipper_id, scope, start, end)
+
+
+# GET /api/analytics/percentiles – p50/p95/p99 evaporation rate and transit time, merged over pickup days
+@app.get("/api/analytics/percentiles")
+async def get_percentiles(shipper_id: str, scope: str = Query(None),
+                          start: str = Query(None), end: str = Query(None)):
+    check_analytics_params(scope, SKETCH_SCOPES, start, end)
+    return await run_db(read_sketches, shipper_id, scope, start, end)
+
+
+def check_analytics_params(scope, scopes, start, end):
+    if scope and scope not in scopes:
+        raise HTTPException(status_code=400, detail=f"scope must be one of: {', '.join(scopes)}")
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+READINGS_BULK_MAX = 50_000
+READINGS_MAX_PAGE = 100_000
+
+
+# POST /api/readings – append ship / interim / receive readings: a JSON list, {"readings": [...]},
+# or a text/csv body shaped like Sample_Movement_Data.csv
+@app.post("/api/readings")
+async def ingest_readings(request: Request):
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        body = (await request.body()).decode("utf-8-sig")
+        items = list(csv.DictReader(io.StringIO(body)))
+    else:
+        payload = await request.json()
+        items = payload.get("readings") if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return JSONResponse(status_code=400, content={"error": "Expected a non-empty list of readings"})
+    if len(items) > READINGS_BULK_MAX:
+        return JSONResponse(status_code=413, content={"error": f"At most {READINGS_BULK_MAX} readings per request"})
+
+    readings, errors = parse_readings(item if isinstance(item, dict) else {} for item in items)
+    result = {"appended": 0, "duplicates": 0, "containers": 0}
+    alerts = []
+    if readings:
+        result = await run_in_threadpool(readings_store.append, readings,
+                                         lambda container_id, fresh: alerts.extend(observe_readings(container_id, fresh)))
+    if alerts:
+        try:
+            await run_db(save_alerts, alerts)
+        except Exception as e:
+            # the readings are stored; losing an alert must not fail the upload
+            print(f"⚠️ Could not store {len(alerts)} boil-off alerts: {e}")
+    result["alerts"] = len(alerts)
+
+    print(f"✅ Readings: {result['appended']} appended, {result['duplicates']} duplicates, {len(errors)} rejected")
+    body = {**result, "errors": [{"index": i, "error": errors[i]} for i in sorted(errors)]}
+    return JSONResponse(status_code=200 if readings else 422, content=body)
+
+
+def observe_readings(container_id, readings):
+    alerts = []
+    for reading in readings:
+        alerts += boiloff_detector.observe(container_id, datetime.fromisoformat(from_micros(reading["ts"])),
+                                           reading["weight"], READING_EVENT_TYPES[reading["event_type"]],
+                                           source=f"reading {reading['sequence_number']}")
+    return alerts
+
+
+# GET /api/readings/{container_id} – readings in [start, end), oldest first
+@app.get("/api/readings/{container_id}")
+def get_readings(container_id: str, start: str = Query(None), end: str = Query(None),
+                 with_text: bool = Query(False), limit: int = Query(None, ge=1, le=READINGS_MAX_PAGE)):
+    try:
+        return readings_store.records(container_id, start, end, with_text=with_text, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# GET /api/readings/{container_id}/downsample – per-bucket min / mean / max weight and temperature for charts
+@app.get("/api/readings/{container_id}/downsample")
+def get_readings_downsampled(container_id: str, start: str = Query(None), end: str = Query(None),
+                             points: int = Query(500, ge=1, le=10_000),
+                             bucket_seconds: int = Query(None, ge=1)):
+    try:
+        return readings_store.downsample(container_id, start, end, points=points, bucket_seconds=bucket_seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+BOILOFF_ALERTS_MAX_PAGE = 1000
+
+
+# GET /api/alerts – boil-off alert feed; poll with since_id=<last_id> for new alerts
+@app.get("/api/alerts")
+async def get_alerts(since_id: int = Query(None, ge=0), container_id: str = Query(None),
+                     limit: int = Query(100, ge=1, le=BOILOFF_ALERTS_MAX_PAGE)):
+    feed = await run_db(read_alerts, since_id, container_id, limit)
+    if container_id:
+        feed["baseline"] = boiloff_detector.baseline(container_id)
+    return feed
+
+
 # @app.get("/api/ask-ai")
 # async def ask_ai(shipper_id: str):
 #     print(f"\nshipper routes: s_id: {shipper_id}")
@@ -969,52 +986,13 @@ from fastapi import Request
 from pydantic import BaseModel
 from cryotrace_ai_class import CryoTraceAI
 
-from openai import OpenAI
-import weaviate
 import os
 
-def build_final_prompt(shipments: list[dict], question: str, shipper_id: str) -> str:
-    if not shipments:
-        return ""
-
-    log_count = len(shipments)
-
-    intro = f"""You are an assistant helping users interpret cryogenic shipment data.
-
-You are given {log_count} shipment logs for shipper ID {shipper_id}.
-Each log includes:
-- shipment ID
-- pickup time and contact
-- delivery time and receiver
-- transit time in hours
-- evaporation rate in kg/hour
-
-You must evaluate all logs individually. Do not skip or summarize entries unless explicitly requested.
-Present all shipments using the same format, including timestamp, contact name, transit time, and evaporation rate. Use bullet points or numbering consistently.
-
-"""
-
-    logs = "\n\n".join(
-        f"""- ID: {s['shipment_id']}
-  Pickup: {s['pickup_time']} by {s['pickup_contact']}
-  Dropoff: {s['delivery_time']} to {s['receiver']}
-  Transit Time (hrs): {s['transit_time_hours']}
-  Evap Rate: {s['evaporation_rate_kg_per_hour']} kg/hr"""
-        for s in shipments
-    )
-  
-
-    return f"""{intro}
-
-Shipment Logs:
-{logs}
-
----
-
-User Question:
-{question}
-
-Answer:"""
+def build_final_prompt(shipments: list[dict], question: str, shipper_id: str) -> BuiltPrompt:
+    """Compact, token-budgeted prompt (see prompt_builder.py)."""
+    prompt = build_prompt(shipments, question, shipper_id)
+    print(f"📏 Prompt: {prompt.tokens} tokens, {prompt.included} shipments listed, {prompt.omitted} summarized")
+    return prompt
 
 
 
@@ -1022,18 +1000,15 @@ class AskAIRequest(BaseModel):
     question: str
     shipper_id: str | None = None
 
-@app.post("/api/ask-ai")
-async def ask_ai(request: Request):
-    body = await request.json()
-    question = body.get("prompt") or body.get("question")
-    shipper_id = body.get("shipper_id")
-
-    if not question or not shipper_id:
-        return {"error": "Missing 'prompt' or 'shipper_id'"}
-
-    # Initialize clients
-    client = weaviate.Client(os.getenv("WEAVIATE_URL"))
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async def retrieve_shipments(question: str, shipper_id: str):
+    """
+    Retrieval + CryoTraceAI analysis shared by /api/ask-ai and its streaming variant.
+    The Weaviate filter query, the vector query and the SQL fact lookup run
+    concurrently (retrieval.fan_out) and are merged with reciprocal-rank fusion.
+    """
+    # shared, already-connected clients
+    weaviate_client = clients.weaviate if VECTOR_BACKEND == "weaviate" else None
+    openai_client = clients.openai
 
     # Fields to retrieve
     fields = [
@@ -1057,41 +1032,44 @@ async def ask_ai(request: Request):
     mode = determine_query_mode(question)
     print("🔍 Query mode:", mode)
 
-    '''results = (
-        weaviate_client.query
-        .get("Shipment", fields)
-        .with_limit(5)
-        .do()
-    )
-    print(results) '''
+    def matches(query):
+        return query.do()["data"]["Get"].get("Shipment", [])
 
-    # Run query
-    if mode == "filter":
-        results = build_filter_query(weaviate_client, fields, filters).do()
-    else:
-        embedding = openai_client.embeddings.create(
-            model="text-embedding-3-small", input=question
-        ).data[0].embedding
+    def filter_search():
+        if VECTOR_BACKEND == "local":
+            return local_index.filter(**local_prefilter(shipper_id, cutoff_date, direction), limit=100)
+        return matches(build_filter_query(weaviate_client, fields, filters))
 
+    def vector_search():
+        embedding = embed_question(question)
+        if VECTOR_BACKEND == "local":
+            if mode == "semantic":
+                return local_index.search(embedding, k=25)
+            return local_index.search(embedding, k=50, **local_prefilter(shipper_id, cutoff_date, direction))
         if mode == "semantic":
-            results = build_semantic_query(weaviate_client, fields, embedding).do()
-        else:
-            results = build_hybrid_query(weaviate_client, fields, embedding, filters).do()
+            return matches(build_semantic_query(weaviate_client, fields, embedding))
+        return matches(build_hybrid_query(weaviate_client, fields, embedding, filters))
 
-    matches = results["data"]["Get"].get("Shipment", [])
-    # de-duplicate entries
-    seen = set()
-    unique_shipments = []
+    def sql_facts():
+        with connection() as conn:
+            return fetch_fact_rows(conn, shipper_id, cutoff_date, direction, source=JOURNEY_SOURCE)
 
-    for entry in matches:
-        key = (entry.get("manifest_id"), entry.get("pickup_time"))
-        if key not in seen:
-            seen.add(key)
-            unique_shipments.append(entry)
+    sources = {}
+    if mode != "semantic":
+        sources["filter"] = filter_search
+    if mode != "filter":
+        sources["vector"] = vector_search
+    if RETRIEVAL_SQL:
+        sources["sql"] = sql_facts
 
-    print(f"🧹 Deduplicated: {len(matches)} → {len(unique_shipments)} unique shipments")
+    ranked, timings = await fan_out(sources, record=clients.record)
+    print("🔀 Retrieval:", ", ".join(f"{name} {t['status']} {t['results']} in {t['seconds']:.2f}s"
+                                     for name, t in timings.items()))
+
+    # fusion keys on manifest_id, so each shipment appears once
+    unique_shipments = reciprocal_rank_fusion(ranked)
+    print(f"🧹 Fused: {sum(len(r) for r in ranked.values())} → {len(unique_shipments)} unique shipments")
 
-    
     shipment_logs = [entry for entry in unique_shipments if entry.get("shipper_id") == shipper_id]
 
 
@@ -1101,23 +1079,51 @@ async def ask_ai(request: Request):
     for s in shipments:
         print("📦 Checking:", s.get("manifest_id"), s.get("pickup_time"))
 
-    cutoff_line = ""
-    formatted = ""
-    if cutoff_date and direction in {"before", "after"}:
-        formatted = cutoff_date.strftime("%Y-%m-%d %H:%M:%S UTC")
-        cutoff_line = f"Only include shipments with pickup time {direction} {formatted}."
+    return shipments, analyzer
+
+
+@app.post("/api/ask-ai")
+async def ask_ai(request: Request):
+    body = await request.json()
+    question = body.get("prompt") or body.get("question")
+    shipper_id = body.get("shipper_id")
+
+    if not question or not shipper_id:
+        return {"error": "Missing 'prompt' or 'shipper_id'"}
+
+    request_start = time.perf_counter()
+    cutoff_date, direction = CryoTraceAI.parse_cutoff_date_and_direction(question)
+    data_version = await run_db(shipper_data_version, shipper_id)
+    cache_scope = (cutoff_date, direction, data_version, cache_intent(question, cutoff_date, direction))
+    cached = await run_in_threadpool(answer_cache.get, shipper_id, question, *cache_scope, embed=cache_embedding)
+    if cached is not None:
+        clients.record("ask_ai.time_to_answer", time.perf_counter() - request_start)
+        print(f"♻️ Answer cache hit for {shipper_id}")
+        return {**cached, "cached": True}
+
+    # metric questions are computed locally; the LLM at most rewords the result
+    try:
+        analytics = await run_in_threadpool(answer_metric_question, question, shipper_id, cutoff_date, direction)
+    except Exception as e:
+        print("⚠️ Metric engine failed, falling back to retrieval:", e)
+        analytics = None
+    if analytics is not None:
+        clients.record("ask_ai.time_to_answer", time.perf_counter() - request_start)
+        await run_in_threadpool(cache_answer, shipper_id, question, cache_scope, analytics)
+        return analytics
 
+    shipments, analyzer = await retrieve_shipments(question, shipper_id)
 
     # Generate answer using GPT
 
-    final_prompt = build_final_prompt(shipments, question, shipper_id)
-        
+    prompt = build_final_prompt(shipments, question, shipper_id)
+    final_prompt = prompt.text
+
     try:
-        print(f"📏 Prompt length: {len(final_prompt)} characters")
         print("🧾 FINAL PROMPT:\n", final_prompt)
         
         start_time = time.time()
-        ai_response = analyzer._call_model(final_prompt, model="gpt-3.5-turbo")
+        ai_response = await run_in_threadpool(analyzer._call_model, final_prompt, model="gpt-3.5-turbo")
         duration = time.time() - start_time
         print("response: ", ai_response)
         print(f"🕒 GPT-3.5 turbo response time: {duration:.2f} seconds")
@@ -1126,7 +1132,7 @@ async def ask_ai(request: Request):
         if not ai_response or "does not contain enough information" in ai_response:
             print("↩️ Falling back to GPT-4")
             start_time = time.time()
-            ai_response = analyzer._call_model(final_prompt, model="gpt-3.5-turbo")
+            ai_response = await run_in_threadpool(analyzer._call_model, final_prompt, model="gpt-3.5-turbo")
             duration = time.time() - start_time
             print(f"🕒 GPT-4 response time: {duration:.2f} seconds")
             print("response: ", ai_response)
@@ -1137,12 +1143,172 @@ async def ask_ai(request: Request):
         print("response: ", ai_response)
 
 
-    return {
+    time_to_answer = time.perf_counter() - request_start
+    clients.record("ask_ai.time_to_answer", time_to_answer)
+    print(f"⏱️ Time to answer: {time_to_answer:.2f}s")
+
+    result = {
         "shipments": shipments,
         "count": len(shipments),
-        "ai_response": ai_response
+        "ai_response": ai_response,
+        "prompt_tokens": prompt.tokens,
+    }
+    if ai_response and ai_response != "The AI failed to generate a response.":
+        await run_in_threadpool(cache_answer, shipper_id, question, cache_scope, result)
+    return result
+
+
+ASK_AI_MODEL = os.getenv("ASK_AI_MODEL", "gpt-3.5-turbo")
+ANALYTICS_LLM_PHRASING = os.getenv("ANALYTICS_LLM_PHRASING", "false").lower() in ("1", "true", "yes")
+
+
+def answer_metric_question(question: str, shipper_id: str, cutoff_date, direction: str):
+    """
+    Answer aggregate / top-k / group-by / trend questions straight from the journey
+    rows (analytics_engine). Returns the /api/ask-ai response body, or None when the
+    question isn't a metric question.
+    """
+    intent = parse_metric_intent(question, cutoff_date, direction)
+    if intent is None:
+        return None
+    print(f"🧮 Metric intent: {intent.describe()}")
+    with connection() as conn:
+        rows = fetch_journeys(conn, shipper_id, intent, source=JOURNEY_SOURCE)
+    result = run_intent(intent, rows)
+
+    answer = result["answer"]
+    if ANALYTICS_LLM_PHRASING:
+        try:
+            phrased = clients.openai.chat.completions.create(
+                model=ASK_AI_MODEL,
+                temperature=0,
+                messages=[{"role": "user", "content": (
+                    "Answer the question using only the computed result below. "
+                    "Do not change or recompute any numbers.\n\n"
+                    f"Question: {question}\n\nComputed result:\n{answer}"
+                )}],
+            ).choices[0].message.content.strip()
+            answer = phrased or answer
+        except Exception as e:
+            print("⚠️ Phrasing failed, returning computed answer:", e)
+
+    return {
+        "shipments": result["shipments"],
+        "count": result["count"],
+        "ai_response": answer,
+        "analytics": {k: result[k] for k in ("intent", "value", "groups")},
     }
 
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+def stream_answer(question: str, shipper_id: str, request_start: float, cache_scope: tuple, cached=None):
+    """
+    Server-sent events for /api/ask-ai/stream:
+      shipments  the analyzed shipment logs, as soon as retrieval finishes
+      token      {"text": ...} for each chunk the model produces
+      done       {"count", "time_to_first_token_s", "seconds"}
+      error      {"error": ...} if anything fails; the stream ends after it
+    Runs in Starlette's threadpool, so the blocking clients never touch the event loop.
+    A cached answer is replayed as a single token event.
+    """
+    if cached is not None:
+        yield sse_event("shipments", {"shipments": cached["shipments"], "count": cached["count"]})
+        yield sse_event("token", {"text": cached["ai_response"]})
+        total = time.perf_counter() - request_start
+        clients.record("ask_ai_stream.time_to_first_token", total)
+        yield sse_event("done", {"count": cached["count"], "cached": True,
+                                 "time_to_first_token_s": round(total, 3), "seconds": round(total, 3)})
+        return
+
+    try:
+        analytics = answer_metric_question(question, shipper_id, cache_scope[0], cache_scope[1])
+    except Exception as e:
+        print("⚠️ Metric engine failed, falling back to retrieval:", e)
+        analytics = None
+    if analytics is not None:
+        yield sse_event("shipments", {"shipments": analytics["shipments"], "count": analytics["count"]})
+        yield sse_event("token", {"text": analytics["ai_response"]})
+        cache_answer(shipper_id, question, cache_scope, analytics)
+        total = time.perf_counter() - request_start
+        clients.record("ask_ai_stream.time_to_first_token", total)
+        yield sse_event("done", {"count": analytics["count"], "analytics": analytics["analytics"],
+                                 "time_to_first_token_s": round(total, 3), "seconds": round(total, 3)})
+        return
+
+    try:
+        # back on the event loop so the sources can fan out there
+        shipments, _ = from_thread.run(retrieve_shipments, question, shipper_id)
+    except Exception as e:
+        print("❌ Retrieval failed:", e)
+        yield sse_event("error", {"error": str(e)})
+        return
+    yield sse_event("shipments", {"shipments": shipments, "count": len(shipments)})
+
+    prompt = build_final_prompt(shipments, question, shipper_id)
+    first_token = None
+    answer = []
+    try:
+        stream = clients.openai.chat.completions.create(
+            model=ASK_AI_MODEL,
+            temperature=0.3,
+            messages=[{"role": "user", "content": prompt.text}],
+            stream=True,
+        )
+        for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if not text:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - request_start
+                clients.record("ask_ai_stream.time_to_first_token", first_token)
+            answer.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        print("❌ Error streaming AI response:", e)
+        yield sse_event("error", {"error": "The AI failed to generate a response."})
+        return
+
+    if answer:
+        cache_answer(shipper_id, question, cache_scope,
+                     {"shipments": shipments, "count": len(shipments), "ai_response": "".join(answer),
+                      "prompt_tokens": prompt.tokens})
+
+    total = time.perf_counter() - request_start
+    clients.record("ask_ai_stream.time_to_answer", total)
+    print(f"⏱️ Streamed answer: first token {first_token or 0:.2f}s, done {total:.2f}s")
+    yield sse_event("done", {
+        "count": len(shipments),
+        "prompt_tokens": prompt.tokens,
+        "time_to_first_token_s": round(first_token, 3) if first_token is not None else None,
+        "seconds": round(total, 3),
+    })
+
+
+@app.post("/api/ask-ai/stream")
+async def ask_ai_stream(request: Request):
+    body = await request.json()
+    question = body.get("prompt") or body.get("question")
+    shipper_id = body.get("shipper_id")
+
+    if not question or not shipper_id:
+        return JSONResponse(status_code=400, content={"error": "Missing 'prompt' or 'shipper_id'"})
+
+    request_start = time.perf_counter()
+    cutoff_date, direction = CryoTraceAI.parse_cutoff_date_and_direction(question)
+    data_version = await run_db(shipper_data_version, shipper_id)
+    cache_scope = (cutoff_date, direction, data_version, cache_intent(question, cutoff_date, direction))
+    cached = await run_in_threadpool(answer_cache.get, shipper_id, question, *cache_scope, embed=cache_embedding)
+
+    return StreamingResponse(
+        stream_answer(question, shipper_id, request_start, cache_scope, cached),
+        media_type="text/event-stream",
+        # no proxy buffering, or the tokens arrive all at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
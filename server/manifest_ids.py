@@ -0,0 +1,66 @@
+"""
+Race-free MAN-xxxxxx allocation.
+
+Each allocation is a single-row UPDATE on id_sequence using the
+LAST_INSERT_ID(expr) idiom, so concurrent callers (across workers and
+hosts) never get the same number and no manifest rows are scanned.
+
+To keep round trips off the hot path each process reserves a block of
+MANIFEST_ID_BLOCK numbers at a time and hands them out from memory. Ids are
+unique but not gap-free: an unused remainder of a block is skipped when the
+process exits.
+"""
+import os
+import threading
+
+MANIFEST_ID_PREFIX = "MAN-"
+MANIFEST_ID_BLOCK = int(os.getenv("MANIFEST_ID_BLOCK", 20))
+SEQUENCE_NAME = "manifest"
+
+
+def format_manifest_id(number: int) -> str:
+    return f"{MANIFEST_ID_PREFIX}{number:06d}"
+
+
+def reserve_range(conn, count: int, name: str = SEQUENCE_NAME) -> range:
+    """Atomically claim `count` consecutive sequence numbers and commit."""
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    cursor = conn.cursor(buffered=True)
+    cursor.execute(
+        "UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + %s) WHERE name = %s",
+        (count, name),
+    )
+    if cursor.rowcount != 1:
+        cursor.close()
+        conn.rollback()
+        raise RuntimeError(f"id_sequence '{name}' is missing; run migrate.py")
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    (end,) = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    return range(end - count, end)
+
+
+class ManifestIdAllocator:
+    """Hands out manifest ids from a locally reserved block, refilling from id_sequence."""
+
+    def __init__(self, block_size: int = MANIFEST_ID_BLOCK):
+        self.block_size = block_size
+        self._block = iter(())
+        self._lock = threading.Lock()
+
+    def next_id(self, conn) -> str:
+        with self._lock:
+            number = next(self._block, None)
+            if number is None:
+                self._block = iter(reserve_range(conn, self.block_size))
+                number = next(self._block)
+        return format_manifest_id(number)
+
+    def reserve(self, conn, count: int) -> list[str]:
+        """Contiguous ids for bulk creation, claimed straight from the sequence."""
+        return [format_manifest_id(n) for n in reserve_range(conn, count)]
+
+
+allocator = ManifestIdAllocator()
@@ -0,0 +1,154 @@
+"""
+Manifest model and the batched insert behind /api/manifests/bulk.
+
+validate_manifests() checks a request's items one by one and reports errors by
+position, so one bad row doesn't reject the batch. insert_manifests_bulk()
+writes the valid ones in one transaction. The server owns temperature_c,
+created_at and dev_current_time, as on the single-create path; clients can't
+set them.
+"""
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError
+
+from manifest_ids import allocator as manifest_id_allocator
+from shipment_journey import refresh_shipment_journey
+
+MANIFEST_TEMPERATURE_C = -196
+
+
+class ManifestCreateRequest(BaseModel):
+    manifest_id: str
+    shipper_id: str
+    origin_location_id: int
+    origin_contact_name: str
+    destination_location_id: int
+    destination_contact_name: str
+    scheduled_ship_time: datetime
+    expected_receive_time: datetime
+    projected_weight_kg: float
+    temperature_c: int
+    notes: Optional[str] = None
+    created_by_user_id: int
+    created_at: datetime
+    dev_current_time: datetime
+
+
+MANIFEST_INSERT_SQL = """
+    INSERT INTO shipping_manifest (
+        manifest_id,
+        shipper_id,
+        origin_location_id,
+        origin_contact_name,
+        destination_location_id,
+        destination_contact_name,
+        scheduled_ship_time,
+        expected_receive_time,
+        projected_weight_kg,
+        temperature_c,
+        notes,
+        created_by_user_id,
+        created_at,
+        dev_current_time
+    ) VALUES (
+        %(manifest_id)s,
+        %(shipper_id)s,
+        %(origin_location_id)s,
+        %(origin_contact_name)s,
+        %(destination_location_id)s,
+        %(destination_contact_name)s,
+        %(scheduled_ship_time)s,
+        %(expected_receive_time)s,
+        %(projected_weight_kg)s,
+        %(temperature_c)s,
+        %(notes)s,
+        %(created_by_user_id)s,
+        %(created_at)s,
+        %(dev_current_time)s
+    )
+"""
+
+
+def manifest_params(manifest: ManifestCreateRequest) -> dict:
+    return {
+        "manifest_id": manifest.manifest_id,
+        "shipper_id": manifest.shipper_id,
+        "origin_location_id": manifest.origin_location_id,
+        "origin_contact_name": manifest.origin_contact_name,
+        "destination_location_id": manifest.destination_location_id,
+        "destination_contact_name": manifest.destination_contact_name,
+        "scheduled_ship_time": manifest.scheduled_ship_time,   # datetime or str acceptable to connector
+        "expected_receive_time": manifest.expected_receive_time,
+        "projected_weight_kg": manifest.projected_weight_kg,
+        "temperature_c": manifest.temperature_c,
+        "notes": getattr(manifest, "notes", None),
+        "created_by_user_id": manifest.created_by_user_id,
+        "created_at": getattr(manifest, "created_at", datetime.utcnow()),
+        "dev_current_time": getattr(manifest, "dev_current_time", datetime.utcnow()),
+    }
+
+
+MANIFEST_BULK_MAX = 500
+
+
+def validate_manifests(items: list, now: datetime = None):
+    """(valid [(index, ManifestCreateRequest)], {index: error}) for the items of a bulk request."""
+    now = now or datetime.utcnow()
+    errors = {}
+    valid = []
+    seen = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[index] = "Expected an object"
+            continue
+        # server-owned fields go last so a client can't override them
+        row = {**item, "temperature_c": MANIFEST_TEMPERATURE_C, "created_at": now, "dev_current_time": now}
+        row["manifest_id"] = row.get("manifest_id") or ""
+        try:
+            manifest = ManifestCreateRequest(**row)
+        except ValidationError as e:
+            errors[index] = "; ".join(f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors())
+            continue
+        if manifest.manifest_id:
+            if manifest.manifest_id in seen:
+                errors[index] = f"Manifest ID {manifest.manifest_id} appears more than once in this request"
+                continue
+            seen.add(manifest.manifest_id)
+        valid.append((index, manifest))
+    return valid, errors
+
+
+def insert_manifests_bulk(conn, manifests: list, missing_ids: int):
+    """
+    Insert a validated batch in one transaction. Ids already in the table are
+    found with a single IN query and skipped; rows without an id get one from
+    the allocator. Returns (created_ids, {batch position: error}).
+    """
+    errors = {}
+    new_ids = iter(manifest_id_allocator.reserve(conn, missing_ids)) if missing_ids else iter(())
+
+    cursor = conn.cursor()
+    given = [m.manifest_id for _, m in manifests if m.manifest_id]
+    existing = set()
+    if given:
+        placeholders = ", ".join(["%s"] * len(given))
+        cursor.execute(f"SELECT manifest_id FROM shipping_manifest WHERE manifest_id IN ({placeholders})", given)
+        existing = {row[0] for row in cursor.fetchall()}
+
+    rows = []
+    for index, manifest in manifests:
+        if not manifest.manifest_id:
+            manifest.manifest_id = next(new_ids)
+        elif manifest.manifest_id in existing:
+            errors[index] = f"Manifest ID {manifest.manifest_id} is already in use"
+            continue
+        rows.append(manifest_params(manifest))
+
+    if rows:
+        # mysql.connector rewrites executemany INSERTs into one multi-row VALUES statement
+        cursor.executemany(MANIFEST_INSERT_SQL, rows)
+        refresh_shipment_journey(cursor, [r["manifest_id"] for r in rows])
+        conn.commit()
+    cursor.close()
+    return [r["manifest_id"] for r in rows], errors
@@ -0,0 +1,106 @@
+"""
+Versioned SQL migrations for the CryoTrace MySQL schema.
+
+Files in migrations/ named NNNN_description.sql are applied in order and
+recorded in schema_migrations, so each runs exactly once per database.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied / pending
+"""
+import argparse
+import os
+import re
+
+import mysql.connector
+from mysql.connector import errorcode
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+_MIGRATION_FILE = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+
+# Re-running an index/column that already exists (e.g. added by hand before this
+# migration set existed), or dropping one that is already gone, is not an error
+# worth stopping for.
+_ALREADY_APPLIED = {
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_CANT_DROP_FIELD_OR_KEY,
+}
+
+
+def available_migrations() -> list[tuple[str, str, str]]:
+    """(version, name, path) for every migration file, in version order."""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            found.append((match.group(1), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return found
+
+
+def split_statements(sql: str) -> list[str]:
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     VARCHAR(16)  NOT NULL PRIMARY KEY,
+            name        VARCHAR(255) NOT NULL,
+            applied_at  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(conn) -> set[str]:
+    cursor = conn.cursor()
+    _ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+
+def apply_migrations(conn) -> list[str]:
+    """Apply every pending migration; returns the versions applied."""
+    done = applied_versions(conn)
+    applied = []
+    cursor = conn.cursor()
+    for version, name, path in available_migrations():
+        if version in done:
+            continue
+        with open(path) as f:
+            statements = split_statements(f.read())
+        print(f"🔧 Applying migration {version}_{name} ({len(statements)} statements)")
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except mysql.connector.Error as e:
+                if e.errno not in _ALREADY_APPLIED:
+                    raise
+                print(f"⚠️ Skipping, already present: {e.msg}")
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+        applied.append(version)
+    cursor.close()
+    if not applied:
+        print("✅ Schema up to date")
+    return applied
+
+
+if __name__ == "__main__":
+    from db import connection
+
+    parser = argparse.ArgumentParser(description="Apply CryoTrace schema migrations")
+    parser.add_argument("--status", action="store_true", help="show applied / pending migrations and exit")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        if args.status:
+            done = applied_versions(conn)
+            for version, name, _ in available_migrations():
+                print(f"{'applied' if version in done else 'pending':>8}  {version}_{name}")
+        else:
+            apply_migrations(conn)
@@ -0,0 +1,48 @@
+-- Denormalized one-row-per-manifest journey table (see shipment_journey.py)
+CREATE TABLE IF NOT EXISTS shipment_journey (
+    manifest_id               VARCHAR(64)   NOT NULL,
+    shipper_id                VARCHAR(64)   NOT NULL,
+
+    origin_location_id        INT           NULL,
+    destination_location_id   INT           NULL,
+    planned_origin_city       VARCHAR(128)  NULL,
+    planned_origin_state      VARCHAR(64)   NULL,
+    planned_dest_city         VARCHAR(128)  NULL,
+    planned_dest_state        VARCHAR(64)   NULL,
+    origin_contact_name       VARCHAR(255)  NULL,
+    destination_contact_name  VARCHAR(255)  NULL,
+    scheduled_ship_time       DATETIME      NULL,
+    expected_receive_time     DATETIME      NULL,
+    created_at                DATETIME      NULL,
+    created_by_user_id        INT           NULL,
+    projected_weight_kg       DECIMAL(10,3) NULL,
+    notes                     TEXT          NULL,
+
+    pickup_time               DATETIME      NULL,
+    pickup_user_id            INT           NULL,
+    pickup_weight             DECIMAL(10,3) NULL,
+    pickup_location_id        INT           NULL,
+
+    dropoff_time              DATETIME      NULL,
+    dropoff_user_id           INT           NULL,
+    dropoff_contact_name      VARCHAR(255)  NULL,
+    dropoff_weight            DECIMAL(10,3) NULL,
+    dropoff_location_id       INT           NULL,
+
+    origin_company_name       VARCHAR(255)  NULL,
+    origin_company_address    VARCHAR(255)  NULL,
+    origin_city               VARCHAR(128)  NULL,
+    origin_state              VARCHAR(64)   NULL,
+    dest_company_name         VARCHAR(255)  NULL,
+    dest_company_address      VARCHAR(255)  NULL,
+    dest_city                 VARCHAR(128)  NULL,
+    dest_state                VARCHAR(64)   NULL,
+
+    transit_hours                 DOUBLE    NULL,
+    evaporation_rate_kg_per_hour  DOUBLE    NULL,
+
+    updated_at  TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+
+    PRIMARY KEY (manifest_id),
+    KEY idx_shipment_journey_shipper_pickup (shipper_id, pickup_time, manifest_id)
+);
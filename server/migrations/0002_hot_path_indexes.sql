@@ -0,0 +1,14 @@
+-- Composite indexes for the queries in main.py / journey_query.py / shipment_journey.py.
+
+-- /api/records?filter=manifestid and the shipper-scoped journey joins:
+--   WHERE m.shipper_id = %s ORDER BY m.manifest_id DESC
+CREATE INDEX idx_shipping_manifest_shipper_manifest ON shipping_manifest (shipper_id, manifest_id);
+
+-- journey joins on manifest_id; refresh_shipment_journey picks the latest event per manifest
+CREATE INDEX idx_pickup_event_manifest_departure ON pickup_event (manifest_id, actual_departure_at);
+CREATE INDEX idx_dropoff_event_manifest_receive ON dropoff_event (manifest_id, actual_receive_time);
+
+-- cw_pickup / cw_dropoff joins filter on (manifest_id, weight_type) and take the latest event_time
+CREATE INDEX idx_container_weight_event_manifest_type_time ON container_weight_event (manifest_id, weight_type, event_time);
+
+-- materialized reads (WHERE sj.shipper_id = %s) use 0001's (shipper_id, pickup_time, manifest_id) key
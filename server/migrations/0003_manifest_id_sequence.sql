@@ -0,0 +1,11 @@
+-- Counter backing manifest_ids.py; replaces SELECT MAX(manifest_id) for next-id.
+CREATE TABLE IF NOT EXISTS id_sequence (
+    name        VARCHAR(64)      NOT NULL PRIMARY KEY,
+    next_value  BIGINT UNSIGNED  NOT NULL
+);
+
+-- seed from the highest MAN-xxxxxx already issued
+INSERT IGNORE INTO id_sequence (name, next_value)
+SELECT 'manifest', COALESCE(MAX(CAST(SUBSTRING_INDEX(manifest_id, '-', -1) AS UNSIGNED)), 0) + 1
+FROM shipping_manifest
+WHERE manifest_id LIKE 'MAN-%';
@@ -0,0 +1,11 @@
+-- High-water marks for weaviate_sync.py (incremental MySQL -> Weaviate sync).
+CREATE TABLE IF NOT EXISTS sync_state (
+    name              VARCHAR(64)   NOT NULL PRIMARY KEY,
+    high_water        TIMESTAMP(6)  NULL,
+    last_manifest_id  VARCHAR(32)   NULL,
+    synced_total      BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at        TIMESTAMP(6)  NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+);
+
+-- change feed scan: WHERE (updated_at, manifest_id) > (mark) ORDER BY updated_at, manifest_id
+CREATE INDEX idx_shipment_journey_updated ON shipment_journey (updated_at, manifest_id);
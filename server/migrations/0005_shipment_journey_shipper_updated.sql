@@ -0,0 +1,3 @@
+-- answer_cache.shipper_data_version(): SELECT MAX(updated_at) ... WHERE shipper_id = %s
+-- becomes a single index lookup instead of reading every journey row for the shipper.
+CREATE INDEX idx_shipment_journey_shipper_updated ON shipment_journey (shipper_id, updated_at);
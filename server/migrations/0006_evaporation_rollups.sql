@@ -0,0 +1,30 @@
+-- Incrementally maintained evaporation aggregates (see evaporation_rollups.py).
+-- scope is 'shipper' (rollup_key ''), 'lane' ('Denver, CO → Boston, MA') or 'day' ('YYYY-MM-DD' of pickup).
+CREATE TABLE IF NOT EXISTS evaporation_rollup (
+    shipper_id  VARCHAR(64)   NOT NULL,
+    scope       VARCHAR(16)   NOT NULL,
+    rollup_key  VARCHAR(255)  NOT NULL,
+    trips       INT           NOT NULL DEFAULT 0,
+    rate_sum    DOUBLE        NOT NULL DEFAULT 0,
+    rate_min    DOUBLE        NULL,
+    rate_max    DOUBLE        NULL,
+    loss_kg     DOUBLE        NOT NULL DEFAULT 0,
+    updated_at  TIMESTAMP(6)  NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (shipper_id, scope, rollup_key)
+);
+
+-- Log-spaced histogram of evaporation rates per rollup, for p50 / p95.
+CREATE TABLE IF NOT EXISTS evaporation_rollup_bucket (
+    shipper_id  VARCHAR(64)   NOT NULL,
+    scope       VARCHAR(16)   NOT NULL,
+    rollup_key  VARCHAR(255)  NOT NULL,
+    bucket      SMALLINT      NOT NULL,
+    trips       INT           NOT NULL DEFAULT 0,
+    PRIMARY KEY (shipper_id, scope, rollup_key, bucket)
+);
+
+-- What each trip last contributed, so a re-recorded event replaces it instead of double counting.
+ALTER TABLE shipment_journey ADD COLUMN rolled_up_rate DOUBLE NULL;
+ALTER TABLE shipment_journey ADD COLUMN rolled_up_loss DOUBLE NULL;
+ALTER TABLE shipment_journey ADD COLUMN rolled_up_lane VARCHAR(255) NULL;
+ALTER TABLE shipment_journey ADD COLUMN rolled_up_day DATE NULL;
@@ -0,0 +1,20 @@
+-- Per-day t-digests of evaporation rate and transit time (see quantile_sketches.py).
+-- scope is 'shipper' (sketch_key '') or 'lane' ('Denver, CO → Boston, MA'); day is the pickup day.
+CREATE TABLE IF NOT EXISTS quantile_sketch (
+    shipper_id  VARCHAR(64)   NOT NULL,
+    scope       VARCHAR(16)   NOT NULL,
+    sketch_key  VARCHAR(255)  NOT NULL,
+    metric      VARCHAR(32)   NOT NULL,
+    day         DATE          NOT NULL,
+    trips       INT           NOT NULL DEFAULT 0,
+    digest      BLOB          NOT NULL,
+    updated_at  TIMESTAMP(6)  NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    PRIMARY KEY (shipper_id, day, scope, sketch_key, metric)
+);
+
+-- What each trip was last sketched with; the source for re-sketching a day after a correction.
+ALTER TABLE shipment_journey ADD COLUMN sketched_rate DOUBLE NULL;
+ALTER TABLE shipment_journey ADD COLUMN sketched_hours DOUBLE NULL;
+ALTER TABLE shipment_journey ADD COLUMN sketched_lane VARCHAR(255) NULL;
+ALTER TABLE shipment_journey ADD COLUMN sketched_day DATE NULL;
+CREATE INDEX idx_shipment_journey_shipper_sketched_day ON shipment_journey (shipper_id, sketched_day);
@@ -0,0 +1,3 @@
+-- idx_shipment_journey_shipper (0002) is a prefix of 0001's (shipper_id, pickup_time, manifest_id)
+-- key and 0005's (shipper_id, updated_at); it only cost writes. Fresh databases never create it.
+DROP INDEX idx_shipment_journey_shipper ON shipment_journey;
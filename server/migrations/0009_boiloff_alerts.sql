@@ -0,0 +1,16 @@
+-- Boil-off alerts raised by boiloff_detector.py, behind /api/alerts.
+-- id is the feed cursor: clients poll with since_id=<last id they saw>.
+CREATE TABLE IF NOT EXISTS boiloff_alert (
+    id                    BIGINT        NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    container_id          VARCHAR(128)  NOT NULL,
+    kind                  VARCHAR(16)   NOT NULL,
+    rate_kg_per_hour      DOUBLE        NOT NULL,
+    baseline_kg_per_hour  DOUBLE        NULL,
+    z                     DOUBLE        NOT NULL,
+    cusum                 DOUBLE        NOT NULL,
+    event_type            VARCHAR(16)   NOT NULL,
+    source                VARCHAR(64)   NULL,
+    observed_at           DATETIME(6)   NULL,
+    detected_at           DATETIME(3)   NOT NULL,
+    KEY idx_boiloff_alert_container (container_id, id)
+);
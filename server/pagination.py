@@ -0,0 +1,86 @@
+import base64
+import decimal
+import json
+from datetime import date, datetime
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe cursor holding the sort-key values of the last row returned."""
+    raw = json.dumps(values, default=json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_len: int) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, json.JSONDecodeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != expected_len:
+        raise ValueError("Cursor does not match this query's sort key")
+    return values
+
+
+def keyset_predicate(sort_columns: list[str], values: list) -> tuple[str, list]:
+    """
+    WHERE fragment selecting the rows that come after `values` when ordering by
+    `sort_columns` all DESC (MySQL puts NULLs last in DESC order).
+
+    keyset_predicate(["pe.actual_departure_at", "m.manifest_id"], [t, "MAN-000042"])
+    -> "(pe.actual_departure_at < %s OR pe.actual_departure_at IS NULL
+         OR (pe.actual_departure_at = %s AND m.manifest_id < %s))"
+    """
+    column, value = sort_columns[0], values[0]
+    rest = sort_columns[1:]
+
+    if not rest:
+        if value is None:
+            return "FALSE", []
+        return f"({column} < %s OR {column} IS NULL)", [value]
+
+    tail_sql, tail_params = keyset_predicate(rest, values[1:])
+    if value is None:
+        return f"({column} IS NULL AND {tail_sql})", tail_params
+    return (
+        f"({column} < %s OR {column} IS NULL OR ({column} = %s AND {tail_sql}))",
+        [value, value] + tail_params,
+    )
+
+
+def iter_ndjson(cursor, sort_aliases: list[str], limit: int | None = None, batch_size: int = 500):
+    """
+    Yield rows from an unbuffered cursor as NDJSON, one fetchmany() batch at a time,
+    so the full result set is never held in memory.
+
+    When `limit` is set the query is expected to fetch limit + 1 rows; the extra row
+    is not sent, and a final {"next_cursor": ...} line tells the client where to resume.
+    """
+    sent = 0
+    last = None
+    has_more = False
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if limit is not None and sent + len(rows) > limit:
+            rows = rows[:limit - sent]
+            has_more = True
+        if rows:
+            sent += len(rows)
+            last = rows[-1]
+            yield "".join(json.dumps(row, default=json_default) + "\n" for row in rows)
+        if has_more:
+            cursor.fetchall()   # only the EOF is left; read it so the connection is reusable
+            break
+
+    if limit is not None:
+        next_cursor = encode_cursor([last[a] for a in sort_aliases]) if has_more and last else None
+        yield json.dumps({"next_cursor": next_cursor}) + "\n"
@@ -0,0 +1,181 @@
+"""
+Token-budgeted prompt for /api/ask-ai.
+
+Shipments are encoded as one pipe-separated row each under a single header
+(roughly a fifth of the tokens of the old multi-line blocks), ranked for the
+question, and added until PROMPT_TOKEN_BUDGET is reached. Whatever doesn't fit
+is summarised in one line (count, date range, min/mean/max transit and
+evaporation) so the model still knows it exists.
+
+Token counts use tiktoken when it is installed, else ~4 characters per token.
+"""
+import os
+import re
+from dataclasses import dataclass
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 3000))
+PROMPT_MODEL = os.getenv("ASK_AI_MODEL", "gpt-3.5-turbo")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoders = {}
+
+
+def count_tokens(text: str, model: str = PROMPT_MODEL) -> int:
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    encoder = _encoders.get(model)
+    if encoder is None:
+        try:
+            encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoder = tiktoken.get_encoding("cl100k_base")
+        _encoders[model] = encoder
+    return len(encoder.encode(text))
+
+
+COLUMNS = ("id", "pickup", "picked_up_by", "dropoff", "received_by", "transit_h", "evap_kg_h")
+
+
+def _hours(value):
+    """transit_time_hours is either a number or the analyzer's 'H:MM' string."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str) and ":" in value:
+        hours, minutes = value.split(":", 1)
+        return int(hours) + int(minutes) / 60
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _short_time(value) -> str:
+    if not value:
+        return ""
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return text.replace("T", " ").rstrip("Z")[:16]
+
+
+def encode_row(s: dict) -> str:
+    transit = _hours(s.get("transit_time_hours"))
+    evap = _number(s.get("evaporation_rate_kg_per_hour"))
+    return "|".join([
+        str(s.get("shipment_id") or ""),
+        _short_time(s.get("pickup_time")),
+        str(s.get("pickup_contact") or ""),
+        _short_time(s.get("delivery_time")),
+        str(s.get("receiver") or ""),
+        f"{transit:.2f}" if transit is not None else "",
+        f"{evap:.4f}" if evap is not None else "",
+    ])
+
+
+_RANKINGS = (
+    (re.compile(r"\b(evap\w*|boil.?off|loss|lost)\b"), lambda s: _number(s.get("evaporation_rate_kg_per_hour"))),
+    (re.compile(r"\b(longest|shortest|slowest|fastest|quickest|transit|duration|took)\b"),
+     lambda s: _hours(s.get("transit_time_hours"))),
+)
+_HIGH = re.compile(r"\b(highest|most|largest|biggest|maximum|max|longest|slowest|worst)\b")
+_LOW = re.compile(r"\b(lowest|least|smallest|minimum|min|shortest|fastest|quickest|best)\b")
+_RECENT = re.compile(r"\b(recent|latest|last|newest)\b")
+
+
+def _both_ends(ordered: list) -> list:
+    """lowest, highest, 2nd lowest, 2nd highest, ... so truncation keeps both extremes."""
+    out = []
+    i, j = 0, len(ordered) - 1
+    while i <= j:
+        out.append(ordered[i])
+        if i != j:
+            out.append(ordered[j])
+        i, j = i + 1, j - 1
+    return out
+
+
+def rank_shipments(shipments: list[dict], question: str) -> list[dict]:
+    """
+    Order shipments so the rows most likely to matter survive truncation:
+    by evaporation / transit time when the question is about that (highest or
+    lowest first as the question asks, both ends when it doesn't say), by
+    recency, otherwise keep the retrieval order. Rows without the value go last.
+    """
+    q = question.lower()
+    for pattern, value in _RANKINGS:
+        if pattern.search(q):
+            known = [s for s in shipments if value(s) is not None]
+            unknown = [s for s in shipments if value(s) is None]
+            high, low = bool(_HIGH.search(q)), bool(_LOW.search(q))
+            ordered = sorted(known, key=value, reverse=high and not low)
+            if high == low:
+                ordered = _both_ends(ordered)
+            return ordered + unknown
+    if _RECENT.search(q):
+        return sorted(shipments, key=lambda s: _short_time(s.get("pickup_time")) or "", reverse=True)
+    return list(shipments)
+
+
+def summarize_overflow(shipments: list[dict]) -> str:
+    if not shipments:
+        return ""
+    times = sorted(t for t in (_short_time(s.get("pickup_time")) for s in shipments) if t)
+    parts = [f"{len(shipments)} more shipments not listed"]
+    if times:
+        parts.append(f"pickups {times[0][:10]} to {times[-1][:10]}")
+    for label, values in (
+        ("transit_h", [_hours(s.get("transit_time_hours")) for s in shipments]),
+        ("evap_kg_h", [_number(s.get("evaporation_rate_kg_per_hour")) for s in shipments]),
+    ):
+        values = [v for v in values if v is not None]
+        if values:
+            parts.append(f"{label} min {min(values):.2f} / mean {sum(values) / len(values):.2f} / max {max(values):.2f}")
+    return "; ".join(parts) + "."
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    included: int
+    omitted: int
+
+
+def build_prompt(shipments: list[dict], question: str, shipper_id: str,
+                 budget: int = PROMPT_TOKEN_BUDGET, model: str = PROMPT_MODEL) -> BuiltPrompt:
+    intro = (
+        "You are an assistant helping users interpret cryogenic shipment data.\n\n"
+        f"Shipment logs for shipper ID {shipper_id}, one per line, columns: {'|'.join(COLUMNS)}.\n"
+        "Times are UTC; transit_h is hours in transit; evap_kg_h is evaporation in kg/hour.\n"
+        "Answer from these logs only. When listing shipments, use the same fields for each."
+    )
+    tail = f"\n\nUser Question:\n{question}\n\nAnswer:"
+    used = count_tokens(intro + "\n\nShipment Logs:\n" + tail, model)
+
+    ranked = rank_shipments(shipments, question)
+    rows = []
+    # reserve room for the overflow line so adding it can't push us over budget
+    reserve = count_tokens(summarize_overflow(ranked), model) + 1 if ranked else 0
+    for s in ranked:
+        row = encode_row(s)
+        cost = count_tokens(row + "\n", model)
+        if used + cost + reserve > budget and rows:
+            break
+        rows.append(row)
+        used += cost
+
+    overflow = summarize_overflow(ranked[len(rows):])
+    body = "\n".join(rows)
+    if overflow:
+        body += f"\n({overflow})"
+    text = f"{intro}\n\nShipment Logs:\n{body}{tail}"
+    return BuiltPrompt(text=text, tokens=count_tokens(text, model), included=len(rows), omitted=len(ranked) - len(rows))
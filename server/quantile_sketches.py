@@ -0,0 +1,389 @@
+"""
+Mergeable percentile sketches for evaporation rate and transit time.
+
+The store holds one t-digest per shipper, per lane (origin -> destination),
+per metric and per pickup day, in quantile_sketch. A digest summarises any
+number of trips in well under SKETCH_COMPRESSION (mean, weight) centroids. It is
+exact at the extremes and accurate to well under 1% of rank around p50, and
+its error shrinks towards p99. Digests merge, so p50 / p95 / p99 over any
+window of days come from merging that window's daily digests. No request
+ever sorts the event rows.
+
+The pickup and dropoff endpoints call apply_sketch_change() in their own
+transaction, after refresh_shipment_journey(). A newly delivered trip is
+folded into its day's digests. A digest can't forget a value, so when a
+delivered trip is re-recorded, its old and new days are re-sketched from
+shipment_journey instead. The sketched_* guard columns hold what each trip
+contributed.
+
+    digest = TDigest()
+    for rate in rates:
+        digest.add(rate)
+    digest.quantile(0.95)
+    TDigest.from_bytes(digest.to_bytes())       # ~8 bytes per centroid
+
+    python quantile_sketches.py --rebuild       # backfill / repair from shipment_journey
+"""
+import argparse
+import math
+import os
+import struct
+from itertools import chain
+
+from evaporation_rollups import lane_key
+
+SKETCH_COMPRESSION = int(os.getenv("SKETCH_COMPRESSION", 100))
+
+SCOPES = ("shipper", "lane")
+METRICS = ("evaporation_rate", "transit_hours")
+QUANTILES = (0.50, 0.95, 0.99)
+
+# version, compression, centroid count, min, max; then (mean, weight) float32 pairs
+_HEADER = struct.Struct("<BHIdd")
+_VERSION = 1
+
+
+class TDigest:
+    """Merging t-digest (Dunning & Ertl) with the arcsine scale function."""
+
+    def __init__(self, compression: int = SKETCH_COMPRESSION):
+        self.compression = compression
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means: list[float] = []
+        self._weights: list[float] = []
+        self._buffer: list[tuple[float, float]] = []
+
+    def __len__(self):
+        return int(self.count)
+
+    def add(self, value: float, weight: float = 1.0):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+        return self
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+        return self
+
+    @classmethod
+    def merged(cls, digests, compression: int = SKETCH_COMPRESSION) -> "TDigest":
+        result = cls(compression)
+        for digest in digests:
+            result.merge(digest)
+        return result
+
+    def centroids(self) -> list[tuple[float, float]]:
+        self._compress()
+        return list(zip(self._means, self._weights))
+
+    # k(q) = compression / 2π · asin(2q - 1): small centroids near q = 0 and 1, large ones in the middle
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(min(1.0, max(-1.0, 2 * q - 1)))
+
+    def _q(self, k: float) -> float:
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(chain(zip(self._means, self._weights), self._buffer))
+        self._buffer = []
+        total = self.count
+        means, weights = [], []
+        mean, weight = items[0]
+        done = 0.0
+        limit = total * self._q(self._k(0.0) + 1)
+        for m, w in items[1:]:
+            if done + weight + w <= limit:
+                weight += w
+                mean += (m - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                done += weight
+                limit = total * self._q(self._k(done / total) + 1)
+                mean, weight = m, w
+        means.append(mean)
+        weights.append(weight)
+        self._means, self._weights = means, weights
+
+    def quantile(self, q: float):
+        """q-quantile (0..1), interpolated between centroid centres; None when empty."""
+        self._compress()
+        if not self.count:
+            return None
+        target = min(1.0, max(0.0, q)) * self.count
+        # piecewise linear through (0, min), each centroid's centre, (count, max)
+        prev_x, prev_value = 0.0, self.min
+        cumulative = 0.0
+        for mean, weight in zip(self._means, self._weights):
+            centre = cumulative + weight / 2
+            if target <= centre:
+                return _interpolate(prev_x, prev_value, centre, mean, target)
+            prev_x, prev_value = centre, mean
+            cumulative += weight
+        return _interpolate(prev_x, prev_value, self.count, self.max, target)
+
+    def to_bytes(self) -> bytes:
+        self._compress()
+        n = len(self._means)
+        header = _HEADER.pack(_VERSION, self.compression, n,
+                              self.min if n else 0.0, self.max if n else 0.0)
+        pairs = chain.from_iterable(zip(self._means, self._weights))
+        return header + struct.pack(f"<{2 * n}f", *pairs)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "TDigest":
+        version, compression, n, low, high = _HEADER.unpack_from(blob)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        digest = cls(compression)
+        if n:
+            pairs = struct.unpack_from(f"<{2 * n}f", blob, _HEADER.size)
+            digest._means = list(pairs[0::2])
+            digest._weights = list(pairs[1::2])
+            digest.count = sum(digest._weights)
+            digest.min, digest.max = low, high
+        return digest
+
+
+def _interpolate(x0, v0, x1, v1, x):
+    if x1 <= x0:
+        return v1
+    return v0 + (v1 - v0) * (x - x0) / (x1 - x0)
+
+
+def summarize(digest: TDigest) -> dict:
+    def r(value):
+        return round(value, 4) if value is not None else None
+
+    summary = {"trips": len(digest)}
+    for q in QUANTILES:
+        summary[f"p{round(q * 100)}"] = r(digest.quantile(q))
+    summary["min"] = r(digest.min) if digest.count else None
+    summary["max"] = r(digest.max) if digest.count else None
+    return summary
+
+
+def sketch_keys(lane: str) -> list[tuple[str, str]]:
+    return [("shipper", ""), ("lane", lane)]
+
+
+def _fold(digests: dict, shipper_id, lane, day, rate, hours):
+    """Add one trip to {(shipper_id, scope, key, metric, day): TDigest}."""
+    for scope, key in sketch_keys(lane):
+        for metric, value in zip(METRICS, (rate, hours)):
+            if value is not None:
+                digests.setdefault((shipper_id, scope, key, metric, day), TDigest()).add(value)
+
+
+_WRITE_SQL = """
+    INSERT INTO quantile_sketch (shipper_id, scope, sketch_key, metric, day, trips, digest)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE trips = VALUES(trips), digest = VALUES(digest)
+"""
+
+
+def _write(cursor, digests: dict):
+    if digests:
+        cursor.executemany(_WRITE_SQL, [(*key, len(d), d.to_bytes()) for key, d in digests.items()])
+
+
+def _journey_values(journey: dict):
+    """(rate, hours, lane, day) a trip contributes, or all None while it isn't sketchable."""
+    rate, hours = journey["rate"], journey["hours"]
+    if journey["pickup_time"] is None or (rate is None and hours is None):
+        return None, None, None, None
+    return rate, hours, lane_key(journey), journey["pickup_time"].date()
+
+
+_CREATE_EMPTY_SQL = """
+    INSERT IGNORE INTO quantile_sketch (shipper_id, scope, sketch_key, metric, day, trips, digest)
+    VALUES (%s, %s, %s, %s, %s, 0, %s)
+"""
+
+
+def _add_trip(cursor, shipper_id, lane, day, rate, hours):
+    """Fold one new trip into its day's digests (read-modify-write under row locks)."""
+    # create the rows first: SELECT ... FOR UPDATE on rows that don't exist yet
+    # only takes gap locks, so two first trips of a day could both "insert" and
+    # one digest would overwrite the other (or the pair would deadlock)
+    empty = TDigest().to_bytes()
+    cursor.executemany(_CREATE_EMPTY_SQL, [
+        (shipper_id, scope, key, metric, day, empty)
+        for scope, key in sketch_keys(lane)
+        for metric, value in zip(METRICS, (rate, hours)) if value is not None
+    ])
+    cursor.execute("""
+        SELECT scope, sketch_key, metric, digest FROM quantile_sketch
+        WHERE shipper_id = %s AND day = %s AND ((scope = 'shipper' AND sketch_key = '') OR
+                                                (scope = 'lane' AND sketch_key = %s))
+        FOR UPDATE
+    """, (shipper_id, day, lane))
+    digests = {(shipper_id, row["scope"], row["sketch_key"], row["metric"], day): TDigest.from_bytes(row["digest"])
+               for row in cursor.fetchall()}
+    _fold(digests, shipper_id, lane, day, rate, hours)
+    _write(cursor, digests)
+
+
+def _resketch_day(cursor, shipper_id, day):
+    """Rebuild one shipper-day from the guard columns."""
+    cursor.execute("DELETE FROM quantile_sketch WHERE shipper_id = %s AND day = %s", (shipper_id, day))
+    cursor.execute("""
+        SELECT sketched_rate, sketched_hours, sketched_lane FROM shipment_journey
+        WHERE shipper_id = %s AND sketched_day = %s
+    """, (shipper_id, day))
+    digests = {}
+    for row in cursor.fetchall():
+        _fold(digests, shipper_id, row["sketched_lane"], day, row["sketched_rate"], row["sketched_hours"])
+    _write(cursor, digests)
+
+
+_SELECT_JOURNEY_SQL = """
+    SELECT manifest_id, shipper_id, evaporation_rate_kg_per_hour AS rate, transit_hours AS hours, pickup_time,
+           origin_city, origin_state, dest_city, dest_state,
+           sketched_rate, sketched_hours, sketched_lane, sketched_day
+    FROM shipment_journey
+"""
+
+_GUARD_SQL = """
+    UPDATE shipment_journey
+    SET sketched_rate = %s, sketched_hours = %s, sketched_lane = %s, sketched_day = %s, updated_at = updated_at
+    WHERE manifest_id = %s
+"""
+
+
+def apply_sketch_change(conn, manifest_id: str) -> bool:
+    """
+    Bring the sketches in line with the manifest's current shipment_journey row.
+    Call after refresh_shipment_journey(), inside the same transaction; does not
+    commit. Returns True when the sketches changed.
+    """
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute(_SELECT_JOURNEY_SQL + " WHERE manifest_id = %s FOR UPDATE", (manifest_id,))
+    journey = cursor.fetchone()
+    if journey is None:
+        cursor.close()
+        return False
+
+    shipper_id = journey["shipper_id"]
+    old = (journey["sketched_rate"], journey["sketched_hours"], journey["sketched_lane"], journey["sketched_day"])
+    new = _journey_values(journey)
+    if old == new:
+        cursor.close()
+        return False
+
+    cursor.execute(_GUARD_SQL, (*new, manifest_id))
+    if old[3] is None:
+        _add_trip(cursor, shipper_id, new[2], new[3], new[0], new[1])
+    else:
+        # re-recorded trip: a digest can't un-add, so re-sketch the day(s) it touches
+        for day in {old[3], new[3]} - {None}:
+            _resketch_day(cursor, shipper_id, day)
+    cursor.close()
+    return True
+
+
+def rebuild_sketches(conn) -> int:
+    """Recompute every sketch from shipment_journey in one pass. Returns the number of trips sketched."""
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    cursor.execute("DELETE FROM quantile_sketch")
+    cursor.execute("""
+        UPDATE shipment_journey
+        SET sketched_rate = NULL, sketched_hours = NULL, sketched_lane = NULL, sketched_day = NULL,
+            updated_at = updated_at
+    """)
+    cursor.execute(_SELECT_JOURNEY_SQL + """
+        WHERE pickup_time IS NOT NULL
+          AND (evaporation_rate_kg_per_hour IS NOT NULL OR transit_hours IS NOT NULL)
+    """)
+    digests, guards = {}, []
+    for journey in cursor.fetchall():
+        rate, hours, lane, day = _journey_values(journey)
+        guards.append((rate, hours, lane, day, journey["manifest_id"]))
+        _fold(digests, journey["shipper_id"], lane, day, rate, hours)
+    if guards:
+        cursor.executemany(_GUARD_SQL, guards)
+    _write(cursor, digests)
+    conn.commit()
+    cursor.close()
+    return len(guards)
+
+
+def init_sketches(conn):
+    """Startup hook (after init_shipment_journey): backfill the sketches the first time they are empty."""
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM quantile_sketch)")
+    (populated,) = cursor.fetchone()
+    cursor.close()
+    if not populated:
+        print("🔄 Backfilling percentile sketches...")
+        print(f"✅ Percentile sketches ready ({rebuild_sketches(conn)} trips)")
+
+
+def read_sketches(conn, shipper_id: str, scope: str = None, start: str = None, end: str = None) -> dict:
+    """
+    p50 / p95 / p99 of each metric for the shipper and each of its lanes, over
+    pickup days `start`..`end` (YYYY-MM-DD, inclusive, open-ended when omitted).
+    Shaped for /api/analytics/percentiles.
+    """
+    where = ["shipper_id = %s"]
+    params = [shipper_id]
+    if scope:
+        where.append("scope = %s")
+        params.append(scope)
+    if start:
+        where.append("day >= %s")
+        params.append(start)
+    if end:
+        where.append("day <= %s")
+        params.append(end)
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT scope, sketch_key, metric, digest FROM quantile_sketch
+        WHERE {' AND '.join(where)}
+    """, params)
+    merged = {}
+    for row in cursor.fetchall():
+        key = (row["scope"], row["sketch_key"])
+        merged.setdefault(key, {}).setdefault(row["metric"], TDigest()).merge(TDigest.from_bytes(row["digest"]))
+    cursor.close()
+
+    result = {"shipper_id": shipper_id, "start": start, "end": end, "shipper": None, "lanes": []}
+    for (row_scope, key), metrics in sorted(merged.items()):
+        summary = {metric: summarize(metrics[metric]) if metric in metrics else None for metric in METRICS}
+        if row_scope == "shipper":
+            result["shipper"] = summary
+        else:
+            result["lanes"].append({"lane": key, **summary})
+    return result
+
+
+if __name__ == "__main__":
+    from db import connection
+    from migrate import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Maintain the evaporation / transit-time percentile sketches")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every sketch from shipment_journey")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        apply_migrations(conn)
+        if args.rebuild:
+            print(f"✅ Rebuilt percentile sketches ({rebuild_sketches(conn)} trips)")
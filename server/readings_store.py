@@ -0,0 +1,370 @@
+"""
+Append-only time-series store for per-container movement readings.
+
+A reading is one row of Sample_Movement_Data.csv: a ship / interim / receive
+event with sequence_number, timestamp, location, weight, temperature and
+condition notes. In that data shipper_id identifies the dewar, so it is the
+container key here.
+
+Readings are partitioned by container and UTC day:
+
+    READINGS_PATH/<container_id>/<YYYY-MM-DD>.bin     fixed-width records (READING_DTYPE, 29 bytes each)
+    READINGS_PATH/<container_id>/<YYYY-MM-DD>.jsonl   the text fields, for the readings that have any
+
+- An append writes the raw records to the end of the day's .bin file. Nothing
+  is rewritten.
+- A range scan reads only the days it covers, with one np.fromfile per day.
+- downsample() reduces a range to per-bucket min / mean / max with reduceat,
+  for charts.
+- sequence_number is the idempotency key within a day chunk: a reading whose
+  number is already in the chunk it would go to is counted as a duplicate and
+  skipped, so re-posting a file is harmless. A late reading with a lower number
+  than the latest is still appended. Only the day chunks a batch touches are
+  read, at append time and under the container's lock file (<container_id>/.lock,
+  flock), so nothing is held in memory between appends and workers sharing
+  READINGS_PATH see each other's writes. A torn record at the end of a chunk
+  (crash mid-write) is ignored on read and trimmed on the next append.
+
+    readings, errors = parse_readings(csv.DictReader(f))
+    readings_store.append(readings)
+    readings_store.scan("shipper-ln2-20-0001", start, end)            # structured array, time-ordered
+    readings_store.downsample("shipper-ln2-20-0001", start, end, points=500)
+
+    python readings_store.py ingest Sample_Movement_Data.csv
+"""
+import argparse
+import csv
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+READINGS_PATH = os.getenv("READINGS_PATH", "./readings")
+
+EVENT_TYPES = ("ship", "interim", "receive")
+TEXT_FIELDS = ("condition_notes", "image_path", "destination_city", "destination_state",
+               "destination_company_name", "destination_company_address", "destination_company_contact")
+
+READING_DTYPE = np.dtype([
+    ("ts", "<i8"),                 # microseconds since the epoch, UTC
+    ("sequence_number", "<i4"),
+    ("event_type", "u1"),          # index into EVENT_TYPES
+    ("location_id", "<i4"),        # -1 when missing
+    ("user_id", "<i4"),            # -1 when missing
+    ("weight", "<f4"),             # kg, NaN when missing
+    ("temperature", "<f4"),        # NaN when missing
+])
+
+_CONTAINER_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+_EPOCH = datetime(1970, 1, 1)
+_DAY_US = 86_400_000_000
+
+
+def to_micros(value) -> int:
+    """ISO string ("2025-04-19 19:14:45.295857", "...Z", offsets) or datetime -> UTC microseconds."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(ts: int) -> str:
+    return (_EPOCH + timedelta(microseconds=int(ts))).isoformat()
+
+
+def parse_reading(row: dict) -> dict:
+    """Validate / normalise one reading (a CSV row or a JSON object). Raises ValueError."""
+    def number(name, cast, missing):
+        value = row.get(name)
+        if value is None or value == "":
+            return missing
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number")
+
+    container_id = str(row.get("container_id") or row.get("shipper_id") or "")
+    if not _CONTAINER_ID.match(container_id):
+        raise ValueError("container_id / shipper_id is missing or contains unsupported characters")
+    event_type = str(row.get("event_type") or "").strip().lower()
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"event_type must be one of: {', '.join(EVENT_TYPES)}")
+    sequence_number = number("sequence_number", int, None)
+    if sequence_number is None or sequence_number < 0:
+        raise ValueError("sequence_number is required")
+    if not row.get("timestamp"):
+        raise ValueError("timestamp is required")
+    try:
+        ts = to_micros(row["timestamp"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timestamp '{row['timestamp']}'")
+
+    return {
+        "container_id": container_id,
+        "ts": ts,
+        "sequence_number": sequence_number,
+        "event_type": EVENT_TYPES.index(event_type),
+        "location_id": number("location_id", int, -1),
+        "user_id": number("user_id", int, -1),
+        "weight": number("weight", float, float("nan")),
+        "temperature": number("temperature", float, float("nan")),
+        "text": {name: row[name] for name in TEXT_FIELDS if row.get(name)},
+    }
+
+
+def parse_readings(rows) -> tuple[list, dict]:
+    """(readings, {row index: error}) for an iterable of raw rows."""
+    readings, errors = [], {}
+    for index, row in enumerate(rows):
+        try:
+            readings.append(parse_reading(row))
+        except ValueError as e:
+            errors[index] = str(e)
+    return readings, errors
+
+
+def _day(ts: int) -> str:
+    return from_micros(ts - ts % _DAY_US)[:10]
+
+
+class ReadingStore:
+    def __init__(self, path: str = READINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()       # appends are serialised; reads never take it
+
+    def _dir(self, container_id: str) -> str:
+        if not _CONTAINER_ID.match(container_id):
+            raise ValueError(f"Invalid container id '{container_id}'")
+        return os.path.join(self.path, container_id)
+
+    @contextmanager
+    def _container_lock(self, container_id: str):
+        """Exclusive lock on the container's chunks, across processes sharing READINGS_PATH."""
+        os.makedirs(self._dir(container_id), exist_ok=True)
+        with open(os.path.join(self._dir(container_id), ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stored_sequences(self, container_id: str, day: str) -> set:
+        """Sequence numbers in one day chunk (complete records only)."""
+        try:
+            chunk = np.fromfile(os.path.join(self._dir(container_id), day + ".bin"), dtype=READING_DTYPE)
+        except FileNotFoundError:
+            return set()
+        return set(chunk["sequence_number"].tolist())
+
+    def append(self, readings: list[dict], on_append=None) -> dict:
+        """
+        Append parsed readings (see parse_reading). Returns counts of appended and
+        duplicate readings. on_append(container_id, readings) sees each container's
+        new readings in sequence order, once they are written.
+        """
+        by_container = {}
+        for reading in readings:
+            by_container.setdefault(reading["container_id"], []).append(reading)
+
+        appended = duplicates = 0
+        with self._lock:
+            for container_id, batch in by_container.items():
+                by_day = {}
+                for reading in sorted(batch, key=lambda r: r["sequence_number"]):
+                    by_day.setdefault(_day(reading["ts"]), []).append(reading)
+                fresh = []
+                with self._container_lock(container_id):
+                    for day, candidates in by_day.items():
+                        seen = self._stored_sequences(container_id, day)
+                        rows = []
+                        for reading in candidates:
+                            if reading["sequence_number"] in seen:
+                                duplicates += 1
+                                continue
+                            seen.add(reading["sequence_number"])
+                            rows.append(reading)
+                        if rows:
+                            self._append_chunk(container_id, day, rows)
+                            fresh.extend(rows)
+                if not fresh:
+                    continue
+                fresh.sort(key=lambda r: r["sequence_number"])
+                appended += len(fresh)
+                if on_append is not None:
+                    on_append(container_id, fresh)
+        return {"appended": appended, "duplicates": duplicates, "containers": len(by_container)}
+
+    def _append_chunk(self, container_id: str, day: str, rows: list[dict]):
+        records = np.empty(len(rows), dtype=READING_DTYPE)
+        for name in READING_DTYPE.names:
+            records[name] = [r[name] for r in rows]
+        base = os.path.join(self._dir(container_id), day)
+        texts = [{"sequence_number": r["sequence_number"], **r["text"]} for r in rows if r["text"]]
+        if texts:
+            with open(base + ".jsonl", "a") as f:
+                f.writelines(json.dumps(t) + "\n" for t in texts)
+        with open(base + ".bin", "ab") as f:
+            torn = f.tell() % READING_DTYPE.itemsize
+            if torn:
+                f.truncate(f.tell() - torn)
+                f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+
+    def containers(self) -> list[str]:
+        try:
+            return sorted(d for d in os.listdir(self.path) if _CONTAINER_ID.match(d))
+        except FileNotFoundError:
+            return []
+
+    def days(self, container_id: str) -> list[str]:
+        try:
+            return sorted(name[:-4] for name in os.listdir(self._dir(container_id)) if name.endswith(".bin"))
+        except FileNotFoundError:
+            return []
+
+    def scan(self, container_id: str, start=None, end=None) -> np.ndarray:
+        """Readings with start <= timestamp < end, in time order, as a READING_DTYPE array."""
+        start_us = to_micros(start) if start is not None else None
+        end_us = to_micros(end) if end is not None else None
+        first = _day(start_us) if start_us is not None else None
+        last = _day(end_us) if end_us is not None else None
+
+        chunks = []
+        for day in self.days(container_id):
+            if (first and day < first) or (last and day > last):
+                continue
+            chunk = np.fromfile(os.path.join(self._dir(container_id), day + ".bin"), dtype=READING_DTYPE)
+            chunks.append(chunk)
+        if not chunks:
+            return np.zeros(0, dtype=READING_DTYPE)
+        records = np.concatenate(chunks)
+        keep = np.ones(len(records), dtype=bool)
+        if start_us is not None:
+            keep &= records["ts"] >= start_us
+        if end_us is not None:
+            keep &= records["ts"] < end_us
+        records = records[keep]
+        if len(records) > 1 and (np.diff(records["ts"]) < 0).any():
+            records = records[np.argsort(records["ts"], kind="stable")]
+        return records
+
+    def _texts(self, container_id: str, days) -> dict:
+        texts = {}
+        for day in days:
+            try:
+                with open(os.path.join(self._dir(container_id), day + ".jsonl")) as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue   # torn last line
+                        texts[entry.pop("sequence_number")] = entry
+            except FileNotFoundError:
+                pass
+        return texts
+
+    def records(self, container_id: str, start=None, end=None, with_text: bool = False,
+                limit: int = None) -> list[dict]:
+        """scan() as JSON-ready dicts (the first `limit`), optionally with the text fields."""
+        records = self.scan(container_id, start, end)[:limit]
+        texts = {}
+        if with_text:
+            texts = self._texts(container_id, [_day(int(d) * _DAY_US) for d in np.unique(records["ts"] // _DAY_US)])
+        rows = []
+        for ts, seq, event, location, user, weight, temperature in records.tolist():
+            row = {
+                "container_id": container_id,
+                "sequence_number": seq,
+                "event_type": EVENT_TYPES[event],
+                "timestamp": from_micros(ts),
+                "location_id": location if location >= 0 else None,
+                "user_id": user if user >= 0 else None,
+                "weight": round(weight, 3) if weight == weight else None,
+                "temperature": round(temperature, 2) if temperature == temperature else None,
+            }
+            if with_text:
+                row.update(texts.get(seq, {}))
+            rows.append(row)
+        return rows
+
+    def downsample(self, container_id: str, start=None, end=None, points: int = 500,
+                   bucket_seconds: int = None) -> dict:
+        """
+        Per-bucket count and min / mean / max of weight and temperature, at most
+        `points` buckets over the range (or fixed `bucket_seconds` wide buckets).
+        """
+        records = self.scan(container_id, start, end)
+        result = {"container_id": container_id, "readings": len(records), "bucket_seconds": None, "buckets": []}
+        if not len(records):
+            return result
+        ts = records["ts"]
+        origin = to_micros(start) if start is not None else int(ts[0])
+        if bucket_seconds is None:
+            stop = to_micros(end) if end is not None else int(ts[-1]) + 1
+            bucket_seconds = max(1, -(-(stop - origin) // (max(1, points) * 1_000_000)))
+        width = bucket_seconds * 1_000_000
+        result["bucket_seconds"] = bucket_seconds
+
+        buckets = (ts - origin) // width
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])   # ts is sorted
+        counts = np.diff(np.r_[starts, len(ts)])
+        summary = {}
+        for name in ("weight", "temperature"):
+            values = records[name].astype(np.float64)
+            present = ~np.isnan(values)
+            n = np.add.reduceat(present.astype(np.int64), starts)
+            total = np.add.reduceat(np.where(present, values, 0.0), starts)
+            low = np.minimum.reduceat(np.where(present, values, np.inf), starts)
+            high = np.maximum.reduceat(np.where(present, values, -np.inf), starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                summary[name] = (n, total / n, low, high)
+
+        for i, first in enumerate(starts.tolist()):
+            bucket = {"start": from_micros(origin + int(buckets[first]) * width), "count": int(counts[i])}
+            for name, (n, mean, low, high) in summary.items():
+                bucket[name] = ({"min": round(float(low[i]), 3), "mean": round(float(mean[i]), 3),
+                                 "max": round(float(high[i]), 3)} if n[i] else None)
+            result["buckets"].append(bucket)
+        return result
+
+    def stats(self) -> dict:
+        containers = self.containers()
+        chunks = readings = 0
+        for container_id in containers:
+            for day in self.days(container_id):
+                chunks += 1
+                readings += os.path.getsize(os.path.join(self._dir(container_id), day + ".bin")) // READING_DTYPE.itemsize
+        return {"path": self.path, "containers": len(containers), "chunks": chunks, "readings": readings}
+
+
+readings_store = ReadingStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Movement readings store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="append readings from a CSV shaped like Sample_Movement_Data.csv")
+    ingest.add_argument("csv_path")
+    sub.add_parser("stats")
+    parser.add_argument("--path", default=READINGS_PATH)
+    args = parser.parse_args()
+
+    store = ReadingStore(args.path)
+    if args.command == "ingest":
+        with open(args.csv_path, newline="") as f:
+            readings, errors = parse_readings(csv.DictReader(f))
+        for index, error in sorted(errors.items()):
+            print(f"⚠️ Row {index + 2}: {error}")
+        result = store.append(readings)
+        print(f"✅ {result['appended']} readings appended, {result['duplicates']} duplicates skipped, "
+              f"{len(errors)} rejected")
+    else:
+        print(json.dumps(store.stats(), indent=2))
@@ -0,0 +1,105 @@
+"""
+Diff the Weaviate Shipment objects against MySQL and repair the drift.
+
+Every delivered manifest should exist exactly once, under its deterministic
+UUID. The reconciler pages every object id out of Weaviate, compares the set
+against the UUIDs expected from shipment_journey, and reports:
+
+    duplicates  objects for a known shipment under some other id (e.g. written
+                by the old random-UUID ingest) -> deleted
+    orphans     objects for shipments that no longer exist / are not delivered -> deleted
+    missing     delivered shipments with no object -> re-embedded and upserted
+
+    python reconcile_weaviate.py --dry-run     # report only
+    python reconcile_weaviate.py
+"""
+import argparse
+import time
+
+from journey_query import INGEST_FIELDS, build_journey_query
+from weaviate_writer import delete_shipments, generate_uuid_for_shipment, iter_shipment_ids
+
+# build_shipment() needs both events and both weights; anything else is not indexed
+_DELIVERED = [
+    ("pickup_time", "IS NOT NULL", None),
+    ("dropoff_time", "IS NOT NULL", None),
+    ("pickup_weight", "IS NOT NULL", None),
+    ("dropoff_weight", "IS NOT NULL", None),
+]
+
+
+def expected_objects(conn) -> dict:
+    """Deterministic UUID -> (shipper_id, manifest_id) for every shipment that should be indexed."""
+    query, params = build_journey_query(
+        {"shipper_id": "shipper_id", "manifest_id": "manifest_id"}, where=_DELIVERED, source="materialized")
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    expected = {generate_uuid_for_shipment(s, m): (s, m) for s, m in cursor.fetchall()}
+    cursor.close()
+    return expected
+
+
+def diff(expected: dict, actual) -> dict:
+    """
+    Classify Weaviate objects `actual` [(id, shipper_id, manifest_id)] against `expected`.
+    Pure function so the drift report can be checked without either service.
+    """
+    known = set(expected.values())
+    present, duplicates, orphans = set(), [], []
+    for object_id, shipper_id, manifest_id in actual:
+        if object_id in expected:
+            present.add(object_id)
+        elif (shipper_id, manifest_id) in known:
+            duplicates.append(object_id)
+        else:
+            orphans.append(object_id)
+    missing = [object_id for object_id in expected if object_id not in present]
+    return {"in_sync": len(present), "duplicates": duplicates, "orphans": orphans, "missing": missing}
+
+
+def reconcile(conn, client, dry_run: bool = False) -> dict:
+    started = time.perf_counter()
+    expected = expected_objects(conn)
+    drift = diff(expected, iter_shipment_ids(client))
+
+    report = {
+        "expected": len(expected),
+        "in_sync": drift["in_sync"],
+        "duplicates": len(drift["duplicates"]),
+        "orphans": len(drift["orphans"]),
+        "missing": len(drift["missing"]),
+    }
+    if not dry_run:
+        report["deleted"] = delete_shipments(client, drift["duplicates"] + drift["orphans"])
+        missing_ids = [expected[object_id][1] for object_id in drift["missing"]]
+        report["upserted"] = fill_missing(conn, missing_ids) if missing_ids else 0
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def fill_missing(conn, manifest_ids: list, batch_size: int = 200) -> int:
+    from weaviate_sync import upsert_shipments
+
+    written = 0
+    for i in range(0, len(manifest_ids), batch_size):
+        ids = manifest_ids[i:i + batch_size]
+        query, params = build_journey_query(INGEST_FIELDS, where=[("manifest_id", "IN", ids)], source="materialized")
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        written += upsert_shipments(rows)
+    return written
+
+
+if __name__ == "__main__":
+    from db import connection
+    from clients import clients
+
+    parser = argparse.ArgumentParser(description="Reconcile Weaviate Shipment objects with MySQL")
+    parser.add_argument("--dry-run", action="store_true", help="report drift without changing Weaviate")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        report = reconcile(conn, clients.weaviate, dry_run=args.dry_run)
+    print(("🔍 Drift (dry run): " if args.dry_run else "✅ Reconciled: ") + str(report))
@@ -0,0 +1,113 @@
+"""
+Parallel retrieval for /api/ask-ai.
+
+Each source is a blocking callable returning a ranked list of shipment dicts:
+the Weaviate filter query, the Weaviate vector query (embedding included) and
+an optional SQL fact lookup against the journey rows. fan_out() runs them at
+the same time in worker threads, each under its own timeout. A source that
+times out or raises is dropped and the others still answer.
+
+The lists are merged with reciprocal-rank fusion keyed on manifest_id:
+
+    score(shipment) = sum over sources of 1 / (RRF_K + rank)
+
+so a shipment that both the filter and the vector query rank highly comes
+first. Per-source latency is recorded as retrieval.<source> (see /api/metrics).
+
+    RETRIEVAL_FILTER_TIMEOUT=3  RETRIEVAL_VECTOR_TIMEOUT=5  RETRIEVAL_SQL_TIMEOUT=2
+    RETRIEVAL_SQL=true  RETRIEVAL_SQL_LIMIT=50  RRF_K=60
+"""
+import asyncio
+import decimal
+import os
+import time
+
+from journey_query import RETRIEVAL_FIELDS, build_journey_query
+
+RRF_K = int(os.getenv("RRF_K", 60))
+RETRIEVAL_TIMEOUTS = {
+    "filter": float(os.getenv("RETRIEVAL_FILTER_TIMEOUT", 3)),
+    "vector": float(os.getenv("RETRIEVAL_VECTOR_TIMEOUT", 5)),
+    "sql": float(os.getenv("RETRIEVAL_SQL_TIMEOUT", 2)),
+}
+RETRIEVAL_SQL = os.getenv("RETRIEVAL_SQL", "true").lower() in ("1", "true", "yes")
+RETRIEVAL_SQL_LIMIT = int(os.getenv("RETRIEVAL_SQL_LIMIT", 50))
+
+
+async def _run_source(name: str, fn, timeout: float, record=None):
+    started = time.perf_counter()
+    try:
+        # the worker thread can't be cancelled; on timeout its result is simply ignored
+        results = await asyncio.wait_for(asyncio.to_thread(fn), timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        print(f"⏳ Retrieval source '{name}' timed out after {timeout}s")
+        results, status = None, "timeout"
+    except Exception as e:
+        print(f"⚠️ Retrieval source '{name}' failed: {e}")
+        results, status = None, "error"
+    elapsed = time.perf_counter() - started
+    if record is not None:
+        record(f"retrieval.{name}", elapsed)
+    return name, results, {"status": status, "seconds": round(elapsed, 4), "results": len(results or [])}
+
+
+async def fan_out(sources: dict, timeouts: dict = None, record=None) -> tuple[dict, dict]:
+    """
+    Run every source (name -> zero-argument callable) concurrently.
+    Returns ({name: results} for the sources that answered in time,
+             {name: {"status", "seconds", "results"}} for all of them).
+    """
+    timeouts = {**RETRIEVAL_TIMEOUTS, **(timeouts or {})}
+    done = await asyncio.gather(*(
+        _run_source(name, fn, timeouts.get(name, max(RETRIEVAL_TIMEOUTS.values())), record)
+        for name, fn in sources.items()
+    ))
+    ranked = {name: results for name, results, _ in done if results is not None}
+    timings = {name: info for name, _, info in done}
+    return ranked, timings
+
+
+def reciprocal_rank_fusion(ranked: dict, key: str = "manifest_id", k: int = RRF_K) -> list[dict]:
+    """
+    Fuse ranked lists into one, best first. Each shipment is kept once, as the
+    dict from the first source (in `ranked` order) that returned it; ties keep
+    that first-seen order.
+    """
+    scores = {}
+    docs = {}
+    for results in ranked.values():
+        seen = set()
+        for rank, doc in enumerate(results, start=1):
+            doc_key = doc.get(key)
+            if doc_key is None or doc_key in seen:
+                continue
+            seen.add(doc_key)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc_key, doc)
+    return [docs[doc_key] for doc_key in sorted(scores, key=lambda d: -scores[d])]
+
+
+def _weaviate_value(value):
+    # match what ingestion stores in Weaviate, so the analyzer can't tell the sources apart
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def fetch_fact_rows(conn, shipper_id: str, cutoff_date=None, direction: str = None,
+                    limit: int = RETRIEVAL_SQL_LIMIT, source: str = "live") -> list[dict]:
+    """The shipper's most recent delivered journeys, shaped like Weaviate Shipment objects."""
+    where = [("shipper_id", "=", shipper_id), ("pickup_time", "IS NOT NULL", None),
+             ("dropoff_time", "IS NOT NULL", None)]
+    if cutoff_date is not None and direction in ("before", "after"):
+        where.append(("pickup_time", "<" if direction == "before" else ">", cutoff_date))
+    query, params = build_journey_query(RETRIEVAL_FIELDS, where=where, order_by=[("pickup_time", "DESC")],
+                                        limit=limit, source=source)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return [{name: _weaviate_value(value) for name, value in row.items()} for row in rows]
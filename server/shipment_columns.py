@@ -0,0 +1,180 @@
+"""
+Columnar shipment analysis behind CryoTraceAI.analyze_shipments.
+
+A batch of shipments (Weaviate objects or journey rows) is turned into one
+NumPy array per field. Timestamp parsing, cutoff filtering, transit time and
+evaporation rate are then whole-array operations instead of a strptime per
+row:
+
+    batch = ShipmentColumns.from_rows(rows)
+    result = analyze(batch, cutoff=datetime(2025, 5, 1), direction="after")
+    result.transit_hours          # float64 hours, NaN when not delivered
+    result.to_records()           # the dicts analyze_shipments has always returned
+
+Transit time is the full pickup -> dropoff duration. The old per-row code
+used timedelta.seconds, which dropped whole days. Timestamps are whatever the
+source stored: Weaviate's "2025-05-01T10:00:00Z" strings or naive datetimes
+from MySQL, both treated as UTC. Anything carrying an offset
+("2025-05-01T05:00:00-05:00", aware datetimes) is converted to UTC first.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils import format_hours_minutes
+
+_NAT = np.datetime64("NaT", "s")
+_ONE_HOUR = np.timedelta64(3600, "s")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _utc_text(value: str) -> str:
+    """ISO string with a numeric offset rewritten as its UTC wall time; others unchanged."""
+    tail = value[19:]
+    if "+" not in tail and "-" not in tail:
+        return value
+    try:
+        return _naive_utc(datetime.fromisoformat(value)).isoformat()
+    except ValueError:
+        return value
+
+
+def to_datetime64(values) -> np.ndarray:
+    """datetime64[s] array from ISO strings / datetimes / None (-> NaT), in one conversion when possible."""
+    values = list(values)
+    if not values:
+        return np.zeros(0, dtype="datetime64[s]")
+    if isinstance(values[0], str) or values[0] is None:
+        # U19 keeps "YYYY-MM-DDTHH:MM:SS" and drops any "Z" / fraction; offsets
+        # are applied first, so every value ends up as UTC
+        text = np.array(["" if v is None else _utc_text(v) if isinstance(v, str) else v for v in values],
+                        dtype="U19")
+        try:
+            return text.astype("datetime64[s]")
+        except ValueError:
+            return np.array([_one_datetime64(v) for v in text], dtype="datetime64[s]")
+    try:
+        return np.array([_naive_utc(v) if isinstance(v, datetime) else v for v in values],
+                        dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        return np.array([_one_datetime64(v) for v in values], dtype="datetime64[s]")
+
+
+def _one_datetime64(value):
+    try:
+        if isinstance(value, datetime):
+            return np.datetime64(_naive_utc(value), "s")
+        return np.datetime64(str(value)[:19], "s") if value else _NAT
+    except ValueError:
+        return _NAT   # unparseable timestamps are skipped, as before
+
+
+def to_float64(values) -> np.ndarray:
+    return np.array([np.nan if v is None or v == "" else v for v in values], dtype=np.float64)
+
+
+@dataclass
+class ShipmentColumns:
+    manifest_id: np.ndarray
+    shipper_id: np.ndarray
+    pickup_time: np.ndarray          # datetime64[s]
+    dropoff_time: np.ndarray         # datetime64[s]
+    pickup_weight: np.ndarray        # float64 kg
+    dropoff_weight: np.ndarray       # float64 kg
+    evaporation_rate: np.ndarray     # float64 kg/h as stored, NaN when the source has none
+    rows: list = None                # the source rows, for to_records()
+
+    def __len__(self):
+        return len(self.manifest_id)
+
+    @classmethod
+    def from_rows(cls, rows: list[dict]) -> "ShipmentColumns":
+        """Weaviate Shipment objects or journey_query rows (RETRIEVAL_FIELDS names)."""
+        def column(name):
+            return [r.get(name) for r in rows]
+
+        return cls(
+            manifest_id=np.array(column("manifest_id"), dtype=object),
+            shipper_id=np.array(column("shipper_id"), dtype=object),
+            pickup_time=to_datetime64(column("pickup_time")),
+            dropoff_time=to_datetime64(column("dropoff_time")),
+            pickup_weight=to_float64(column("pickup_weight")),
+            dropoff_weight=to_float64(column("dropoff_weight")),
+            evaporation_rate=to_float64(column("evaporation_rate")),
+            rows=rows,
+        )
+
+
+@dataclass
+class AnalyzedShipments:
+    index: np.ndarray                # positions in the input batch that passed the filters
+    pickup_time: np.ndarray
+    dropoff_time: np.ndarray
+    transit_hours: np.ndarray
+    evaporation_rate: np.ndarray
+    source: ShipmentColumns
+
+    def __len__(self):
+        return len(self.index)
+
+    def stats(self) -> dict:
+        def describe(values):
+            values = values[~np.isnan(values)]
+            if not len(values):
+                return None
+            return {"min": round(float(values.min()), 4), "mean": round(float(values.mean()), 4),
+                    "max": round(float(values.max()), 4)}
+
+        return {
+            "count": len(self),
+            "transit_hours": describe(self.transit_hours),
+            "evaporation_rate_kg_per_hour": describe(self.evaporation_rate),
+        }
+
+    def to_records(self) -> list[dict]:
+        """The per-shipment dicts the prompt builders consume."""
+        rows = self.source.rows
+        records = []
+        for position, hours, evap in zip(self.index.tolist(), self.transit_hours.tolist(), self.evaporation_rate.tolist()):
+            s = rows[position]
+            records.append({
+                "shipment_id": s.get("manifest_id"),
+                "shipper_id": s.get("shipper_id"),
+                "pickup_time": s.get("pickup_time"),
+                "pickup_contact": s.get("origin_contact"),
+                "delivery_time": s.get("dropoff_time"),
+                "receiver": s.get("destination_contact"),
+                "transit_time_hours": None if hours != hours else format_hours_minutes(hours * 3600),
+                "evaporation_rate_kg_per_hour": s.get("evaporation_rate") if evap != evap else evap,
+            })
+        return records
+
+
+def analyze(batch: ShipmentColumns, cutoff=None, direction: str = "all") -> AnalyzedShipments:
+    """
+    Keep shipments with a pickup time on the requested side of `cutoff`
+    (inclusive, like the row-by-row version), then compute transit hours and
+    evaporation rate for all of them at once. The stored evaporation_rate wins;
+    it is derived from the weights only where the source has none.
+    """
+    keep = ~np.isnat(batch.pickup_time)
+    if cutoff is not None and direction in ("before", "after"):
+        cutoff64 = np.datetime64(cutoff.replace(tzinfo=None) if isinstance(cutoff, datetime) else cutoff, "s")
+        keep &= batch.pickup_time <= cutoff64 if direction == "before" else batch.pickup_time >= cutoff64
+    index = np.flatnonzero(keep)
+
+    pickup = batch.pickup_time[index]
+    dropoff = batch.dropoff_time[index]
+    transit_hours = (dropoff - pickup) / _ONE_HOUR    # NaT -> NaN
+
+    evaporation = batch.evaporation_rate[index].copy()
+    missing = np.isnan(evaporation) & (transit_hours > 0)
+    lost = batch.pickup_weight[index] - batch.dropoff_weight[index]
+    evaporation[missing] = lost[missing] / transit_hours[missing]
+
+    return AnalyzedShipments(index=index, pickup_time=pickup, dropoff_time=dropoff,
+                             transit_hours=transit_hours, evaporation_rate=evaporation, source=batch)
@@ -0,0 +1,169 @@
+"""
+Denormalized shipment_journey table: one row per manifest with its pickup /
+dropoff times, weights, locations and precomputed transit hours and
+evaporation rate.
+
+The table itself is created by migrations/0001_shipment_journey.sql. The
+event endpoints call refresh_shipment_journey() inside their own
+transaction, so the row is always consistent with the events that produced
+it. Reads (/api/records, /api/shippers/{id}/routes) then hit a single table
+instead of recomputing the five-way join.
+
+    python shipment_journey.py --rebuild     # backfill / repair every row
+"""
+import argparse
+
+_COLUMNS = [
+    "manifest_id", "shipper_id",
+    "origin_location_id", "destination_location_id",
+    "planned_origin_city", "planned_origin_state", "planned_dest_city", "planned_dest_state",
+    "origin_contact_name", "destination_contact_name",
+    "scheduled_ship_time", "expected_receive_time", "created_at", "created_by_user_id",
+    "projected_weight_kg", "notes",
+    "pickup_time", "pickup_user_id", "pickup_weight", "pickup_location_id",
+    "dropoff_time", "dropoff_user_id", "dropoff_contact_name", "dropoff_weight", "dropoff_location_id",
+    "origin_company_name", "origin_company_address", "origin_city", "origin_state",
+    "dest_company_name", "dest_company_address", "dest_city", "dest_state",
+    "transit_hours", "evaporation_rate_kg_per_hour",
+]
+
+# Latest event of each kind per manifest. ROW_NUMBER() keeps exactly one row per
+# manifest, so several weight events for a manifest can no longer fan the row out.
+_REFRESH_SQL = """
+INSERT INTO shipment_journey ({columns})
+SELECT
+    m.manifest_id,
+    m.shipper_id,
+    m.origin_location_id,
+    m.destination_location_id,
+    mo.city, mo.state, md.city, md.state,
+    m.origin_contact_name,
+    m.destination_contact_name,
+    m.scheduled_ship_time,
+    m.expected_receive_time,
+    m.created_at,
+    m.created_by_user_id,
+    m.projected_weight_kg,
+    m.notes,
+
+    pe.actual_departure_at,
+    pe.driver_user_id,
+    pe.measured_weight_kg,
+    cw_pickup.location_id,
+
+    de.actual_receive_time,
+    de.received_by_user_id,
+    de.received_contact_name,
+    de.received_weight_kg,
+    cw_dropoff.location_id,
+
+    lp.company_name, lp.company_address, lp.city, lp.state,
+    ld.company_name, ld.company_address, ld.city, ld.state,
+
+    CASE
+        WHEN TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) > 0
+        THEN TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600
+        ELSE NULL
+    END,
+    CASE
+        WHEN pe.measured_weight_kg IS NOT NULL
+        AND de.received_weight_kg IS NOT NULL
+        AND TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) > 0
+        THEN
+        (pe.measured_weight_kg - de.received_weight_kg) /
+        (TIMESTAMPDIFF(SECOND, pe.actual_departure_at, de.actual_receive_time) / 3600)
+        ELSE NULL
+    END
+FROM shipping_manifest m
+LEFT JOIN (
+    SELECT p.*, ROW_NUMBER() OVER (PARTITION BY p.manifest_id ORDER BY p.actual_departure_at DESC) AS rn
+    FROM pickup_event p {event_filter}
+) pe ON pe.manifest_id = m.manifest_id AND pe.rn = 1
+LEFT JOIN (
+    SELECT d.*, ROW_NUMBER() OVER (PARTITION BY d.manifest_id ORDER BY d.actual_receive_time DESC) AS rn
+    FROM dropoff_event d {event_filter}
+) de ON de.manifest_id = m.manifest_id AND de.rn = 1
+LEFT JOIN (
+    SELECT c.manifest_id, c.location_id,
+           ROW_NUMBER() OVER (PARTITION BY c.manifest_id ORDER BY c.event_time DESC) AS rn
+    FROM container_weight_event c WHERE c.weight_type = 'pickup' {weight_filter}
+) cw_pickup ON cw_pickup.manifest_id = m.manifest_id AND cw_pickup.rn = 1
+LEFT JOIN (
+    SELECT c.manifest_id, c.location_id,
+           ROW_NUMBER() OVER (PARTITION BY c.manifest_id ORDER BY c.event_time DESC) AS rn
+    FROM container_weight_event c WHERE c.weight_type = 'dropoff' {weight_filter}
+) cw_dropoff ON cw_dropoff.manifest_id = m.manifest_id AND cw_dropoff.rn = 1
+LEFT JOIN locations mo ON m.origin_location_id = mo.id
+LEFT JOIN locations md ON m.destination_location_id = md.id
+LEFT JOIN locations lp ON cw_pickup.location_id = lp.id
+LEFT JOIN locations ld ON cw_dropoff.location_id = ld.id
+{manifest_filter}
+ON DUPLICATE KEY UPDATE {updates}
+"""
+
+
+def build_refresh_sql(count: int | None) -> str:
+    if count is None:
+        event_filter = weight_filter = manifest_filter = ""
+    else:
+        placeholders = ", ".join(["%s"] * count)
+        event_filter = f"WHERE manifest_id IN ({placeholders})"
+        weight_filter = f"AND c.manifest_id IN ({placeholders})"
+        manifest_filter = f"WHERE m.manifest_id IN ({placeholders})"
+    return _REFRESH_SQL.format(
+        columns=", ".join(_COLUMNS),
+        event_filter=event_filter,
+        weight_filter=weight_filter,
+        manifest_filter=manifest_filter,
+        updates=", ".join(f"{c} = VALUES({c})" for c in _COLUMNS if c != "manifest_id"),
+    )
+
+
+def refresh_shipment_journey(cursor, manifest_ids):
+    """
+    Recompute the shipment_journey rows for `manifest_ids` from the base tables.
+    Does not commit: call it inside the transaction that wrote the events.
+    """
+    if isinstance(manifest_ids, str):
+        manifest_ids = [manifest_ids]
+    manifest_ids = list(dict.fromkeys(manifest_ids))
+    if not manifest_ids:
+        return
+    # the id list appears in all four derived tables plus the outer WHERE
+    cursor.execute(build_refresh_sql(len(manifest_ids)), manifest_ids * 5)
+
+
+def rebuild_shipment_journey(conn):
+    """Full backfill: upsert a row for every manifest."""
+    cursor = conn.cursor()
+    cursor.execute(build_refresh_sql(None))
+    conn.commit()
+    count = cursor.rowcount
+    cursor.close()
+    return count
+
+
+def init_shipment_journey(conn):
+    """Startup hook (after migrations): backfill the table the first time it is empty."""
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM shipment_journey)")
+    (populated,) = cursor.fetchone()
+    cursor.close()
+    if not populated:
+        print("🔄 Backfilling shipment_journey...")
+        rebuild_shipment_journey(conn)
+    print("✅ shipment_journey ready")
+
+
+if __name__ == "__main__":
+    from db import connection
+    from migrate import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Maintain the shipment_journey table")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every row from the event tables")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        apply_migrations(conn)
+        if args.rebuild:
+            print(f"✅ Rebuilt shipment_journey ({rebuild_shipment_journey(conn)} rows affected)")
@@ -0,0 +1,78 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("dateutil")
+
+from analytics_engine import parse_metric_intent, run_intent
+
+
+def _row(manifest_id, pickup, hours, evap, dest):
+    return {
+        "manifest_id": manifest_id, "pickup_time": pickup, "dropoff_time": pickup if hours else None,
+        "transit_hours": hours, "evaporation_rate_kg_per_hour": evap,
+        "pickup_weight": 30.0, "dropoff_weight": 30.0 - evap * hours if hours else None,
+        "pickup_user_id": 1, "origin_contact_name": "A", "dropoff_contact_name": "B",
+        "origin_city": "Denver", "origin_state": "CO", "dest_city": dest, "dest_state": "MA",
+    }
+
+
+ROWS = [
+    _row("MAN-000001", datetime(2025, 4, 2), 10.0, 0.10, "Boston"),
+    _row("MAN-000002", datetime(2025, 4, 20), 30.0, 0.20, "Boston"),
+    _row("MAN-000003", datetime(2025, 5, 3), 20.0, 0.30, "Austin"),
+    _row("MAN-000004", datetime(2025, 5, 9), None, None, "Austin"),   # not delivered yet
+]
+
+
+def test_parse_intents():
+    intent = parse_metric_intent("What was the average evaporation rate after 2025-05-01?",
+                                 datetime(2025, 5, 1), "after")
+    assert (intent.metric, intent.aggregate, intent.start) == ("evaporation_rate", "mean", datetime(2025, 5, 1))
+
+    intent = parse_metric_intent("top 3 longest trips")
+    assert (intent.metric, intent.aggregate, intent.top_k) == ("transit_hours", "max", 3)
+
+    intent = parse_metric_intent("evaporation rate by destination")
+    assert (intent.aggregate, intent.group_by) == ("mean", "destination")
+
+    assert parse_metric_intent("how many shipments per month").group_by == "month"
+    assert parse_metric_intent("how many minutes did it take") is None
+    assert parse_metric_intent("who received MAN-000012") is None
+
+
+@pytest.mark.parametrize("question", [
+    "Which trips took at least 20 hours?",
+    "Which driver made the most trips",
+    "Which trip had the most issues?",
+    "What was the evaporation rate on the longest trip?",
+    "What was the overall evaporation rate on MAN-000012?",
+    "Show me the trip to Boston",
+])
+def test_questions_without_a_metric_and_aggregate_go_to_retrieval(question):
+    assert parse_metric_intent(question) is None
+
+
+def test_run_intent_aggregates_and_ranks():
+    mean = run_intent(parse_metric_intent("average evaporation rate"), ROWS)
+    assert mean["value"] == pytest.approx(0.2)
+    assert mean["count"] == 3
+
+    longest = run_intent(parse_metric_intent("longest trip"), ROWS)
+    assert longest["value"] == 30.0
+    assert [s["shipment_id"] for s in longest["shipments"]] == ["MAN-000002"]
+
+    by_dest = run_intent(parse_metric_intent("evaporation rate by destination"), ROWS)
+    assert {g["group"]: g["value"] for g in by_dest["groups"]} == {"Austin": 0.3, "Boston": 0.15}
+
+    per_month = run_intent(parse_metric_intent("how many shipments per month"), ROWS)
+    assert [(g["group"], g["value"]) for g in per_month["groups"]] == [("2025-04", 2), ("2025-05", 1)]
+
+    # undelivered shipments aren't "completed" and aren't counted
+    total = run_intent(parse_metric_intent("how many shipments"), ROWS)
+    assert total["value"] == 3 and total["answer"] == "3 completed shipments."
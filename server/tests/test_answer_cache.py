@@ -0,0 +1,71 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from answer_cache import AnswerCache, normalize_question
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+CUTOFF = datetime(2025, 5, 1)
+
+
+def test_exact_and_normalized_hits():
+    cache = AnswerCache()
+    cache.put("s1", "Longest trip after 2025-05-01?", CUTOFF, "after", "v1", "answer")
+    assert normalize_question("  LONGEST trip after 2025-05-01 ") == "longest trip after 2025-05-01"
+    assert cache.get("s1", "longest trip after 2025-05-01", CUTOFF, "after", "v1") == "answer"
+    # other shipper, direction or data version never match
+    assert cache.get("s2", "longest trip after 2025-05-01", CUTOFF, "after", "v1") is None
+    assert cache.get("s1", "longest trip after 2025-05-01", CUTOFF, "before", "v1") is None
+    assert cache.get("s1", "longest trip after 2025-05-01", CUTOFF, "after", "v2") is None
+
+
+def test_near_duplicate_match_uses_embeddings():
+    cache = AnswerCache(similarity=0.95)
+    cache.put("s1", "what was the longest trip", None, "all", "v1", "answer", embedding=[1.0, 0.0])
+    assert cache.get("s1", "which trip took longest", None, "all", "v1", embed=lambda q: [0.99, 0.05]) == "answer"
+    assert cache.get("s1", "average evaporation rate", None, "all", "v1", embed=lambda q: [0.0, 1.0]) is None
+    stats = cache.stats()
+    assert stats["near_duplicate_hits"] == 1 and stats["misses"] == 1
+
+    # embedding unavailable: exact matches still hit, near-duplicates are a miss
+    assert cache.get("s1", "what was the longest trip", None, "all", "v1", embed=lambda q: None) == "answer"
+    assert cache.get("s1", "which trip took longest", None, "all", "v1", embed=lambda q: None) is None
+
+
+def test_opposite_superlatives_never_share_an_answer():
+    cache = AnswerCache(similarity=0.95)
+    longest = ("transit_hours", "max", None, None)
+    cache.put("s1", "what was the longest trip", None, "all", "v1", "30 h", embedding=[1.0, 0.0], intent=longest)
+    close = lambda q: [0.99, 0.05]   # the embeddings are near-identical
+    assert cache.get("s1", "what was the shortest trip", None, "all", "v1",
+                     ("transit_hours", "min", None, None), embed=close) is None
+    assert cache.get("s1", "which trip took longest", None, "all", "v1", longest, embed=close) == "30 h"
+
+    # a newer data version drops old answers for every intent, not just this one
+    cache.put("s1", "max evaporation", None, "all", "v1", "0.3", embedding=[0.0, 1.0],
+              intent=("evaporation_rate", "max", None, None))
+    cache.put("s1", "what was the longest trip", None, "all", "v2", "31 h", embedding=[1.0, 0.0], intent=longest)
+    assert cache.stats()["entries"] == 1
+
+
+def test_ttl_and_invalidation():
+    clock = _Clock()
+    cache = AnswerCache(ttl=60, clock=clock)
+    cache.put("s1", "q", None, "all", "v1", "answer")
+    clock.now = 61
+    assert cache.get("s1", "q", None, "all", "v1") is None
+
+    cache.put("s1", "q", None, "all", "v1", "answer")
+    cache.invalidate_shipper("s1")
+    assert cache.get("s1", "q", None, "all", "v1") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,166 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from boiloff_detector import Baseline, BoiloffDetector, read_alerts, save_alerts, warm_baselines
+
+T0 = datetime(2025, 5, 1)
+
+
+def steady_trips(detector, container, n, rate=0.04, noise=0.003, seed=1):
+    rng = random.Random(seed)
+    alerts = []
+    for i in range(n):
+        alerts += detector.observe_rate(container, T0 + timedelta(days=i), rate + rng.gauss(0, noise))
+    return alerts
+
+
+def test_spike_is_flagged_and_does_not_become_the_baseline():
+    detector = BoiloffDetector()
+    assert steady_trips(detector, "c1", 40) == []
+    baseline = detector.baseline("c1")["mean_kg_per_hour"]
+
+    alerts = detector.observe_rate("c1", T0 + timedelta(days=41), 0.4, source="M-123")
+    assert [(a["kind"], a["source"], a["container_id"]) for a in alerts] == [("spike", "M-123", "c1")]
+    assert detector.baseline("c1")["mean_kg_per_hour"] < baseline + 0.01
+    assert steady_trips(detector, "c1", 5, seed=2) == []
+
+    assert detector.stats() == {"containers": 1, "alerts_raised": 1}
+
+
+def test_sustained_small_rise_is_caught_by_cusum():
+    detector = BoiloffDetector()
+    steady_trips(detector, "c1", 40)
+    alerts = []
+    for i in range(10):
+        alerts += detector.observe_rate("c1", T0 + timedelta(days=50 + i), 0.052)
+    # 2.4 SDs up: never a spike, but flagged within a few trips
+    assert alerts and {a["kind"] for a in alerts} == {"drift"}
+    assert alerts[0]["z"] < detector.spike_z
+
+
+def test_interim_readings_measure_segments_within_a_trip():
+    detector = BoiloffDetector()
+    weight = 30.0
+    for trip in range(8):
+        start = T0 + timedelta(days=3 * trip)
+        assert detector.observe("c1", start, 30.0, "ship") == []
+        weight = 30.0
+        for hour in (2, 2.2, 4, 6):   # 2.2 is too close to 2: rolled into the next segment
+            weight = 30.0 - 0.04 * hour
+            assert detector.observe("c1", start + timedelta(hours=hour), weight, "interim") == []
+        assert detector.observe("c1", start + timedelta(hours=30), 30.0 - 0.04 * 30, "receive") == []
+    assert detector.baseline("c1")["observations"] == 8 * 4
+    assert abs(detector.baseline("c1")["mean_kg_per_hour"] - 0.04) < 1e-6
+    assert detector.baseline("c1")["in_trip"] is False
+
+    # lid left open: 1.5 kg in an hour
+    start = T0 + timedelta(days=30)
+    detector.observe("c1", start, 30.0, "ship")
+    alerts = detector.observe("c1", start + timedelta(hours=1), 28.5, "interim", source="reading 7")
+    assert [(a["kind"], a["rate_kg_per_hour"]) for a in alerts] == [("ceiling", 1.5)]
+
+    # no baseline yet: only the ceiling applies; a receive with no trip start is ignored
+    fresh = BoiloffDetector()
+    assert fresh.observe("c2", T0, 29.0, "receive") == []
+    fresh.observe("c2", T0, 30.0, "interim")
+    assert fresh.observe("c2", T0 + timedelta(hours=2), 29.2, "interim") == []
+    assert not hasattr(Baseline(), "__dict__")
+
+
+class FakeAlertTable:
+    """boiloff_alert for save_alerts / read_alerts, plus the shipment_journey rows warm_baselines reads."""
+
+    def __init__(self, journeys=()):
+        self.rows = []
+        self.journeys = list(journeys)
+        self.commits = 0
+        self._result = []
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT INTO boiloff_alert"):
+            self.lastrowid = len(self.rows) + 1
+            self.rows.append(dict(zip(("container_id", "kind", "rate_kg_per_hour", "baseline_kg_per_hour", "z",
+                                       "cusum", "event_type", "source", "at", "detected_at"), params),
+                                  id=self.lastrowid))
+        elif sql.startswith("SELECT MAX(id)"):
+            self._result = [{"last_id": len(self.rows) or None}]
+        elif "FROM boiloff_alert" in sql:
+            params = list(params)
+            since = params.pop(0) if "id > %s" in sql else None
+            container = params.pop(0) if "container_id = %s" in sql else None
+            rows = [dict(r) for r in self.rows
+                    if (since is None or r["id"] > since) and (container is None or r["container_id"] == container)]
+            if "DESC" in sql:
+                rows.reverse()
+            self._result = rows[:params[0]]
+        elif "FROM shipment_journey" in sql:
+            self._result = self.journeys
+        else:
+            raise AssertionError(sql)
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+def test_alerts_are_stored_and_paged_from_the_table():
+    detector = BoiloffDetector()
+    table = FakeAlertTable()
+    assert save_alerts(table, []) == [] and table.commits == 0
+    for day, (container, rate) in enumerate([("c1", 1.5), ("c2", 2.0), ("c1", 1.2)]):
+        saved = save_alerts(table, detector.observe_rate(container, T0 + timedelta(days=day), rate, source=f"M-{day}"))
+        assert [a["id"] for a in saved] == [day + 1]
+
+    # a restarted process (new detector) still serves the feed
+    feed = read_alerts(table, limit=2)
+    assert [a["id"] for a in feed["alerts"]] == [2, 3] and feed["last_id"] == 3
+    assert feed["alerts"][0]["at"] == (T0 + timedelta(days=1)).isoformat()
+    assert [a["id"] for a in read_alerts(table, since_id=1)["alerts"]] == [2, 3]
+    assert [a["source"] for a in read_alerts(table, container_id="c1")["alerts"]] == ["M-0", "M-2"]
+    assert read_alerts(table, since_id=3)["alerts"] == []
+    assert read_alerts(FakeAlertTable())["last_id"] == 0
+
+
+def test_baselines_are_warmed_from_trips_and_readings(tmp_path):
+    pytest.importorskip("numpy")
+    from readings_store import ReadingStore, parse_reading
+
+    store = ReadingStore(str(tmp_path))
+    readings = []
+    for trip in range(6):
+        start = T0 + timedelta(days=trip)
+        for seq, hour in enumerate((0, 2, 4)):
+            readings.append(parse_reading({"container_id": "c1", "sequence_number": 3 * trip + seq,
+                                           "event_type": "ship" if hour == 0 else "interim",
+                                           "timestamp": (start + timedelta(hours=hour)).isoformat(),
+                                           "weight": 30.0 - 0.05 * hour}))
+    store.append(readings)
+    table = FakeAlertTable(journeys=[("c2", T0 + timedelta(days=d), 0.04) for d in range(3)])
+
+    detector = BoiloffDetector()
+    assert warm_baselines(table, store, detector) == 18 + 3
+    assert detector.baseline("c1")["observations"] == 12
+    assert abs(detector.baseline("c1")["mean_kg_per_hour"] - 0.05) < 1e-6
+    assert detector.baseline("c2")["observations"] == 3
+    assert detector.stats()["alerts_raised"] == 0 and table.rows == []
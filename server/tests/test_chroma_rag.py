@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+for module in ("dotenv", "mysql.connector", "httpx", "openai", "weaviate"):
+    pytest.importorskip(module)
+
+import chroma_rag  # noqa: E402
+from chroma_rag import ChromaIndex  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.docs.update(zip(ids, documents))
+
+    def count(self):
+        return len(self.docs)
+
+
+class FakeChroma:
+    def __init__(self):
+        self.collections = {}
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+
+class FakeConnection:
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return (len(FEED),)
+
+    def close(self):
+        pass
+
+
+FEED = []   # (manifest_id, updated_at) in change-feed order
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    FEED[:] = [("MAN-000001", datetime(2025, 5, 1, 9)), ("MAN-000002", datetime(2025, 5, 1, 10))]
+    names = iter(f"2025050112000{n}" for n in range(10))
+
+    @contextmanager
+    def connection():
+        yield FakeConnection()
+
+    def changed_manifests(conn, high_water, last_id, limit):
+        return [(m, t) for m, t in FEED if high_water is None or (t, m) > (high_water, last_id)][:limit]
+
+    monkeypatch.setattr(chroma_rag, "connection", connection)
+    monkeypatch.setattr(chroma_rag, "changed_manifests", changed_manifests)
+    monkeypatch.setattr(chroma_rag, "journey_rows", lambda conn, ids: [{"manifest_id": m} for m in ids])
+    monkeypatch.setattr(chroma_rag, "build_shipment", lambda row: (f"summary {row['manifest_id']}", row))
+    monkeypatch.setattr(chroma_rag, "get_embeddings", lambda texts: [[1.0, 0.0] for _ in texts])
+    monkeypatch.setattr(chroma_rag.time, "strftime", lambda fmt: next(names))
+
+    chroma = ChromaIndex(path=str(tmp_path), base_name="shipments")
+    chroma._client = FakeChroma()
+    return chroma
+
+
+def _pointer(chroma):
+    with open(chroma._pointer_path) as f:
+        return json.load(f)
+
+
+def test_build_refresh_and_pointer_swap(index):
+    index.start(background=False)
+    first = index.stats()
+    assert (first["state"], first["collection"], first["documents"]) == ("ready", "shipments_20250501120000", 2)
+    assert _pointer(index) == {"collection": "shipments_20250501120000",
+                               "high_water": "2025-05-01T10:00:00", "last_manifest_id": "MAN-000002"}
+
+    # a new change is picked up by refresh and the mark moves with it
+    FEED.append(("MAN-000003", datetime(2025, 5, 1, 11)))
+    assert index.refresh() == 1
+    assert index.stats()["documents"] == 3 and _pointer(index)["last_manifest_id"] == "MAN-000003"
+    assert index.refresh() == 0
+
+    # reindex builds alongside, swaps the pointer and drops the old collection
+    assert index.reindex()["status"] == "ok"
+    assert _pointer(index)["collection"] == "shipments_20250501120001"
+    assert list(index.client.collections) == ["shipments_20250501120001"]
+
+    # a restart opens the collection the pointer names
+    reopened = ChromaIndex(path=index.path, base_name="shipments")
+    reopened._client = index.client
+    reopened.start(background=False)
+    assert reopened.stats()["collection"] == "shipments_20250501120001" and reopened._mark == index._mark
+
+
+def test_failed_reindex_keeps_the_live_collection(index, monkeypatch):
+    index.start(background=False)
+    live = _pointer(index)
+
+    def broken(texts):
+        raise RuntimeError("embeddings API down")
+
+    monkeypatch.setattr(chroma_rag, "get_embeddings", broken)
+    with pytest.raises(RuntimeError):
+        index.reindex()
+    stats = index.stats()
+    assert (stats["state"], stats["collection"], stats["last_error"]) == ("ready", live["collection"], "embeddings API down")
+    assert _pointer(index) == live and list(index.client.collections) == [live["collection"]]
+    assert not index._write_lock.locked()
+
+
+def test_background_reindex_takes_the_lock_before_starting(index, monkeypatch):
+    index.start(background=False)
+    release = threading.Event()
+    started = []
+
+    def slow_reindex():
+        started.append(True)
+        release.wait(5)
+        index._write_lock.release()
+
+    monkeypatch.setattr(index, "_reindex_locked", slow_reindex)
+    assert index.reindex_in_background()
+    assert not index.reindex_in_background()    # refused even if the first thread hasn't run yet
+    assert index.reindex()["status"] == "busy" and index.refresh() == 0
+    release.set()
+    for _ in range(100):
+        if not index._write_lock.locked():
+            break
+        threading.Event().wait(0.01)
+    assert started == [True] and index.reindex_in_background()
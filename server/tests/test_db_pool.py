@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("mysql.connector")
+
+from db import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.connected = True
+        self.in_transaction = False
+        self.unread_result = False
+        self.closed = False
+        self.pings = 0
+        self.rollbacks = 0
+        self.fail_ping = False
+        self.fail_rollback = False
+
+    def is_connected(self):
+        return self.connected
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.fail_ping:
+            raise OSError("server has gone away")
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise OSError("lost connection")
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnect:
+    def __init__(self):
+        self.made = []
+        self.fail = False
+
+    def __call__(self):
+        if self.fail:
+            raise OSError("can't connect")
+        conn = FakeConnection(len(self.made))
+        self.made.append(conn)
+        return conn
+
+
+def test_connections_are_reused_and_rolled_back_on_release():
+    connect = FakeConnect()
+    pool = ConnectionPool(size=2, timeout=1, ping_after=60, connect=connect)
+
+    first = pool.acquire()
+    first.in_transaction = True
+    pool.release(first)
+    assert first.rollbacks == 1
+
+    assert pool.acquire() is first
+    second = pool.acquire()
+    assert second is not first and len(connect.made) == 2
+    stats = pool.stats()
+    assert (stats["open"], stats["in_use"], stats["idle"], stats["checkouts"]) == (2, 2, 0, 3)
+
+    pool.release(first)
+    pool.release(second)
+    pool.close_all()
+    assert first.closed and second.closed and pool.stats()["open"] == 0
+
+
+def test_unhealthy_and_broken_connections_are_replaced():
+    connect = FakeConnect()
+    pool = ConnectionPool(size=1, timeout=1, ping_after=0, connect=connect)
+
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.fail_ping = True                      # idle past ping_after and the ping fails
+    replacement = pool.acquire()
+    assert replacement is not conn and conn.closed
+    assert pool.stats()["replaced_unhealthy"] == 1
+
+    pool.release(replacement, broken=True)     # e.g. OperationalError inside connection()
+    assert replacement.closed and pool.stats()["open"] == 0
+
+    conn = pool.acquire()
+    conn.in_transaction, conn.fail_rollback = True, True
+    pool.release(conn)                          # rollback failed: dropped, not pooled
+    assert conn.closed and pool.stats()["idle"] == 0
+
+    conn = pool.acquire()
+    conn.unread_result = True
+    pool.release(conn)                          # abandoned unbuffered result set: dropped
+    assert conn.closed and pool.stats()["idle"] == 0
+
+    connect.fail = True
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert (pool.stats()["open"], pool.stats()["in_use"]) == (0, 0)   # the slot is given back
+
+
+def test_exhausted_pool_waits_then_times_out():
+    pool = ConnectionPool(size=1, timeout=0.2, ping_after=60, connect=FakeConnect())
+    held = pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.2
+    assert pool.stats()["timeouts"] == 1
+
+    # a waiter is woken as soon as the connection comes back
+    threading.Timer(0.05, pool.release, (held,)).start()
+    assert pool.acquire() is held
+    assert pool.stats()["waits"] == 1
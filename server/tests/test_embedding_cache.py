@@ -0,0 +1,61 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from embedding_cache import EmbeddingCache, cache_key
+
+
+def test_only_misses_reach_the_api(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    def fake_api(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 0.5] for t in texts]
+
+    assert cache.embed("m", ["ab", "abc", "ab"], fake_api) == [[2.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+    assert calls == [["ab", "abc"]]
+
+    assert cache.embed("m", ["abc", "abcd"], fake_api) == [[3.0, 0.5], [4.0, 0.5]]
+    assert calls[-1] == ["abcd"]
+
+    # same text under another model is a different entry
+    cache.embed("other", ["ab"], fake_api)
+    assert calls[-1] == ["ab"]
+
+    stats = cache.stats()
+    assert stats["entries"] == 4
+    assert stats["hits"] == 1 and stats["misses"] == 5
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("m", ["a"])          # touch "a" so "b" is the oldest
+    cache.put_many("m", ["c"], [[3.0]])
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hits_are_flushed_on_interval_and_count_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path=path, max_entries=10, touch_interval=3600)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.put_many("m", ["a"], [[1.5]])             # replaced, not a new row
+    assert cache.stats()["entries"] == 2
+
+    (stored,) = cache._db().execute("SELECT last_access FROM embeddings WHERE key = ?",
+                                    (cache_key("m", "a"),)).fetchone()
+    cache.get_many("m", ["a"])
+    (after_hit,) = cache._db().execute("SELECT last_access FROM embeddings WHERE key = ?",
+                                       (cache_key("m", "a"),)).fetchone()
+    assert after_hit == stored                       # buffered, no write on the query path
+
+    cache.close()                                    # pending touches are written on close
+    reopened = EmbeddingCache(path=path, max_entries=10)
+    (flushed,) = reopened._db().execute("SELECT last_access FROM embeddings WHERE key = ?",
+                                        (cache_key("m", "a"),)).fetchone()
+    assert flushed > stored
+    assert reopened.stats()["entries"] == 2
+    assert reopened.get_many("m", ["a", "b"]) == [[1.5], [2.0]]
@@ -0,0 +1,143 @@
+import math
+import os
+import random
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from evaporation_rollups import (ROLLUP_GAMMA, apply_journey_change, bucket_for, lane_key, percentile,
+                                 rebuild_rollups, rollup_keys, summarize)
+
+
+def test_histogram_percentiles_stay_within_bucket_error():
+    rng = random.Random(3)
+    rates = [rng.lognormvariate(-1.5, 0.6) for _ in range(5000)]
+    buckets = {}
+    for rate in rates:
+        buckets[bucket_for(rate)] = buckets.get(bucket_for(rate), 0) + 1
+    ordered = sorted(rates)
+    for q in (0.5, 0.95):
+        exact = ordered[math.ceil(q * len(ordered)) - 1]
+        assert percentile(buckets, q) == pytest.approx(exact, rel=ROLLUP_GAMMA - 1)
+
+    # clamped to the exact extremes, and zero / negative rates share the bottom bucket
+    assert percentile({bucket_for(0.2): 3}, 0.5, low=0.2, high=0.2) == 0.2
+    assert bucket_for(0) == bucket_for(-0.3) == 0
+    assert percentile({}, 0.5) is None
+
+
+def test_rollup_keys_and_summary():
+    journey = {"origin_city": "Denver", "origin_state": "CO", "dest_city": "Boston", "dest_state": None}
+    assert lane_key(journey) == "Denver, CO → Boston"
+    assert rollup_keys(lane_key(journey), date(2025, 5, 1)) == [
+        ("shipper", ""), ("lane", "Denver, CO → Boston"), ("day", "2025-05-01")]
+
+    row = {"trips": 2, "rate_sum": 0.5, "rate_min": 0.2, "rate_max": 0.3, "loss_kg": 4.25}
+    summary = summarize(row, {bucket_for(0.2): 1, bucket_for(0.3): 1})
+    assert summary["mean_kg_per_hour"] == 0.25
+    assert summary["p50_kg_per_hour"] == pytest.approx(0.2, rel=ROLLUP_GAMMA - 1)
+    assert summary["p95_kg_per_hour"] == pytest.approx(0.3, rel=ROLLUP_GAMMA - 1)
+    assert summary["total_loss_kg"] == 4.25
+
+
+class FakeCursor:
+    """Records every statement; SELECTs answer with the given journey rows."""
+
+    def __init__(self, journeys):
+        self.journeys = journeys
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((" ".join(sql.split()), params))
+
+    def executemany(self, sql, rows):
+        self.statements.append((" ".join(sql.split()), list(rows)))
+
+    def fetchone(self):
+        return self.journeys[0] if self.journeys else None
+
+    def fetchall(self):
+        return self.journeys
+
+    def close(self):
+        pass
+
+    def matching(self, prefix):
+        return [params for sql, params in self.statements if sql.startswith(prefix)]
+
+
+class FakeConnection:
+    def __init__(self, journeys):
+        self.cursor_ = FakeCursor(journeys)
+        self.commits = 0
+
+    def cursor(self, **kwargs):
+        return self.cursor_
+
+    def commit(self):
+        self.commits += 1
+
+
+def _journey(manifest_id="MAN-000001", rate=0.3, pickup=30.0, dropoff=24.0, day=date(2025, 5, 2), rolled_up=None):
+    guard = rolled_up or (None, None, None, None)
+    return {
+        "manifest_id": manifest_id, "shipper_id": "s1", "rate": rate,
+        "pickup_weight": pickup, "dropoff_weight": dropoff,
+        "pickup_time": datetime.combine(day, datetime.min.time()) if day else None,
+        "origin_city": "Denver", "origin_state": "CO", "dest_city": "Boston", "dest_state": "MA",
+        "rolled_up_rate": guard[0], "rolled_up_loss": guard[1], "rolled_up_lane": guard[2], "rolled_up_day": guard[3],
+    }
+
+
+def test_rerecorded_event_replaces_the_old_contribution():
+    old_lane = "Denver, CO → Austin, TX"
+    conn = FakeConnection([_journey(rolled_up=(0.2, 4.0, old_lane, date(2025, 5, 1)))])
+    assert apply_journey_change(conn, "MAN-000001")
+    cursor = conn.cursor_
+
+    # the old contribution comes off the old lane / day, with its old rate and loss...
+    removed = cursor.matching("UPDATE evaporation_rollup SET trips = trips - 1")
+    assert removed == [(0.2, 4.0, "s1", scope, key) for scope, key in rollup_keys(old_lane, date(2025, 5, 1))]
+    assert len(cursor.matching("UPDATE evaporation_rollup r JOIN")) == 3
+    # ...the new one goes on the current lane / day...
+    added = cursor.matching("INSERT INTO evaporation_rollup (")
+    assert added == [("s1", scope, key, 0.3, 0.3, 0.3, 6.0)
+                     for scope, key in rollup_keys("Denver, CO → Boston, MA", date(2025, 5, 2))]
+    # ...and the guard remembers it, so applying again is a no-op
+    (guard,) = cursor.matching("UPDATE shipment_journey SET rolled_up_rate")
+    assert guard == (0.3, 6.0, "Denver, CO → Boston, MA", date(2025, 5, 2), "MAN-000001")
+
+    again = FakeConnection([_journey(rolled_up=guard[:4])])
+    assert not apply_journey_change(again, "MAN-000001")
+    assert len(again.cursor_.statements) == 1   # just the SELECT ... FOR UPDATE
+
+    # a trip that no longer has a rate is taken out and its guard cleared
+    cleared = FakeConnection([_journey(rate=None, rolled_up=guard[:4])])
+    assert apply_journey_change(cleared, "MAN-000001")
+    assert not cleared.cursor_.matching("INSERT INTO evaporation_rollup (")
+    assert cleared.cursor_.matching("UPDATE shipment_journey SET rolled_up_rate") == [
+        (None, None, None, None, "MAN-000001")]
+
+
+def test_rebuild_aggregates_in_one_pass():
+    conn = FakeConnection([
+        _journey("MAN-000001", rate=0.2, dropoff=28.0),
+        _journey("MAN-000002", rate=0.4, dropoff=None),
+        _journey("MAN-000003", rate=0.3, day=date(2025, 5, 3)),
+    ])
+    assert rebuild_rollups(conn) == 3 and conn.commits == 1
+    cursor = conn.cursor_
+    assert not cursor.matching("SELECT manifest_id FROM")   # no per-trip round trips
+    (rollups,) = cursor.matching("INSERT INTO evaporation_rollup (")
+    by_key = {(scope, key): values for _, scope, key, *values in rollups}
+    trips, rate_sum, low, high, loss = by_key[("shipper", "")]
+    assert (trips, low, high, loss) == (3, 0.2, 0.4, 8.0) and rate_sum == pytest.approx(0.9)
+    assert by_key[("day", "2025-05-02")][0] == 2 and by_key[("day", "2025-05-03")][0] == 1
+    (buckets,) = cursor.matching("INSERT INTO evaporation_rollup_bucket")
+    assert sum(row[4] for row in buckets if row[1] == "shipper") == 3
+    reset, guards = cursor.matching("UPDATE shipment_journey SET rolled_up_rate")
+    assert reset is None
+    assert [g[-1] for g in guards] == ["MAN-000001", "MAN-000002", "MAN-000003"] and guards[1][1] is None
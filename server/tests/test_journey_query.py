@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from journey_query import ROUTES_FIELDS, build_journey_query, select_fields
+
+
+def test_projection_prunes_unused_joins():
+    sql, params = build_journey_query({"manifest_id": "manifest_id", "pickup_time": "pickup_time"},
+                                      where=[("shipper_id", "=", "shipper-ln2-20-0007")])
+    assert "pickup_event pe" in sql
+    assert "dropoff_event" not in sql
+    assert "container_weight_event" not in sql
+    assert "locations" not in sql
+    assert params == ["shipper-ln2-20-0007"]
+
+
+def test_location_fields_pull_in_weight_event_join():
+    sql, _ = build_journey_query({"Origin": "origin"})
+    assert sql.index("cw_pickup ON") < sql.index("locations lp ON")
+    assert "cw_dropoff" not in sql
+
+
+def test_filters_ordering_and_limit():
+    sql, params = build_journey_query(
+        {"manifest_id": "manifest_id"},
+        where=[("manifest_id", "IN", ["MAN-000001", "MAN-000002"]), ("dropoff_time", "IS NOT NULL", None)],
+        order_by=[("pickup_time", "DESC"), ("manifest_id", "DESC")],
+        limit=51,
+    )
+    assert "m.manifest_id IN (%s, %s)" in sql
+    assert "de.actual_receive_time IS NOT NULL" in sql
+    assert sql.rstrip().endswith("ORDER BY pe.actual_departure_at DESC, m.manifest_id DESC\nLIMIT %s")
+    assert params == ["MAN-000001", "MAN-000002", 51]
+
+
+def test_select_fields():
+    assert list(select_fields(ROUTES_FIELDS, "Origin, pickup_time")) == ["Origin", "pickup_time"]
+    assert list(select_fields(ROUTES_FIELDS, "Origin", required=("manifest_id",))) == ["Origin", "manifest_id"]
+    with pytest.raises(ValueError):
+        select_fields(ROUTES_FIELDS, "Origin,bogus")
+
+
+def test_materialized_source_reads_one_table():
+    sql, params = build_journey_query(ROUTES_FIELDS, where=[("shipper_id", "=", "shipper-ln2-20-0007")],
+                                      order_by=[("pickup_time", "DESC")], source="materialized")
+    assert "FROM shipment_journey sj" in sql
+    assert "JOIN" not in sql
+    assert "ORDER BY sj.pickup_time DESC" in sql
+    assert params == ["shipper-ln2-20-0007"]
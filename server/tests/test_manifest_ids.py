@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from manifest_ids import ManifestIdAllocator, format_manifest_id
+
+
+class _SequenceConnection:
+    """Emulates UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + n)."""
+
+    def __init__(self, start=1):
+        self.next_value = start
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self._last = None
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params=None):
+        if sql.startswith("UPDATE"):
+            with self._lock:
+                self.round_trips += 1
+                self.next_value += params[0]
+                self._last = self.next_value
+            self.rowcount = 1
+
+    def fetchone(self):
+        return (self._last,)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_ids_are_sequential_and_blocked():
+    conn = _SequenceConnection(start=42)
+    allocator = ManifestIdAllocator(block_size=10)
+    ids = [allocator.next_id(conn) for _ in range(25)]
+    assert ids[0] == "MAN-000042"
+    assert ids == [format_manifest_id(n) for n in range(42, 67)]
+    assert conn.round_trips == 3
+
+
+def test_concurrent_allocation_never_repeats():
+    conn = _SequenceConnection()
+    allocator = ManifestIdAllocator(block_size=7)
+    out = []
+
+    def worker():
+        out.extend(allocator.next_id(conn) for _ in range(100))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == len(set(out)) == 800
+    assert allocator.reserve(conn, 3) == [format_manifest_id(n) for n in range(conn.next_value - 3, conn.next_value)]
@@ -0,0 +1,110 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from manifest_ids import format_manifest_id  # noqa: E402
+from manifests import MANIFEST_TEMPERATURE_C, insert_manifests_bulk, validate_manifests  # noqa: E402
+
+NOW = datetime(2025, 5, 1, 12, 0)
+
+
+def manifest(manifest_id="", **overrides):
+    item = {
+        "manifest_id": manifest_id,
+        "shipper_id": "shipper-ln2-20-0001",
+        "origin_location_id": 1,
+        "origin_contact_name": "Dr. Gomez",
+        "destination_location_id": 2,
+        "destination_contact_name": "Nurse Jenkins",
+        "scheduled_ship_time": "2025-05-02T09:00:00",
+        "expected_receive_time": "2025-05-03T09:00:00",
+        "projected_weight_kg": 30.0,
+        "created_by_user_id": 7,
+    }
+    item.update(overrides)
+    return item
+
+
+class _BulkConnection:
+    """Answers the allocator, the existing-id lookup and records the inserts."""
+
+    def __init__(self, existing=(), next_value=100):
+        self.existing = set(existing)
+        self.next_value = next_value
+        self.inserted = []
+        self.refreshed = []
+        self.commits = 0
+        self._result = []
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params=None):
+        if sql.startswith("UPDATE id_sequence"):
+            self.next_value += params[0]
+            self.rowcount = 1
+            self._result = [(self.next_value,)]
+        elif "WHERE manifest_id IN" in sql:
+            self._result = [(m,) for m in params if m in self.existing]
+        else:   # refresh_shipment_journey
+            self.refreshed.append(params)
+
+    def executemany(self, sql, rows):
+        self.inserted.extend(rows)
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+def test_server_owned_fields_cannot_be_overridden():
+    valid, errors = validate_manifests(
+        [manifest(temperature_c=25, created_at="2020-01-01T00:00:00", dev_current_time="2020-01-01T00:00:00")],
+        now=NOW)
+    assert not errors
+    (_, m), = valid
+    assert (m.temperature_c, m.created_at, m.dev_current_time) == (MANIFEST_TEMPERATURE_C, NOW, NOW)
+
+
+def test_partial_failure_reports_errors_by_index():
+    items = [
+        manifest("M-1"),
+        "not an object",
+        manifest("M-2", projected_weight_kg="heavy"),
+        manifest("M-1"),                       # repeated within the request
+        manifest(),                            # id allocated server-side
+        manifest("M-9"),                       # already in the table
+    ]
+    valid, errors = validate_manifests(items, now=NOW)
+    assert [index for index, _ in valid] == [0, 4, 5]
+    assert errors[1] == "Expected an object"
+    assert errors[2].startswith("projected_weight_kg:")
+    assert errors[3] == "Manifest ID M-1 appears more than once in this request"
+
+    conn = _BulkConnection(existing={"M-9"})
+    created, insert_errors = insert_manifests_bulk(conn, valid, missing_ids=1)
+    allocated = format_manifest_id(100)
+    assert created == ["M-1", allocated]
+    assert insert_errors == {5: "Manifest ID M-9 is already in use"}
+    assert [r["manifest_id"] for r in conn.inserted] == ["M-1", allocated]
+    assert all(r["temperature_c"] == MANIFEST_TEMPERATURE_C for r in conn.inserted)
+    assert conn.refreshed and conn.commits == 2   # the id reservation, then the batch
+
+    # nothing left to insert: no write, no commit
+    conn = _BulkConnection(existing={"M-9"})
+    assert insert_manifests_bulk(conn, [valid[2]], missing_ids=0) == ([], {5: "Manifest ID M-9 is already in use"})
+    assert conn.inserted == [] and conn.commits == 0
@@ -0,0 +1,52 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from pagination import decode_cursor, encode_cursor, iter_ndjson, keyset_predicate
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2025, 5, 4, 12, 30), "MAN-000042"])
+    assert decode_cursor(cursor, 2) == ["2025-05-04T12:30:00", "MAN-000042"]
+
+
+def test_cursor_rejects_wrong_sort_key():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(["MAN-000042"]), 2)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor!!", 2)
+
+
+def test_keyset_predicate_desc_with_nullable_time():
+    sql, params = keyset_predicate(["pe.actual_departure_at", "m.manifest_id"], ["2025-05-04T12:30:00", "MAN-000042"])
+    assert sql == ("(pe.actual_departure_at < %s OR pe.actual_departure_at IS NULL OR "
+                   "(pe.actual_departure_at = %s AND (m.manifest_id < %s OR m.manifest_id IS NULL)))")
+    assert params == ["2025-05-04T12:30:00", "2025-05-04T12:30:00", "MAN-000042"]
+
+    # once the cursor is inside the NULL tail only manifest_id moves forward
+    sql, params = keyset_predicate(["pe.actual_departure_at", "m.manifest_id"], [None, "MAN-000042"])
+    assert sql == "(pe.actual_departure_at IS NULL AND (m.manifest_id < %s OR m.manifest_id IS NULL))"
+    assert params == ["MAN-000042"]
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def fetchmany(self, n):
+        batch, self.rows = self.rows[:n], self.rows[n:]
+        return batch
+
+    def fetchall(self):
+        batch, self.rows = self.rows, []
+        return batch
+
+
+def test_iter_ndjson_pages_with_trailer():
+    rows = [{"manifest_id": f"MAN-{i:06d}"} for i in (5, 4, 3)]
+    lines = "".join(iter_ndjson(FakeCursor(rows), ["manifest_id"], limit=2, batch_size=2)).splitlines()
+    assert len(lines) == 3
+    assert lines[-1] == '{"next_cursor": "%s"}' % encode_cursor(["MAN-000004"])
@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prompt_builder import build_prompt, count_tokens, encode_row, rank_shipments
+
+
+def _shipment(i, evap, transit="10:30"):
+    return {
+        "shipment_id": f"MAN-{i:06d}",
+        "pickup_time": f"2025-05-{(i % 28) + 1:02d}T08:00:00Z",
+        "pickup_contact": "Dana Ortiz, Driver",
+        "delivery_time": f"2025-05-{(i % 28) + 1:02d}T18:30:00Z",
+        "receiver": "Lee Park, Lab Manager",
+        "transit_time_hours": transit,
+        "evaporation_rate_kg_per_hour": evap,
+    }
+
+
+def test_encode_row_is_compact():
+    assert encode_row(_shipment(7, 0.12345)) == (
+        "MAN-000007|2025-05-08 08:00|Dana Ortiz, Driver|2025-05-08 18:30|Lee Park, Lab Manager|10.50|0.1235"
+    )
+
+
+def test_budget_truncates_and_summarizes_overflow():
+    shipments = [_shipment(i, i / 100) for i in range(300)]
+    prompt = build_prompt(shipments, "which shipments had the highest evaporation?", "shipper-1", budget=800)
+    assert prompt.tokens <= 800
+    assert prompt.included + prompt.omitted == 300 and prompt.omitted > 0
+    assert prompt.tokens == count_tokens(prompt.text)
+    # ranked by evaporation, so the worst shipment is listed first
+    assert prompt.text.index("MAN-000299") < prompt.text.index("MAN-000298")
+    assert f"{prompt.omitted} more shipments not listed" in prompt.text
+
+
+def test_small_sets_are_listed_in_full():
+    shipments = [_shipment(i, 0.1) for i in range(3)]
+    prompt = build_prompt(shipments, "summarize these", "shipper-1")
+    assert (prompt.included, prompt.omitted) == (3, 0)
+    assert "not listed" not in prompt.text
+    assert rank_shipments(shipments, "summarize these") == shipments
+
+
+def test_ranking_direction_follows_the_question():
+    shipments = [_shipment(i, evap, transit) for i, (evap, transit) in
+                 enumerate([(0.3, "5:00"), (0.1, "20:00"), (None, "9:00"), (0.2, "1:00"), (0.4, "12:00")])]
+
+    def ids(question):
+        return [int(s["shipment_id"][-1]) for s in rank_shipments(shipments, question)]
+
+    assert ids("which shipments had the highest evaporation?") == [4, 0, 3, 1, 2]
+    assert ids("which shipments had the lowest evaporation?") == [1, 3, 0, 4, 2]
+    assert ids("what were the shortest trips?") == [3, 0, 2, 4, 1]
+    assert ids("which trip was the slowest?") == [1, 4, 2, 0, 3]
+    # no direction given: alternate from both ends so neither extreme is truncated
+    assert ids("how did evaporation vary?") == [1, 4, 3, 0, 2]
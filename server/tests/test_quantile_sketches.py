@@ -0,0 +1,155 @@
+import bisect
+import os
+import random
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from quantile_sketches import SKETCH_COMPRESSION, TDigest, _fold, apply_sketch_change, summarize
+
+
+def rank_error(ordered, value, q):
+    return abs(bisect.bisect_right(ordered, value) / len(ordered) - q)
+
+
+def test_digest_quantiles_are_accurate_and_bounded():
+    rng = random.Random(11)
+    rates = [rng.lognormvariate(-1.5, 0.6) for _ in range(20000)]
+    digest = TDigest()
+    for rate in rates:
+        digest.add(rate)
+    ordered = sorted(rates)
+    for q, tolerance in ((0.5, 0.01), (0.95, 0.005), (0.99, 0.002)):
+        assert rank_error(ordered, digest.quantile(q), q) < tolerance
+    assert digest.quantile(0) == ordered[0] and digest.quantile(1) == ordered[-1]
+    assert len(digest.centroids()) <= SKETCH_COMPRESSION
+    assert TDigest().quantile(0.5) is None
+
+
+def test_daily_digests_round_trip_and_merge_across_a_window():
+    rng = random.Random(5)
+    days = [[rng.uniform(2, 30) for _ in range(rng.randrange(1, 400))] for _ in range(60)]
+    stored = []
+    for hours in days:
+        digest = TDigest()
+        for h in hours:
+            digest.add(h)
+        blob = digest.to_bytes()
+        assert len(blob) <= 23 + 8 * SKETCH_COMPRESSION
+        stored.append(blob)
+
+    # any window of days is the merge of its daily digests
+    window = slice(10, 45)
+    merged = TDigest.merged(TDigest.from_bytes(b) for b in stored[window])
+    ordered = sorted(h for hours in days[window] for h in hours)
+    assert len(merged) == len(ordered)
+    assert (merged.min, merged.max) == (ordered[0], ordered[-1])
+    for q in (0.5, 0.95, 0.99):
+        assert rank_error(ordered, merged.quantile(q), q) < 0.01
+
+    empty = TDigest.from_bytes(TDigest().to_bytes())
+    assert len(empty) == 0 and summarize(empty)["p95"] is None
+
+
+def test_fold_sketches_each_trip_per_shipper_and_lane():
+    digests = {}
+    day = date(2025, 5, 1)
+    _fold(digests, "s1", "Denver, CO → Boston, MA", day, 0.2, 18.5)
+    _fold(digests, "s1", "Denver, CO → Austin, TX", day, 0.4, None)
+    assert len(digests[("s1", "shipper", "", "evaporation_rate", day)]) == 2
+    assert len(digests[("s1", "shipper", "", "transit_hours", day)]) == 1
+    assert ("s1", "lane", "Denver, CO → Austin, TX", "transit_hours", day) not in digests
+
+    summary = summarize(digests[("s1", "lane", "Denver, CO → Boston, MA", "evaporation_rate", day)])
+    assert summary == {"trips": 1, "p50": 0.2, "p95": 0.2, "p99": 0.2, "min": 0.2, "max": 0.2}
+
+
+class FakeSketchStore:
+    """Just enough of shipment_journey and quantile_sketch for apply_sketch_change, as a cursor."""
+
+    def __init__(self, journeys):
+        self.journeys = {j["manifest_id"]: j for j in journeys}
+        self.sketches = {}      # (shipper_id, scope, key, metric, day) -> (trips, digest blob)
+        self.locked = []        # rows present when the digests were read FOR UPDATE
+        self._result = []
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if sql.startswith("SELECT manifest_id"):
+            self._result = [dict(self.journeys[params[0]])]
+        elif sql.startswith("UPDATE shipment_journey"):
+            rate, hours, lane, day, manifest_id = params
+            self.journeys[manifest_id].update(sketched_rate=rate, sketched_hours=hours, sketched_lane=lane,
+                                              sketched_day=day)
+        elif sql.startswith("SELECT scope"):
+            shipper_id, day, lane = params
+            self._result = [{"scope": k[1], "sketch_key": k[2], "metric": k[3], "digest": blob}
+                            for k, (_, blob) in self.sketches.items()
+                            if k[0] == shipper_id and k[4] == day and k[2] in ("", lane)]
+            self.locked.append(len(self._result))
+        elif sql.startswith("DELETE FROM quantile_sketch"):
+            self.sketches = {k: v for k, v in self.sketches.items() if (k[0], k[4]) != tuple(params)}
+        elif sql.startswith("SELECT sketched_rate"):
+            shipper_id, day = params
+            self._result = [j for j in self.journeys.values()
+                            if j["shipper_id"] == shipper_id and j["sketched_day"] == day]
+        else:
+            raise AssertionError(sql)
+
+    def executemany(self, sql, rows):
+        for row in rows:
+            if sql.lstrip().startswith("INSERT IGNORE"):
+                self.sketches.setdefault(tuple(row[:5]), (0, row[5]))
+            else:
+                self.sketches[tuple(row[:5])] = (row[5], row[6])
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+    def trips(self, day, scope="shipper", key="", metric="evaporation_rate"):
+        return self.sketches.get(("s1", scope, key, metric, day), (0, None))[0]
+
+    def quantile(self, day, q, metric="evaporation_rate"):
+        return TDigest.from_bytes(self.sketches[("s1", "shipper", "", metric, day)][1]).quantile(q)
+
+
+def _journey(manifest_id, pickup, rate, hours, dest="Boston"):
+    return {"manifest_id": manifest_id, "shipper_id": "s1", "rate": rate, "hours": hours, "pickup_time": pickup,
+            "origin_city": "Denver", "origin_state": "CO", "dest_city": dest, "dest_state": "MA",
+            "sketched_rate": None, "sketched_hours": None, "sketched_lane": None, "sketched_day": None}
+
+
+def test_apply_sketch_change_locks_existing_rows_and_resketches_rerecorded_trips():
+    may1, may2 = date(2025, 5, 1), date(2025, 5, 2)
+    store = FakeSketchStore([_journey("MAN-000001", datetime(2025, 5, 1, 8), 0.2, 10.0),
+                             _journey("MAN-000002", datetime(2025, 5, 1, 9), 0.4, None, dest="Austin")])
+
+    # first trip of the day: the rows are created before they are read FOR UPDATE
+    assert apply_sketch_change(store, "MAN-000001")
+    assert store.locked == [4]       # shipper + lane x rate + hours, all present
+    assert store.trips(may1) == 1 and store.trips(may1, metric="transit_hours") == 1
+
+    assert apply_sketch_change(store, "MAN-000002")
+    assert store.trips(may1) == 2 and store.trips(may1, metric="transit_hours") == 1
+    assert store.trips(may1, "lane", "Denver, CO → Austin, MA") == 1
+    assert not apply_sketch_change(store, "MAN-000002")      # unchanged: no-op
+
+    # MAN-000001's pickup is re-recorded a day later with a new rate: both days are re-sketched
+    store.journeys["MAN-000001"].update(pickup_time=datetime(2025, 5, 2, 8), rate=0.3)
+    assert apply_sketch_change(store, "MAN-000001")
+    assert store.trips(may1) == 1 and store.quantile(may1, 0.5) == pytest.approx(0.4)
+    assert store.trips(may1, metric="transit_hours") == 0
+    assert store.trips(may2) == 1 and store.quantile(may2, 0.5) == pytest.approx(0.3)
+    assert store.journeys["MAN-000001"]["sketched_day"] == may2
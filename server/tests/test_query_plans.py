@@ -0,0 +1,92 @@
+"""
+EXPLAIN every hot query against a real database and fail if any of them
+full-scans one of the big tables with no index that could serve it. On small
+dev / CI data MySQL often prefers a scan on purpose, so a scan that had
+usable indexes only fails once it reads more than QUERY_PLAN_SCAN_ROWS rows.
+
+Needs DB_HOST / DB_PORT / DB_USER / DB_PASSWORD / DB_NAME (e.g. from server/.env);
+skipped when no database is reachable. Migrations are applied first.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+mysql_connector = pytest.importorskip("mysql.connector")
+
+from journey_query import ROUTES_FIELDS, build_journey_query, build_records_query
+from migrate import apply_migrations
+from shipment_journey import build_refresh_sql
+
+# EXPLAIN reports the alias used in the query; these all point at the large tables
+# (shipping_manifest, the three event tables, shipment_journey). locations is tiny
+# and always joined on its primary key.
+HOT_ALIASES = {"m", "pe", "de", "cw_pickup", "cw_dropoff", "sj", "p", "d", "c"}
+
+QUERY_PLAN_SCAN_ROWS = int(os.getenv("QUERY_PLAN_SCAN_ROWS", 1000))
+
+
+@pytest.fixture(scope="module")
+def conn():
+    if not os.getenv("DB_HOST"):
+        pytest.skip("DB_HOST not set")
+    try:
+        connection = mysql_connector.connect(
+            host=os.getenv("DB_HOST"),
+            port=int(os.getenv("DB_PORT", 3306)),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            database=os.getenv("DB_NAME"),
+        )
+    except mysql_connector.Error as e:
+        pytest.skip(f"database not reachable: {e}")
+    apply_migrations(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(scope="module")
+def sample(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT shipper_id, manifest_id FROM shipping_manifest LIMIT 1")
+    row = cursor.fetchone()
+    cursor.close()
+    if not row:
+        pytest.skip("shipping_manifest is empty")
+    return row
+
+
+def hot_queries(shipper_id, manifest_id):
+    queries = []
+    for source in ("live", "materialized"):
+        for filter in ("date", "location", "manifestid", "all"):
+            sql, params, _ = build_records_query(filter, shipper_id, limit=50, source=source)
+            queries.append((f"records filter={filter} ({source})", sql, params))
+        sql, params = build_journey_query(ROUTES_FIELDS, where=[("shipper_id", "=", shipper_id)], source=source)
+        queries.append((f"shipper routes ({source})", sql, params))
+    queries.append(("refresh_shipment_journey", build_refresh_sql(1), [manifest_id] * 5))
+    return queries
+
+
+def full_scans(conn, sql, params):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("EXPLAIN " + sql, params)
+    plan = cursor.fetchall()
+    cursor.close()
+    return [
+        row for row in plan
+        if row["table"] in HOT_ALIASES and row["type"] == "ALL"
+        and (not row["possible_keys"] or (row["rows"] or 0) > QUERY_PLAN_SCAN_ROWS)
+    ]
+
+
+def test_hot_queries_use_indexes(conn, sample):
+    shipper_id, manifest_id = sample
+    failures = []
+    for name, sql, params in hot_queries(shipper_id, manifest_id):
+        for row in full_scans(conn, sql, params):
+            failures.append(f"{name}: full scan of {row['table']} ({row['rows']} rows, "
+                            f"possible keys: {row['possible_keys'] or 'none'})")
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,114 @@
+import csv
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from readings_store import READING_DTYPE, ReadingStore, parse_reading, parse_readings  # noqa: E402
+
+SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "Sample_Movement_Data.csv")
+
+
+def reading(seq, ts, weight, container="shipper-ln2-20-0001", event="interim", **extra):
+    return {"shipper_id": container, "sequence_number": seq, "event_type": event,
+            "timestamp": ts.isoformat(), "weight": weight, "temperature": 22.0, **extra}
+
+
+def test_sample_csv_ingests_once_and_scans_by_container(tmp_path):
+    store = ReadingStore(str(tmp_path))
+    with open(SAMPLE_CSV, newline="") as f:
+        rows = list(csv.DictReader(f))
+    readings, errors = parse_readings(rows)
+    assert not errors
+
+    assert store.append(readings)["appended"] == len(rows)
+    assert store.append(readings) == {"appended": 0, "duplicates": len(rows), "containers": 15}
+
+    container = rows[0]["shipper_id"]
+    expected = [r for r in rows if r["shipper_id"] == container]
+    records = store.records(container, with_text=True)
+    assert [r["sequence_number"] for r in records] == [int(r["sequence_number"]) for r in expected]
+    assert records[0]["condition_notes"] == expected[0]["condition_notes"]
+    assert records[0]["destination_city"] == expected[0]["destination_city"]
+
+    # [start, end) reads only the days it covers
+    start, end = expected[1]["timestamp"], expected[3]["timestamp"]
+    assert [r["sequence_number"] for r in store.records(container, start, end)] == [2, 3]
+
+    with pytest.raises(ValueError):
+        parse_reading({"shipper_id": "../etc", "event_type": "ship", "sequence_number": 1, "timestamp": "2025-01-01"})
+    with pytest.raises(ValueError):
+        parse_reading({"shipper_id": "c1", "event_type": "lost", "sequence_number": 1, "timestamp": "2025-01-01"})
+
+
+def test_out_of_order_days_and_torn_chunks(tmp_path):
+    store = ReadingStore(str(tmp_path))
+    t0 = datetime(2025, 5, 1, 23, 0)
+    store.append([parse_reading(reading(2, t0 + timedelta(hours=2), 29.5)),
+                  parse_reading(reading(1, t0, 30.0, event="ship"))])
+    chunk = tmp_path / "shipper-ln2-20-0001" / "2025-05-02.bin"
+    with open(chunk, "ab") as f:
+        f.write(b"\x00" * 5)   # half-written record
+
+    assert len(store.scan("shipper-ln2-20-0001")) == 2
+    store.append([parse_reading(reading(3, t0 + timedelta(hours=1), 29.8))])
+    assert chunk.stat().st_size % READING_DTYPE.itemsize == 0
+    assert store.scan("shipper-ln2-20-0001")["sequence_number"].tolist() == [1, 3, 2]
+
+
+def test_downsample_matches_bucketed_readings(tmp_path):
+    store = ReadingStore(str(tmp_path))
+    rng = np.random.default_rng(2)
+    t0 = datetime(2025, 5, 1)
+    weights = 30 - np.cumsum(rng.uniform(0, 0.01, 2000))
+    store.append([parse_reading(reading(i, t0 + timedelta(minutes=5 * i), float(w)))
+                  for i, w in enumerate(weights)])
+
+    result = store.downsample("shipper-ln2-20-0001", t0, t0 + timedelta(days=7), points=7)
+    assert result["bucket_seconds"] == 86400 and result["readings"] == 2000
+    assert [b["count"] for b in result["buckets"]] == [288] * 6 + [272]
+    day2 = weights.astype(np.float32)[288:576]
+    assert result["buckets"][1]["start"] == "2025-05-02T00:00:00"
+    assert result["buckets"][1]["weight"] == {"min": round(float(day2.min()), 3),
+                                              "mean": round(float(day2.astype(np.float64).mean()), 3),
+                                              "max": round(float(day2.max()), 3)}
+    assert store.downsample("shipper-ln2-20-0001", datetime(2024, 1, 1), datetime(2024, 1, 2))["buckets"] == []
+
+
+def test_late_readings_are_kept_and_duplicates_come_from_the_chunks(tmp_path):
+    t0 = datetime(2025, 5, 1, 8)
+    store = ReadingStore(str(tmp_path))
+    assert store.append([parse_reading(reading(seq, t0 + timedelta(hours=seq), 30.0 - seq))
+                         for seq in (1, 2, 5)])["appended"] == 3
+
+    # 3 and 4 arrive after 5: they are new, not duplicates of a high-water mark
+    late = [parse_reading(reading(seq, t0 + timedelta(hours=seq), 30.0 - seq)) for seq in (4, 3)]
+    assert store.append(late + [parse_reading(reading(2, t0, 1.0))]) == {
+        "appended": 2, "duplicates": 1, "containers": 1}
+    assert store.scan("shipper-ln2-20-0001")["sequence_number"].tolist() == [1, 2, 3, 4, 5]
+
+    # a crash after the chunk write (nothing else to persist) followed by a re-post
+    crashed = ReadingStore(str(tmp_path))
+    crashed._append_chunk("shipper-ln2-20-0001", "2025-05-02",
+                          [parse_reading(reading(6, t0 + timedelta(days=1), 24.0))])
+    restarted = ReadingStore(str(tmp_path))
+    result = restarted.append([parse_reading(reading(6, t0 + timedelta(days=1), 24.0)),
+                               parse_reading(reading(7, t0 + timedelta(days=1, hours=1), 23.9))])
+    assert (result["appended"], result["duplicates"]) == (1, 1)
+    assert restarted.scan("shipper-ln2-20-0001")["sequence_number"].tolist() == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_workers_sharing_a_path_see_each_others_readings(tmp_path):
+    t0 = datetime(2025, 5, 1, 8)
+    first, second = ReadingStore(str(tmp_path)), ReadingStore(str(tmp_path))
+    assert first.append([parse_reading(reading(1, t0, 30.0))])["appended"] == 1
+    assert second.append([parse_reading(reading(2, t0 + timedelta(hours=1), 29.9))])["appended"] == 1
+    # each store re-reads the touched day under the lock, so neither misses the other's write
+    assert first.append([parse_reading(reading(2, t0 + timedelta(hours=1), 29.9))])["duplicates"] == 1
+    assert second.append([parse_reading(reading(1, t0, 30.0))])["duplicates"] == 1
+    assert first.scan("shipper-ln2-20-0001")["sequence_number"].tolist() == [1, 2]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from reconcile_weaviate import diff
+from weaviate_writer import delete_shipments, generate_uuid_for_shipment
+
+
+def test_diff_classifies_drift():
+    a = generate_uuid_for_shipment("shipper-1", "MAN-000001")
+    b = generate_uuid_for_shipment("shipper-1", "MAN-000002")
+    expected = {a: ("shipper-1", "MAN-000001"), b: ("shipper-1", "MAN-000002")}
+    actual = [
+        (a, "shipper-1", "MAN-000001"),
+        ("random-1", "shipper-1", "MAN-000001"),   # legacy random-UUID copy
+        ("random-2", "shipper-9", "MAN-000999"),   # manifest no longer in MySQL
+    ]
+    drift = diff(expected, actual)
+    assert drift == {"in_sync": 1, "duplicates": ["random-1"], "orphans": ["random-2"], "missing": [b]}
+
+
+def test_uuid_is_deterministic():
+    assert generate_uuid_for_shipment("s", "MAN-000001") == generate_uuid_for_shipment("s", "MAN-000001")
+    assert generate_uuid_for_shipment("s", "MAN-000001") != generate_uuid_for_shipment("s", "MAN-000002")
+
+
+class _FakeBatch:
+    def __init__(self):
+        self.requests = []
+
+    def delete_objects(self, class_name, where, output):
+        ids = [operand["valueText"] for operand in where["operands"]]
+        self.requests.append((class_name, ids))
+        objects = [{"id": i, "status": "FAILED" if i == "locked" else "SUCCESS"} for i in ids]
+        failed = sum(1 for o in objects if o["status"] == "FAILED")
+        return {"results": {"matches": len(ids), "successful": len(ids) - failed, "failed": failed,
+                            "objects": objects}}
+
+
+class _FakeClient:
+    def __init__(self):
+        self.batch = _FakeBatch()
+
+
+def test_delete_shipments_batches_by_id_filter():
+    client = _FakeClient()
+    ids = [f"id-{n}" for n in range(5)] + ["locked"]
+    assert delete_shipments(client, ids, batch_size=4) == 5
+    assert client.batch.requests == [("Shipment", ids[:4]), ("Shipment", ids[4:])]
+    assert delete_shipments(client, []) == 0 and len(client.batch.requests) == 2
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from retrieval import fan_out, reciprocal_rank_fusion
+
+
+def _ids(shipments):
+    return [s["manifest_id"] for s in shipments]
+
+
+def test_rrf_prefers_shipments_found_by_several_sources():
+    ranked = {
+        "filter": [{"manifest_id": "MAN-000001", "from": "filter"}, {"manifest_id": "MAN-000002"}],
+        "vector": [{"manifest_id": "MAN-000003"}, {"manifest_id": "MAN-000002", "from": "vector"},
+                   {"manifest_id": "MAN-000002"}],
+        "sql": [{"manifest_id": "MAN-000002"}, {"manifest_id": None}],
+    }
+    fused = reciprocal_rank_fusion(ranked, k=60)
+    assert _ids(fused) == ["MAN-000002", "MAN-000001", "MAN-000003"]
+    # the first source to return a shipment supplies its dict
+    assert "from" not in fused[0] and fused[1]["from"] == "filter"
+
+
+def test_fan_out_runs_sources_concurrently_and_drops_slow_or_failing_ones():
+    recorded = {}
+
+    def slow(seconds, result):
+        def fn():
+            time.sleep(seconds)
+            return result
+        return fn
+
+    def broken():
+        raise RuntimeError("weaviate down")
+
+    async def run():
+        started = time.perf_counter()
+        result = await fan_out(
+            {"filter": slow(0.2, [{"manifest_id": "a"}]), "vector": slow(0.2, [{"manifest_id": "b"}]),
+             "sql": slow(1, []), "extra": broken},
+            timeouts={"filter": 0.5, "vector": 0.5, "sql": 0.3, "extra": 0.5},
+            record=lambda name, seconds: recorded.setdefault(name, seconds),
+        )
+        return result, time.perf_counter() - started
+
+    (ranked, timings), elapsed = asyncio.run(run())
+    assert elapsed < 0.4
+    assert set(ranked) == {"filter", "vector"}
+    assert {name: t["status"] for name, t in timings.items()} == {
+        "filter": "ok", "vector": "ok", "sql": "timeout", "extra": "error"}
+    assert set(recorded) == {"retrieval.filter", "retrieval.vector", "retrieval.sql", "retrieval.extra"}
@@ -0,0 +1,69 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from shipment_columns import ShipmentColumns, analyze
+
+
+ROWS = [
+    {"manifest_id": "MAN-000001", "shipper_id": "s1", "pickup_time": "2025-05-01T08:00:00Z",
+     "dropoff_time": "2025-05-02T10:30:00Z", "origin_contact": "A", "destination_contact": "B",
+     "pickup_weight": 30.0, "dropoff_weight": 25.0, "evaporation_rate": None},
+    {"manifest_id": "MAN-000002", "shipper_id": "s1", "pickup_time": "2025-04-01T08:00:00Z",
+     "dropoff_time": "2025-04-01T11:00:00Z", "evaporation_rate": 0.25},
+    {"manifest_id": "MAN-000003", "shipper_id": "s1", "pickup_time": "2025-05-03T08:00:00Z",
+     "dropoff_time": None},
+    {"manifest_id": "MAN-000004", "shipper_id": "s1", "pickup_time": None},
+]
+
+
+def test_transit_spans_whole_days_and_missing_rates_are_derived():
+    result = analyze(ShipmentColumns.from_rows(ROWS))
+    assert result.index.tolist() == [0, 1, 2]
+    assert result.transit_hours[0] == pytest.approx(26.5)   # timedelta.seconds would have said 2.5
+    assert result.evaporation_rate[0] == pytest.approx(5 / 26.5)
+    assert np.isnan(result.transit_hours[2])
+
+    records = result.to_records()
+    assert records[0]["transit_time_hours"] == "26:30"
+    assert records[0]["pickup_contact"] == "A" and records[0]["receiver"] == "B"
+    assert records[1]["evaporation_rate_kg_per_hour"] == 0.25
+    assert records[2]["transit_time_hours"] is None
+    assert result.stats()["transit_hours"] == {"min": 3.0, "mean": 14.75, "max": 26.5}
+
+
+def test_cutoff_filter_accepts_strings_and_datetimes():
+    cutoff = datetime(2025, 5, 1, 8)
+    after = analyze(ShipmentColumns.from_rows(ROWS), cutoff=cutoff, direction="after")
+    assert after.index.tolist() == [0, 2]    # inclusive of the cutoff itself
+    before = analyze(ShipmentColumns.from_rows(ROWS), cutoff=cutoff, direction="before")
+    assert before.index.tolist() == [0, 1]
+
+    sql_rows = [dict(r, pickup_time=datetime(2025, 5, 2), dropoff_time=datetime(2025, 5, 2, 6)) for r in ROWS[:2]]
+    result = analyze(ShipmentColumns.from_rows(sql_rows), cutoff=cutoff, direction="after")
+    assert result.transit_hours.tolist() == [6.0, 6.0]
+
+
+def test_offset_timestamps_are_normalized_to_utc():
+    from datetime import timedelta, timezone
+
+    from shipment_columns import to_datetime64
+
+    parsed = to_datetime64(["2025-05-01T05:00:00-05:00", "2025-05-01T12:30:00.250+02:00",
+                            "2025-05-01T10:00:00Z", None])
+    assert parsed[:3].tolist() == [datetime(2025, 5, 1, 10), datetime(2025, 5, 1, 10, 30), datetime(2025, 5, 1, 10)]
+    assert np.isnat(parsed[3])
+
+    aware = datetime(2025, 5, 1, 19, 0, tzinfo=timezone(timedelta(hours=9)))
+    assert to_datetime64([aware]).tolist() == [datetime(2025, 5, 1, 10)]
+
+    # 05:00 CDT is 10:00 UTC, so a 12:00 UTC dropoff is 2 hours, not 7
+    rows = [dict(ROWS[1], pickup_time="2025-04-01T05:00:00-05:00", dropoff_time="2025-04-01T12:00:00Z",
+                 evaporation_rate=None, pickup_weight=30.0, dropoff_weight=29.0)]
+    assert analyze(ShipmentColumns.from_rows(rows)).transit_hours.tolist() == [2.0]
@@ -0,0 +1,128 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vector_index import VectorIndex
+
+
+def _shipment(manifest_id, shipper_id, pickup_time):
+    return {"manifest_id": manifest_id, "shipper_id": shipper_id, "pickup_time": pickup_time}
+
+
+def _index():
+    index = VectorIndex()
+    index.upsert("a", [1, 0, 0], _shipment("MAN-000001", "s1", "2025-04-01T08:00:00Z"))
+    index.upsert("b", [0.9, 0.1, 0], _shipment("MAN-000002", "s1", "2025-05-02T08:00:00Z"))
+    index.upsert("c", [0, 1, 0], _shipment("MAN-000003", "s1", "2025-05-03T08:00:00Z"))
+    index.upsert("d", [1, 0, 0], _shipment("MAN-000004", "s2", "2025-05-04T08:00:00Z"))
+    return index
+
+
+def _ids(shipments):
+    return [s["manifest_id"] for s in shipments]
+
+
+def test_search_prefilters_on_shipper_and_pickup_time():
+    index = _index()
+    assert _ids(index.search([2, 0, 0], k=2)) in (["MAN-000001", "MAN-000004"], ["MAN-000004", "MAN-000001"])
+    assert _ids(index.search([1, 0, 0], k=5, shipper_id="s1")) == ["MAN-000001", "MAN-000002", "MAN-000003"]
+    assert _ids(index.search([1, 0, 0], k=5, shipper_id="s1", after="2025-05-01T00:00:00Z")) == ["MAN-000002", "MAN-000003"]
+    assert _ids(index.search([1, 0, 0], k=5, shipper_id="nobody")) == []
+    assert _ids(index.filter(shipper_id="s1", before="2025-05-03T00:00:00Z")) == ["MAN-000002", "MAN-000001"]
+
+    # replacing an object keeps one copy, deleting hides it
+    index.upsert("a", [0, 0, 1], _shipment("MAN-000001", "s1", "2025-04-01T08:00:00Z"))
+    index.delete(["b"])
+    assert len(index) == 3
+    assert _ids(index.search([0, 0.5, 1], k=5, shipper_id="s1")) == ["MAN-000001", "MAN-000003"]
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    index = _index()
+    index.delete(["c"])
+    index.save(str(tmp_path))
+
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.stats()["memmapped"] and len(loaded) == 3
+    assert _ids(loaded.search([1, 0, 0], k=5, shipper_id="s1")) == ["MAN-000001", "MAN-000002"]
+
+    # the first write copies the read-only map into memory
+    loaded.upsert("e", [0, 1, 0], _shipment("MAN-000005", "s1", "2025-06-01T08:00:00Z"))
+    assert not loaded.stats()["memmapped"]
+    assert _ids(loaded.filter(shipper_id="s1")) == ["MAN-000005", "MAN-000002", "MAN-000001"]
+    assert VectorIndex.load(str(tmp_path / "missing")).stats()["objects"] == 0
+
+
+def test_ivf_search_matches_exhaustive_search_for_clustered_data():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(8, 16))
+    index = VectorIndex()
+    for i in range(800):
+        vector = centers[i % 8] + rng.normal(scale=0.05, size=16)
+        index.upsert(str(i), vector, _shipment(f"MAN-{i:06d}", "s1", "2025-05-01T00:00:00Z"))
+    query = centers[3]
+    exact, _ = index.top_k(query, k=10)
+    assert index.build_ivf(nlist=8, min_rows=1) == 8
+    approx, _ = index.top_k(query, k=10, nprobe=2)
+    assert set(approx) == set(exact)
+
+
+def test_sync_drops_objects_that_no_longer_map_to_a_delivered_manifest(monkeypatch):
+    pytest.importorskip("openai")
+    pytest.importorskip("weaviate")
+    import ingest_shipments_to_weaviate
+    import weaviate_sync
+    from vector_index import prune_index, sync_index
+    from weaviate_writer import generate_uuid_for_shipment
+
+    index = VectorIndex()
+    moved = generate_uuid_for_shipment("s1", "MAN-000001")
+    undelivered = generate_uuid_for_shipment("s1", "MAN-000002")
+    gone = generate_uuid_for_shipment("s1", "MAN-000003")
+    index.upsert(moved, [1, 0, 0], _shipment("MAN-000001", "s1", "2025-04-01T08:00:00Z"))
+    index.upsert(undelivered, [0, 1, 0], _shipment("MAN-000002", "s1", "2025-04-02T08:00:00Z"))
+    index.upsert(gone, [0, 0, 1], _shipment("MAN-000003", "s1", "2025-04-03T08:00:00Z"))
+
+    # MAN-000001 moved to shipper s2; MAN-000002's dropoff was removed
+    t1, t2 = datetime(2025, 5, 1, 9), datetime(2025, 5, 1, 10)
+    feed = [[("MAN-000001", t1), ("MAN-000002", t2)], []]
+    rows = {"MAN-000001": {"shipper_id": "s2"}, "MAN-000002": None}
+
+    def build_shipment(row):
+        if row["shipper_id"] is None:
+            raise ValueError("not delivered")
+        return "summary", _shipment(row["manifest_id"], row["shipper_id"], "2025-04-01T08:00:00Z")
+
+    monkeypatch.setattr(weaviate_sync, "changed_manifests", lambda conn, hw, last, size: feed.pop(0))
+    monkeypatch.setattr(weaviate_sync, "journey_rows", lambda conn, ids: [
+        {"manifest_id": m, "shipper_id": (rows[m] or {}).get("shipper_id")} for m in ids])
+    monkeypatch.setattr(ingest_shipments_to_weaviate, "build_shipment", build_shipment)
+    monkeypatch.setattr(ingest_shipments_to_weaviate, "embed_batch", lambda texts: [[0, 1, 1] for _ in texts])
+
+    result = sync_index(None, index, batch_size=2)
+    assert (result["changed"], result["upserted"], result["deleted"]) == (2, 1, 2)
+    assert index.keys_for_manifests(["MAN-000001", "MAN-000002"]) == {generate_uuid_for_shipment("s2", "MAN-000001")}
+    assert index.mark == (t2, "MAN-000002")
+
+    class _Journey:
+        def cursor(self):
+            return self
+
+        def execute(self, sql):
+            pass
+
+        def fetchall(self):
+            return [("s2", "MAN-000001")]
+
+        def close(self):
+            pass
+
+    # MAN-000003 was deleted from MySQL and never shows up in the feed
+    assert prune_index(_Journey(), index) == 1
+    assert len(index) == 1
@@ -0,0 +1,389 @@
+"""
+In-process vector index over the Shipment objects.
+
+Used instead of Weaviate when VECTOR_BACKEND=local. For small and medium
+tenants a search is cheaper than the network round-trip, and tests can run
+without a Weaviate container.
+
+Vectors are stored L2-normalised in one float32 matrix, so cosine similarity is
+a single matrix-vector product. search() first narrows the rows by shipper_id
+and pickup_time range (the same filters build_where_filter() sends to
+Weaviate). It then scores only those rows and returns the top k.
+
+Past IVF_MIN_ROWS rows, build_ivf() groups the vectors into spherical k-means
+clusters. A search then only scores the VECTOR_INDEX_NPROBE clusters nearest
+the query. It falls back to an exhaustive scan when the filters leave fewer
+than k candidates in the probed clusters.
+
+sync_index() follows the shipment_journey change feed. It also drops the
+objects of a changed manifest that no longer map to its current key (moved to
+another shipper, or no longer delivered). prune_index() removes objects whose
+manifest is gone from MySQL altogether.
+
+save() writes the matrix as .npy and everything else as meta.json, each
+replaced atomically. load() memory-maps the matrix, so it is paged in on demand
+and shared between workers. The first upsert after a load copies it into
+memory.
+
+    index = VectorIndex.load(VECTOR_INDEX_PATH)
+    index.search(embedding, k=25, shipper_id="shipper-ln2-01-0001", after=cutoff)
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vector_index")
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 8))
+IVF_MIN_ROWS = int(os.getenv("VECTOR_INDEX_IVF_MIN_ROWS", 20_000))
+
+_UNASSIGNED = -1
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _datetime64(value):
+    """pickup_time as stored in Weaviate ("2025-05-01T10:00:00Z") or a datetime -> datetime64[s]."""
+    if value is None or value == "":
+        return np.datetime64("NaT", "s")
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None).isoformat()
+    return np.datetime64(str(value).rstrip("Z")[:19], "s")
+
+
+class VectorIndex:
+    def __init__(self, dims: int = None):
+        self.dims = dims
+        self._lock = threading.RLock()
+        self._size = 0
+        self._vectors = np.zeros((0, dims or 0), dtype=np.float32)
+        self._shippers = np.zeros(0, dtype=np.int32)
+        self._pickup = np.zeros(0, dtype="datetime64[s]")
+        self._live = np.zeros(0, dtype=bool)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._centroids = None
+        self._shipper_codes = {}
+        self.keys = []          # row -> object id
+        self.properties = []    # row -> Shipment properties
+        self._rows = {}         # object id -> row
+        self.mark = (None, None)   # (high_water, last_manifest_id) of the change feed, see sync_index()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self, needed: int):
+        capacity = len(self._live)
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        capacity = max(16, needed, capacity * 2)
+
+        def resized(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._vectors = resized(self._vectors, 0)
+        self._shippers = resized(self._shippers, -1)
+        self._pickup = resized(self._pickup, np.datetime64("NaT", "s"))
+        self._live = resized(self._live, False)
+        self._lists = resized(self._lists, _UNASSIGNED)
+
+    def upsert(self, key: str, vector, properties: dict):
+        """Insert or replace one object (keyed like Weaviate, by generate_uuid_for_shipment)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self.dims is None:
+                self.dims = vector.shape[0]
+                self._vectors = np.zeros((0, self.dims), dtype=np.float32)
+            if vector.shape != (self.dims,):
+                raise ValueError(f"expected a {self.dims}-dimensional vector, got {vector.shape}")
+
+            row = self._rows.get(key)
+            if row is None:
+                row = self._size
+                self._grow(row + 1)
+                self._size += 1
+                self._rows[key] = row
+                self.keys.append(key)
+                self.properties.append(properties)
+            else:
+                self._grow(self._size)   # copy out of a read-only memmap before writing
+                self.properties[row] = properties
+
+            shipper = properties.get("shipper_id")
+            code = self._shipper_codes.setdefault(shipper, len(self._shipper_codes))
+            self._vectors[row] = _normalize(vector)
+            self._shippers[row] = code
+            self._pickup[row] = _datetime64(properties.get("pickup_time"))
+            self._live[row] = True
+            self._lists[row] = self._nearest_list(self._vectors[row])
+
+    def delete(self, keys) -> int:
+        deleted = 0
+        with self._lock:
+            for key in keys:
+                row = self._rows.pop(key, None)
+                if row is not None:
+                    self._live[row] = False
+                    deleted += 1
+        return deleted
+
+    def retain(self, keys) -> int:
+        """Delete every object whose key is not in `keys`."""
+        keep = set(keys)
+        with self._lock:
+            return self.delete([key for key in self._rows if key not in keep])
+
+    def keys_for_manifests(self, manifest_ids) -> set[str]:
+        """Keys of the live objects for any of `manifest_ids`."""
+        wanted = set(manifest_ids)
+        with self._lock:
+            return {key for key, row in self._rows.items() if self.properties[row].get("manifest_id") in wanted}
+
+    def _nearest_list(self, vector) -> int:
+        if self._centroids is None:
+            return _UNASSIGNED
+        return int(np.argmax(self._centroids @ vector))
+
+    def build_ivf(self, nlist: int = None, iterations: int = 10, seed: int = 0, min_rows: int = IVF_MIN_ROWS):
+        """Cluster the live vectors (spherical k-means, ~sqrt(n) lists by default). Returns the list count."""
+        with self._lock:
+            rows = np.flatnonzero(self._live[:self._size])
+            if len(rows) < max(min_rows, 1):
+                self._centroids = None
+                self._lists[:self._size] = _UNASSIGNED
+                return 0
+            self._grow(self._size)
+            data = self._vectors[rows]
+            nlist = min(nlist or int(np.sqrt(len(rows))), len(rows))
+            rng = np.random.default_rng(seed)
+            centroids = data[rng.choice(len(rows), nlist, replace=False)]
+            for _ in range(iterations):
+                assign = self._assign(data, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, data)
+                empty = np.bincount(assign, minlength=nlist) == 0
+                sums[empty] = centroids[empty]   # keep a centroid that lost all its members
+                centroids = _normalize(sums)
+            self._centroids = centroids
+            self._lists[:self._size] = _UNASSIGNED
+            self._lists[rows] = self._assign(data, centroids)
+            return nlist
+
+    @staticmethod
+    def _assign(data, centroids, chunk: int = 65_536):
+        return np.concatenate([np.argmax(data[i:i + chunk] @ centroids.T, axis=1)
+                               for i in range(0, len(data), chunk)]) if len(data) else np.zeros(0, dtype=np.int64)
+
+    def _mask(self, shipper_id=None, after=None, before=None):
+        n = self._size
+        mask = self._live[:n].copy()
+        if shipper_id is not None:
+            code = self._shipper_codes.get(shipper_id)
+            if code is None:
+                return np.zeros(n, dtype=bool)
+            mask &= self._shippers[:n] == code
+        if after is not None:
+            mask &= self._pickup[:n] > _datetime64(after)
+        if before is not None:
+            mask &= self._pickup[:n] < _datetime64(before)
+        return mask
+
+    def top_k(self, vector, k: int = 25, shipper_id=None, after=None, before=None, nprobe: int = VECTOR_INDEX_NPROBE):
+        """(rows, cosine scores) of the k best matches among the rows that pass the filters."""
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            mask = self._mask(shipper_id, after, before)
+            rows = np.flatnonzero(mask)
+            if self._centroids is not None and nprobe and nprobe < len(self._centroids):
+                probe = np.argsort(self._centroids @ query)[-nprobe:]
+                lists = self._lists[rows]
+                probed = rows[np.isin(lists, probe) | (lists == _UNASSIGNED)]
+                if len(probed) >= k:
+                    rows = probed
+            if not len(rows):
+                return rows, np.zeros(0, dtype=np.float32)
+            scores = self._vectors[rows] @ query
+        if k < len(rows):
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def search(self, vector, k: int = 25, shipper_id=None, after=None, before=None) -> list[dict]:
+        """Properties of the k nearest objects, best first (the near_vector stand-in)."""
+        rows, _ = self.top_k(vector, k, shipper_id, after, before)
+        return [self.properties[row] for row in rows]
+
+    def filter(self, shipper_id=None, after=None, before=None, limit: int = 100) -> list[dict]:
+        """Objects matching the filters, most recent pickup first (the with_where stand-in)."""
+        with self._lock:
+            rows = np.flatnonzero(self._mask(shipper_id, after, before))
+            pickups = self._pickup[rows]
+            # shipments without a pickup time go last
+            keys = np.where(np.isnat(pickups), np.iinfo(np.int64).min, pickups.astype(np.int64))
+            rows = rows[np.argsort(keys, kind="stable")[::-1]]
+            return [self.properties[row] for row in rows[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "objects": len(self._rows),
+                "rows": self._size,
+                "dims": self.dims,
+                "shippers": len(self._shipper_codes),
+                "ivf_lists": len(self._centroids) if self._centroids is not None else 0,
+                "memmapped": isinstance(self._vectors, np.memmap),
+            }
+
+    def save(self, path: str = VECTOR_INDEX_PATH):
+        """Write the live rows (deleted ones are compacted away) to `path`/."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            rows = np.flatnonzero(self._live[:self._size])
+            generation = time.time_ns()
+            vectors_file = f"vectors.{generation}.npy"
+            lists_file = f"lists.{generation}.npy"
+            centroids_file = f"centroids.{generation}.npy" if self._centroids is not None else None
+            np.save(os.path.join(path, vectors_file), np.ascontiguousarray(self._vectors[rows]))
+            np.save(os.path.join(path, lists_file), self._lists[rows])
+            if centroids_file:
+                np.save(os.path.join(path, centroids_file), self._centroids)
+            high_water, last_manifest_id = self.mark
+            meta = {
+                "dims": self.dims,
+                "vectors": vectors_file,
+                "lists": lists_file,
+                "centroids": centroids_file,
+                "keys": [self.keys[row] for row in rows],
+                "properties": [self.properties[row] for row in rows],
+                "high_water": high_water.isoformat() if high_water else None,
+                "last_manifest_id": last_manifest_id,
+            }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        # readers go through meta.json, so swapping it publishes the new files in one step
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        keep = {vectors_file, lists_file, centroids_file, "meta.json"}
+        for name in os.listdir(path):
+            if name.endswith(".npy") and name not in keep:
+                os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path: str = VECTOR_INDEX_PATH, mmap: bool = True) -> "VectorIndex":
+        """The index saved at `path`, or an empty one if nothing has been saved there yet."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return cls()
+        with open(meta_path) as f:
+            meta = json.load(f)
+        index = cls(meta["dims"])
+        index._vectors = np.load(os.path.join(path, meta["vectors"]), mmap_mode="r" if mmap else None)
+        index._lists = np.load(os.path.join(path, meta["lists"]))
+        if meta["centroids"]:
+            index._centroids = np.load(os.path.join(path, meta["centroids"]))
+        index.keys = meta["keys"]
+        index.properties = meta["properties"]
+        index._size = len(index.keys)
+        index._rows = {key: row for row, key in enumerate(index.keys)}
+        shippers = [p.get("shipper_id") for p in index.properties]
+        for shipper in shippers:
+            index._shipper_codes.setdefault(shipper, len(index._shipper_codes))
+        index._shippers = np.array([index._shipper_codes[s] for s in shippers], dtype=np.int32)
+        index._pickup = np.array([_datetime64(p.get("pickup_time")) for p in index.properties], dtype="datetime64[s]")
+        index._live = np.ones(index._size, dtype=bool)
+        high_water = meta.get("high_water")
+        index.mark = (datetime.fromisoformat(high_water) if high_water else None, meta.get("last_manifest_id"))
+        return index
+
+
+def sync_index(conn, index: VectorIndex, batch_size: int = None) -> dict:
+    """
+    Catch the local index up with the shipment_journey change feed, exactly
+    like weaviate_sync.sync_once() does for Weaviate (same rows, summaries,
+    embeddings and object ids), keeping the mark on the index itself.
+    """
+    from ingest_shipments_to_weaviate import build_shipment, embed_batch
+    from weaviate_sync import SYNC_BATCH, changed_manifests, journey_rows
+    from weaviate_writer import generate_uuid_for_shipment
+
+    batch_size = batch_size or SYNC_BATCH
+    started = time.perf_counter()
+    changed = upserted = deleted = 0
+    high_water, last_id = index.mark
+    while True:
+        batch = changed_manifests(conn, high_water, last_id, batch_size)
+        if not batch:
+            break
+        shipments = []
+        for row in journey_rows(conn, [manifest_id for manifest_id, _ in batch]):
+            try:
+                shipments.append(build_shipment(row))
+            except ValueError:
+                continue   # not delivered yet
+        current = {generate_uuid_for_shipment(data["shipper_id"], data["manifest_id"]) for _, data in shipments}
+        if shipments:
+            vectors = embed_batch([summary for summary, _ in shipments])
+            for (_, data), vector in zip(shipments, vectors):
+                index.upsert(generate_uuid_for_shipment(data["shipper_id"], data["manifest_id"]), vector, data)
+        deleted += index.delete(index.keys_for_manifests(m for m, _ in batch) - current)
+        last_id, high_water = batch[-1]
+        index.mark = (high_water, last_id)
+        changed += len(batch)
+        upserted += len(shipments)
+        if len(batch) < batch_size:
+            break
+
+    elapsed = time.perf_counter() - started
+    if changed:
+        print(f"🔁 Local vector index sync: {changed} changed manifests, {upserted} upserted, "
+              f"{deleted} deleted in {elapsed:.2f}s")
+    return {
+        "status": "ok",
+        "changed": changed,
+        "upserted": upserted,
+        "deleted": deleted,
+        "high_water": high_water.isoformat() if high_water else None,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def prune_index(conn, index: VectorIndex) -> int:
+    """Delete objects whose (shipper_id, manifest_id) is no longer in shipment_journey."""
+    from weaviate_writer import generate_uuid_for_shipment
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT shipper_id, manifest_id FROM shipment_journey")
+    expected = {generate_uuid_for_shipment(shipper_id, manifest_id) for shipper_id, manifest_id in cursor.fetchall()}
+    cursor.close()
+    deleted = index.retain(expected)
+    if deleted:
+        print(f"🧹 Local vector index: pruned {deleted} objects no longer in MySQL")
+    return deleted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db import connection
+
+    parser = argparse.ArgumentParser(description="Build / refresh the local shipment vector index")
+    parser.add_argument("--path", default=VECTOR_INDEX_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="start from an empty index")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default ~sqrt(rows))")
+    args = parser.parse_args()
+
+    index = VectorIndex() if args.rebuild else VectorIndex.load(args.path)
+    with connection() as conn:
+        print(f"✅ {sync_index(conn, index)}")
+        prune_index(conn, index)
+    print(f"🧭 IVF lists: {index.build_ivf(args.nlist)}")
+    index.save(args.path)
+    print(f"💾 Saved {len(index)} vectors to {args.path}")
@@ -0,0 +1,178 @@
+"""
+Incremental MySQL -> Weaviate sync.
+
+Every pickup / dropoff / manifest write refreshes the manifest's
+shipment_journey row in the same transaction, which bumps its updated_at.
+That column is the change feed: each pass reads the manifests whose
+(updated_at, manifest_id) is past the high-water mark stored in sync_state,
+re-embeds just those, and upserts them under generate_uuid_for_shipment() so
+an object is replaced, never duplicated. The mark only moves after Weaviate
+accepted the batch.
+
+Rows newer than SYNC_SETTLE_SECONDS are left for the next pass, so a
+transaction that stamped updated_at but had not committed yet when we
+scanned is not skipped over.
+
+    python weaviate_sync.py --once          # catch up and exit
+    python weaviate_sync.py                 # keep polling every SYNC_INTERVAL seconds
+"""
+import argparse
+import os
+import time
+
+from journey_query import INGEST_FIELDS, build_journey_query
+from clients import clients
+from ingest_shipments_to_weaviate import build_shipment, embed_batch
+from weaviate_writer import ShipmentWriter
+
+SYNC_NAME = "weaviate_shipments"
+SYNC_BATCH = int(os.getenv("SYNC_BATCH", 200))
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", 10))
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", 5))
+
+
+def read_mark(conn):
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT high_water, last_manifest_id FROM sync_state WHERE name = %s", (SYNC_NAME,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row if row else (None, None)
+
+
+def save_mark(conn, high_water, last_manifest_id, synced: int):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO sync_state (name, high_water, last_manifest_id, synced_total)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            high_water = VALUES(high_water),
+            last_manifest_id = VALUES(last_manifest_id),
+            synced_total = synced_total + VALUES(synced_total)
+    """, (SYNC_NAME, high_water, last_manifest_id, synced))
+    conn.commit()
+    cursor.close()
+
+
+def changed_manifests(conn, high_water, last_manifest_id, limit: int = SYNC_BATCH):
+    """(manifest_id, updated_at) past the mark, oldest first."""
+    cursor = conn.cursor()
+    if high_water is None:
+        after, params = "", []
+    else:
+        after = "AND (updated_at > %s OR (updated_at = %s AND manifest_id > %s))"
+        params = [high_water, high_water, last_manifest_id or ""]
+    cursor.execute(f"""
+        SELECT manifest_id, updated_at
+        FROM shipment_journey
+        WHERE updated_at < NOW(6) - INTERVAL %s SECOND
+        {after}
+        ORDER BY updated_at, manifest_id
+        LIMIT %s
+    """, [SYNC_SETTLE_SECONDS] + params + [limit])
+    rows = cursor.fetchall()
+    # end the read snapshot so the next pass sees newly committed rows
+    conn.commit()
+    cursor.close()
+    return rows
+
+
+def journey_rows(conn, manifest_ids: list) -> list[dict]:
+    """Ingest-shaped journey rows for the given manifests."""
+    query, params = build_journey_query(INGEST_FIELDS, where=[("manifest_id", "IN", manifest_ids)], source="materialized")
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def upsert_shipments(rows) -> int:
+    """Embed and write journey rows; rows that are not delivered yet are skipped."""
+    shipments = []
+    for row in rows:
+        try:
+            shipments.append(build_shipment(row))
+        except Exception as e:
+            print(f"⏭️ Not syncing {row.get('manifest_id')}: {e}")
+    if not shipments:
+        return 0
+
+    vectors = embed_batch([summary for summary, _ in shipments])
+    with ShipmentWriter(clients.weaviate, batch_size=len(shipments), dynamic=False) as writer:
+        for (_, data), vector in zip(shipments, vectors):
+            writer.upsert(data, vector)
+    if writer.failed:
+        raise RuntimeError(f"Weaviate rejected {len(writer.failed)} of {len(shipments)} objects: {writer.failed[0][1]}")
+    return len(shipments)
+
+
+def sync_once(conn, batch_size: int = SYNC_BATCH) -> dict:
+    """Catch Weaviate up with every committed change. Safe to call from several processes."""
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (SYNC_NAME,))
+    (locked,) = cursor.fetchone()
+    if not locked:
+        cursor.close()
+        return {"status": "busy"}
+
+    started = time.perf_counter()
+    changed = upserted = 0
+    try:
+        high_water, last_id = read_mark(conn)
+        while True:
+            batch = changed_manifests(conn, high_water, last_id, batch_size)
+            if not batch:
+                break
+            rows = journey_rows(conn, [manifest_id for manifest_id, _ in batch])
+            written = upsert_shipments(rows)
+            last_id, high_water = batch[-1]
+            save_mark(conn, high_water, last_id, written)
+            changed += len(batch)
+            upserted += written
+            if len(batch) < batch_size:
+                break
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (SYNC_NAME,))
+        cursor.fetchall()
+        cursor.close()
+
+    elapsed = time.perf_counter() - started
+    if changed:
+        print(f"🔁 Weaviate sync: {changed} changed manifests, {upserted} upserted in {elapsed:.2f}s")
+    return {
+        "status": "ok",
+        "changed": changed,
+        "upserted": upserted,
+        "high_water": high_water.isoformat() if high_water else None,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def run_forever(interval: float = SYNC_INTERVAL):
+    from db import connection
+
+    print(f"🔄 Weaviate sync polling every {interval}s")
+    while True:
+        try:
+            with connection() as conn:
+                sync_once(conn)
+        except Exception as e:
+            print(f"❌ Weaviate sync pass failed: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from db import connection
+    from migrate import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Incrementally sync changed shipments into Weaviate")
+    parser.add_argument("--once", action="store_true", help="catch up once and exit")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL, help="seconds between passes")
+    args = parser.parse_args()
+
+    with connection() as conn:
+        apply_migrations(conn)
+        if args.once:
+            print(f"✅ {sync_once(conn)}")
+    if not args.once:
+        run_forever(args.interval)
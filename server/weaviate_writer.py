@@ -0,0 +1,112 @@
+"""
+Idempotent writes to the Weaviate "Shipment" class.
+
+Every object is stored under generate_uuid_for_shipment(shipper_id,
+manifest_id), and a batch import with an existing id replaces that object, so
+writing the same shipment twice leaves exactly one copy. Ingest, the
+incremental sync and the reconciler all write through ShipmentWriter.
+
+    with ShipmentWriter(weaviate_client) as writer:
+        writer.upsert(shipment_data, vector)
+    writer.failed   # [(manifest_id, errors)] rejected by Weaviate
+"""
+import hashlib
+import os
+import uuid
+
+SHIPMENT_CLASS = "Shipment"
+WEAVIATE_BATCH = int(os.getenv("INGEST_WEAVIATE_BATCH", 100))
+
+
+def generate_uuid_for_shipment(shipper_id: str, manifest_id: str) -> str:
+    unique_key = f"{shipper_id}::{manifest_id}"
+    return str(uuid.UUID(hashlib.md5(unique_key.encode()).hexdigest()))
+
+
+class ShipmentWriter:
+    def __init__(self, client, batch_size: int = WEAVIATE_BATCH, dynamic: bool = True):
+        self.client = client
+        self.batch_size = batch_size
+        self.dynamic = dynamic
+        self.written = 0
+        self.failed = []
+        self._batch = None
+
+    def _collect(self, results):
+        for result in results or []:
+            errors = result.get("result", {}).get("errors")
+            if errors:
+                manifest_id = result.get("properties", {}).get("manifest_id")
+                print(f"❌ Weaviate rejected {manifest_id}: {errors}")
+                self.failed.append((manifest_id, errors))
+
+    def __enter__(self):
+        self.client.batch.configure(batch_size=self.batch_size, dynamic=self.dynamic, callback=self._collect)
+        self._batch = self.client.batch.__enter__()
+        return self
+
+    def upsert(self, shipment_data: dict, vector) -> str:
+        object_id = generate_uuid_for_shipment(shipment_data["shipper_id"], shipment_data["manifest_id"])
+        self._batch.add_data_object(
+            data_object=shipment_data,
+            class_name=SHIPMENT_CLASS,
+            uuid=object_id,
+            vector=vector,
+        )
+        self.written += 1
+        return object_id
+
+    def __exit__(self, exc_type, exc, tb):
+        # flushes whatever is still queued
+        self.client.batch.__exit__(exc_type, exc, tb)
+        self._batch = None
+        return False
+
+
+def _ids_filter(object_ids) -> dict:
+    return {
+        "operator": "Or",
+        "operands": [{"path": ["id"], "operator": "Equal", "valueText": object_id} for object_id in object_ids],
+    }
+
+
+def delete_shipments(client, object_ids, batch_size: int = WEAVIATE_BATCH) -> int:
+    """Batch-delete Shipment objects by id, one request per `batch_size` ids."""
+    object_ids = list(object_ids)
+    deleted = 0
+    for i in range(0, len(object_ids), batch_size):
+        chunk = object_ids[i:i + batch_size]
+        try:
+            result = client.batch.delete_objects(
+                class_name=SHIPMENT_CLASS,
+                where=_ids_filter(chunk),
+                output="verbose",
+            )["results"]
+        except Exception as e:
+            print(f"❌ Could not delete {len(chunk)} objects starting at {chunk[0]}: {e}")
+            continue
+        deleted += result.get("successful", 0)
+        for obj in result.get("objects") or []:
+            if obj.get("status") == "FAILED":
+                print(f"❌ Could not delete {obj.get('id')}: {obj.get('errors')}")
+    return deleted
+
+
+def iter_shipment_ids(client, page_size: int = 500):
+    """(object id, shipper_id, manifest_id) for every Shipment object, paged with a cursor."""
+    after = None
+    while True:
+        query = (
+            client.query
+            .get(SHIPMENT_CLASS, ["shipper_id", "manifest_id"])
+            .with_additional(["id"])
+            .with_limit(page_size)
+        )
+        if after:
+            query = query.with_after(after)
+        page = query.do()["data"]["Get"][SHIPMENT_CLASS] or []
+        for obj in page:
+            yield obj["_additional"]["id"], obj.get("shipper_id"), obj.get("manifest_id")
+        if len(page) < page_size:
+            return
+        after = page[-1]["_additional"]["id"]